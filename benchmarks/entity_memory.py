@@ -0,0 +1,66 @@
+"""
+Memory taken by each domain entity, compared with the plain classes the entities were before they had __slots__.
+
+    python -m src.benchmarks.entity_memory --count 100000
+"""
+import argparse
+import gc
+import tracemalloc
+from src.domain import Student, Discipline, Grade
+
+
+class DictStudent:
+    def __init__(self, student_id, name):
+        self.student_id = student_id
+        self.name = name
+
+
+class DictDiscipline:
+    def __init__(self, discipline_id, name):
+        self.discipline_id = discipline_id
+        self.name = name
+
+
+class DictGrade:
+    def __init__(self, student_id, discipline_id, grade):
+        self.student_id = student_id
+        self.discipline_id = discipline_id
+        self.grade = grade
+
+
+ENTITIES = {
+    'student': (DictStudent, Student, lambda index: (index, "Costin Joldes")),
+    'discipline': (DictDiscipline, Discipline, lambda index: (index, "Mathematics")),
+    'grade': (DictGrade, Grade, lambda index: (index, index % 20, index % 10 + 1)),
+}
+
+
+def measure(entity_class, arguments, count):
+    """
+    :return: the bytes allocated per entity, not counting the field values, which both versions share
+    """
+    values = [arguments(index) for index in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        entities = [entity_class(*value) for value in values]
+        allocated, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the list holding the entities is not part of their cost
+    return (allocated - 8 * len(entities)) / count
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    arguments = parser.parse_args(arguments)
+    print(f"{'entity':<12}{'__dict__':>12}{'__slots__':>12}{'saved':>10}")
+    for name, (dict_class, slots_class, entity_arguments) in ENTITIES.items():
+        before = measure(dict_class, entity_arguments, arguments.count)
+        after = measure(slots_class, entity_arguments, arguments.count)
+        print(f"{name:<12}{before:>10.1f} B{after:>10.1f} B{1 - after / before:>10.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Throughput of the file repositories under each fsync policy. Every run adds students and disciplines, then grades,
+one change at a time as the UI does, and finally closes the repository so the timing includes the last sync.
+
+    python -m src.benchmarks.fsync_policies --grades 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+from src.domain import Student, Discipline, Grade
+from src.repository import TextFileRepository, JournaledTextFileRepository, BinaryFileRepository, FileRepository
+
+REPOSITORIES = {
+    'text': lambda directory, fsync: TextFileRepository(*_filenames(directory, 'txt'), fsync=fsync),
+    'journaled': lambda directory, fsync: JournaledTextFileRepository(
+        *_filenames(directory, 'txt'), os.path.join(directory, 'journal.txt'), fsync=fsync),
+    'binary': lambda directory, fsync: BinaryFileRepository(*_filenames(directory, 'bin'), fsync=fsync),
+}
+
+
+def _filenames(directory, extension):
+    return [os.path.join(directory, f"{name}.{extension}") for name in ("students", "disciplines", "grades")]
+
+
+def run(repository_name, fsync, students, disciplines, grades, parent=None):
+    """
+    :param parent: directory holding the temporary files, the system temporary directory when None
+    :return: the number of changes made and the seconds they took
+    """
+    with tempfile.TemporaryDirectory(dir=parent) as directory:
+        start = time.perf_counter()
+        repository = REPOSITORIES[repository_name](directory, fsync)
+        for student_id in range(students):
+            repository.add_student(Student(student_id, f"Student {student_id}"))
+        for discipline_id in range(disciplines):
+            repository.add_discipline(Discipline(discipline_id, f"Discipline {discipline_id}"))
+        for index in range(grades):
+            repository.grade_student(Grade(index % students, index % disciplines, index % 10 + 1))
+        repository.close()
+        return students + disciplines + grades, time.perf_counter() - start
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--disciplines', type=int, default=10)
+    parser.add_argument('--grades', type=int, default=1000)
+    parser.add_argument('--repositories', nargs='+', choices=REPOSITORIES, default=list(REPOSITORIES))
+    parser.add_argument('--directory', help="where to write, use a directory on the disk to measure")
+    arguments = parser.parse_args(arguments)
+    print(f"{'repository':<12}{'fsync':<10}{'changes':>10}{'seconds':>10}{'changes/s':>12}")
+    for repository_name in arguments.repositories:
+        for fsync in FileRepository.fsync_policies:
+            changes, seconds = run(repository_name, fsync, arguments.students, arguments.disciplines, arguments.grades,
+                                   arguments.directory)
+            print(f"{repository_name:<12}{fsync:<10}{changes:>10}{seconds:>10.3f}{changes / seconds:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
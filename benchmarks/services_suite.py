@@ -0,0 +1,193 @@
+"""
+Latency, throughput and memory of the Services operations on each repository at several data set sizes. Every run
+fills a repository with seeded generated data, then times each operation: adding, grading, searching and removing
+students, listing the students with their grades, and the best and failing student reports. Each operation runs for
+a number of samples or until its time budget is spent, then once more under tracemalloc to find its peak memory.
+
+    python -m src.benchmarks.services_suite --scales 1000 10000 --output results.json
+    python -m src.benchmarks.services_suite --scales 1000 10000 --baseline results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from src.repository import MemoryRepository, TextFileRepository, BinaryFileRepository
+from src.services import Services, StudentListIsEmpty
+from src.services.generators import DataGenerator
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPOSITORIES = {
+    'memory': lambda directory: MemoryRepository(),
+    'text': lambda directory: TextFileRepository(*_filenames(directory, 'txt')),
+    'binary': lambda directory: BinaryFileRepository(*_filenames(directory, 'bin')),
+}
+SCALES = (1000, 10000, 100000, 1000000)
+SEARCHES = ("cos", "onet", "ale", "burz", "ra", "andrei")
+
+
+def _filenames(directory, extension):
+    return [os.path.join(directory, f"{name}.{extension}") for name in ("students", "disciplines", "grades")]
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))]
+
+
+def _operations(services, scale, disciplines, seed):
+    """
+    :return: the operations to time, in order, as (name, function, scans the whole data set) triples
+    """
+    rng = random.Random(seed)
+    new_ids = itertools.count(scale + 1)
+    old_ids = itertools.count(1)
+    added = []
+
+    def add():
+        student_id = next(new_ids)
+        services.add_student(student_id, "Benchmark Student")
+        added.append(student_id)
+
+    def grade():
+        services.grade_student(rng.randint(1, scale), rng.randint(1, disciplines), rng.randint(1, 10))
+
+    def search():
+        services.search_students(rng.choice(SEARCHES), 20)
+
+    def remove():
+        services.remove_student(added.pop() if added else next(old_ids))
+
+    def report(method, *args):
+        def run():
+            try:
+                method(*args)
+            except StudentListIsEmpty:
+                pass
+        return run
+
+    return (
+        ("add", add, False),
+        ("grade", grade, False),
+        ("search", search, False),
+        ("list_students_with_grades", services.list_students_with_grades, True),
+        ("best_students", report(services.get_best_students, 10), True),
+        ("failing_students", report(services.get_failing_students), True),
+        ("remove", remove, False),
+    )
+
+
+def measure(operation, samples, budget):
+    """
+    :param samples: the most times to run the operation
+    :param budget: seconds after which no new sample is started; there is always at least one
+    :return: the sorted latencies in seconds and the peak bytes allocated by one more run
+    """
+    latencies = []
+    start = time.perf_counter()
+    while len(latencies) < samples and (not latencies or time.perf_counter() - start < budget):
+        before = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - before)
+    tracemalloc.start()
+    try:
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return sorted(latencies), peak
+
+
+def run(repository_name, scale, disciplines=50, grades_per_student=3, samples=200, scans=5, budget=2.0, seed=1,
+        parent=None):
+    """
+    :param scale: the number of students
+    :param samples: the most samples of an operation on one student or grade
+    :param scans: the most samples of an operation going over the whole data set
+    :param budget: seconds after which an operation starts no new sample
+    :param parent: directory holding the repository files, the system temporary directory when None
+    :return: one result dictionary per operation
+    """
+    with tempfile.TemporaryDirectory(dir=parent) as directory:
+        repository = REPOSITORIES[repository_name](directory)
+        start = time.perf_counter()
+        grades = DataGenerator(seed).populate(repository, scale, disciplines, grades_per_student)
+        fill_seconds = time.perf_counter() - start
+        services = Services(repository)
+        results = []
+        try:
+            for name, operation, scan in _operations(services, scale, disciplines, seed):
+                latencies, peak = measure(operation, scans if scan else samples, budget)
+                results.append({
+                    "repository": repository_name, "scale": scale, "disciplines": disciplines, "grades": grades,
+                    "fill_seconds": fill_seconds, "operation": name, "samples": len(latencies),
+                    "ops_per_second": len(latencies) / sum(latencies),
+                    "p50_ms": _percentile(latencies, 50) * 1000, "p90_ms": _percentile(latencies, 90) * 1000,
+                    "p99_ms": _percentile(latencies, 99) * 1000, "max_ms": latencies[-1] * 1000,
+                    "peak_bytes": peak,
+                })
+        finally:
+            if hasattr(repository, 'close'):
+                repository.close()
+        return results
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repositories', nargs='+', choices=REPOSITORIES, default=list(REPOSITORIES))
+    parser.add_argument('--scales', nargs='+', type=int, default=list(SCALES))
+    parser.add_argument('--disciplines', type=int, default=50)
+    parser.add_argument('--grades-per-student', type=int, default=3)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--scans', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=2.0, help="seconds after which an operation stops sampling")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--directory', help="where to write, use a directory on the disk to measure")
+    parser.add_argument('--label', help="stored with the results, such as the commit measured")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare the throughput with")
+    arguments = parser.parse_args(arguments)
+
+    baseline = {}
+    if arguments.baseline:
+        with open(arguments.baseline, 'r') as f:
+            baseline = {(result["repository"], result["scale"], result["operation"]): result["ops_per_second"]
+                        for result in json.load(f)["results"]}
+    print(f"{'repository':<10}{'scale':>9}  {'operation':<27}{'samples':>8}{'ops/s':>11}{'p50 ms':>10}{'p90 ms':>10}"
+          f"{'p99 ms':>10}{'peak KiB':>10}{'change':>9}")
+    results = []
+    for repository_name in arguments.repositories:
+        for scale in arguments.scales:
+            for result in run(repository_name, scale, arguments.disciplines, arguments.grades_per_student,
+                              arguments.samples, arguments.scans, arguments.budget, arguments.seed,
+                              arguments.directory):
+                results.append(result)
+                earlier = baseline.get((repository_name, scale, result["operation"]))
+                change = f"{result['ops_per_second'] / earlier - 1:+.0%}" if earlier else ""
+                print(f"{repository_name:<10}{scale:>9}  {result['operation']:<27}{result['samples']:>8}"
+                      f"{result['ops_per_second']:>11.1f}{result['p50_ms']:>10.3f}{result['p90_ms']:>10.3f}"
+                      f"{result['p99_ms']:>10.3f}{result['peak_bytes'] / 1024:>10.1f}{change:>9}")
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump({"label": arguments.label, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "max_rss_bytes": _max_rss(), "arguments": vars(arguments), "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,85 @@
-class Student:
+_set = object.__setattr__
+
+
+class Entity:
+    """
+    Base of the domain entities. Attributes live in __slots__ instead of a per-instance __dict__, and entities are
+    equal and hash alike when their identity fields are equal. The identity fields are set once, by __init__, since
+    changing them would silently break the sets and dictionaries holding the entity.
+    """
+    __slots__ = ()
+    _identity = ()
+
+    def __setattr__(self, name, value):
+        if name in self._identity:
+            raise AttributeError(f"{name} cannot be changed")
+        _set(self, name, value)
+
+    def _key(self):
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __setstate__(self, state):
+        # pickles written before the entities had slots hold an attribute dict instead of a (None, slots) pair
+        if isinstance(state, tuple):
+            state = state[1]
+        for name, value in state.items():
+            _set(self, name, value)
+
+
+class Student(Entity):
+    __slots__ = ('student_id', 'name')
+    _identity = ('student_id',)
+
     def __init__(self, student_id, name):
-        self.student_id = student_id
-        self.name = name
+        # set past __setattr__, which refuses the identity fields and is slow for every other one
+        _set(self, 'student_id', student_id)
+        _set(self, 'name', name)
+
+    def _key(self):
+        return self.student_id
 
     def __str__(self):
         return f"Student id: {self.student_id}, Name: {self.name}"
 
 
-class Discipline:
+class Discipline(Entity):
+    __slots__ = ('discipline_id', 'name')
+    _identity = ('discipline_id',)
+
     def __init__(self, discipline_id, name):
-        self.discipline_id = discipline_id
-        self.name = name
+        _set(self, 'discipline_id', discipline_id)
+        _set(self, 'name', name)
+
+    def _key(self):
+        return self.discipline_id
 
     def __str__(self):
         return f"Discipline id: {self.discipline_id}, Name: {self.name}"
 
 
-class Grade:
+class Grade(Entity):
+    """
+    A grade has no id of its own, so two grades with the same student, discipline and value are equal. Repositories
+    that keep several equal grades tell them apart by object identity.
+    """
+    __slots__ = ('student_id', 'discipline_id', 'grade')
+    _identity = __slots__
+
     def __init__(self, student_id, discipline_id, grade):
-        self.student_id = student_id
-        self.discipline_id = discipline_id
-        self.grade = grade
+        _set(self, 'student_id', student_id)
+        _set(self, 'discipline_id', discipline_id)
+        _set(self, 'grade', grade)
+
+    def _key(self):
+        return self.student_id, self.discipline_id, self.grade
 
     def __str__(self):
         return f"Student id: {self.student_id}, Discipline id: {self.discipline_id}, Grade: {self.grade}"
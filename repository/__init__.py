@@ -1,5 +1,18 @@
+import atexit
+import contextlib
+import functools
+import itertools
+import mmap
+import os
 import pickle
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from collections.abc import Sequence
 from src.domain import Student, Discipline, Grade
+from src.repository.search_index import NGramIndex
 
 
 class StudentNotFound(Exception):
@@ -44,208 +57,1304 @@ class Repository:
     def remove_grade(self, grade):
         raise NotImplementedError
 
+    def get_discipline(self, discipline_id):
+        raise NotImplementedError
+
+    def exists_student(self, student_id):
+        raise NotImplementedError
+
+    def exists_discipline(self, discipline_id):
+        raise NotImplementedError
+
+    def grades_for_student(self, student_id):
+        raise NotImplementedError
+
+    def grades_for_discipline(self, discipline_id):
+        raise NotImplementedError
+
+    def grade_columns(self):
+        raise NotImplementedError
+
+    def students_page(self, offset, limit):
+        """
+        :return: at most limit students from position offset, in list order, and the number of students
+        """
+        students = self.list_students()
+        return students[offset:offset + limit], len(students)
+
+    def disciplines_page(self, offset, limit):
+        """
+        :return: at most limit disciplines from position offset, in list order, and the number of disciplines
+        """
+        disciplines = self.list_disciplines()
+        return disciplines[offset:offset + limit], len(disciplines)
+
+    def grades_page(self, offset, limit):
+        """
+        :return: at most limit grades from position offset, in list order, and the number of grades
+        """
+        grades = self.list_grades()
+        return grades[offset:offset + limit], len(grades)
+
+    def student_grade_totals(self):
+        """
+        :return: an iterable of (student id, grade total, grade count) triples, one for every student id with grades
+        """
+        raise NotImplementedError
+
+    def discipline_grade_totals(self):
+        """
+        :return: an iterable of (discipline id, grade total, grade count) triples, one for every discipline id with
+        grades
+        """
+        raise NotImplementedError
+
+    def search_students(self, search_string, limit=None, prefix=False):
+        raise NotImplementedError
+
+    def search_disciplines(self, search_string, limit=None, prefix=False):
+        raise NotImplementedError
+
+    def batch(self):
+        """
+        Context manager grouping many changes so they are persisted once, when the outermost batch exits
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Persist every change that is still buffered
+        """
+        raise NotImplementedError
+
 
 class MemoryRepository(Repository):
     def __init__(self):
-        self.students = []
-        self.disciplines = []
-        self.grades = []
+        self.students = {}
+        self.disciplines = {}
+        self.grades = {}
+        self._grades_by_student = {}
+        self._grades_by_discipline = {}
+        self._student_index = NGramIndex()
+        self._discipline_index = NGramIndex()
 
     def add_student(self, student):
-        self.students.append(student)
+        self.students[student.student_id] = student
+        self._student_index.add(student.student_id, str(student.student_id), student.name)
 
     def add_discipline(self, discipline):
-        self.disciplines.append(discipline)
+        self.disciplines[discipline.discipline_id] = discipline
+        self._discipline_index.add(discipline.discipline_id, str(discipline.discipline_id), discipline.name)
 
     def remove_student(self, student):
-        self.students.remove(student)
-        self.grades = [grade for grade in self.grades if grade.student_id != student.student_id]
+        self._forget_student(student)
+        for grade in self._grades_by_student.pop(student.student_id, []):
+            del self.grades[id(grade)]
+            self._unlink_grade(self._grades_by_discipline, grade.discipline_id, grade)
 
     def remove_discipline(self, discipline):
-        self.disciplines.remove(discipline)
+        self._forget_discipline(discipline)
+        for grade in self._grades_by_discipline.pop(discipline.discipline_id, []):
+            del self.grades[id(grade)]
+            self._unlink_grade(self._grades_by_student, grade.student_id, grade)
+
+    def _forget_student(self, student):
+        """
+        Remove a student but not its grades
+        """
+        del self.students[student.student_id]
+        self._student_index.remove(student.student_id)
+
+    def _forget_discipline(self, discipline):
+        """
+        Remove a discipline but not its grades
+        """
+        del self.disciplines[discipline.discipline_id]
+        self._discipline_index.remove(discipline.discipline_id)
 
     def update_student(self, student):
-        for i in range(len(self.students)):
-            if self.students[i].student_id == student.student_id:
-                self.students[i] = student
-                break
+        if student.student_id in self.students:
+            self.students[student.student_id] = student
+            self._student_index.add(student.student_id, str(student.student_id), student.name)
 
     def update_discipline(self, discipline):
-        for i in range(len(self.disciplines)):
-            if self.disciplines[i].discipline_id == discipline.discipline_id:
-                self.disciplines[i] = discipline
-                break
+        if discipline.discipline_id in self.disciplines:
+            self.disciplines[discipline.discipline_id] = discipline
+            self._discipline_index.add(discipline.discipline_id, str(discipline.discipline_id), discipline.name)
 
     def list_students(self):
-        return self.students
+        return list(self.students.values())
 
     def list_disciplines(self):
-        return self.disciplines
+        return list(self.disciplines.values())
 
     def grade_student(self, grade):
-        self.grades.append(grade)
+        self.grades[id(grade)] = grade
+        self._grades_by_student.setdefault(grade.student_id, []).append(grade)
+        self._grades_by_discipline.setdefault(grade.discipline_id, []).append(grade)
 
     def list_grades(self):
-        return self.grades
+        return list(self.grades.values())
+
+    def students_page(self, offset, limit):
+        return list(itertools.islice(self.students.values(), offset, offset + limit)), len(self.students)
+
+    def disciplines_page(self, offset, limit):
+        return list(itertools.islice(self.disciplines.values(), offset, offset + limit)), len(self.disciplines)
+
+    def grades_page(self, offset, limit):
+        return list(itertools.islice(self.grades.values(), offset, offset + limit)), len(self.grades)
 
     def get_student(self, student_id):
-        return next((student for student in self.students if student.student_id == student_id), None)
+        return self.students.get(student_id)
+
+    def get_discipline(self, discipline_id):
+        return self.disciplines.get(discipline_id)
+
+    def exists_student(self, student_id):
+        return student_id in self.students
+
+    def exists_discipline(self, discipline_id):
+        return discipline_id in self.disciplines
+
+    def grades_for_student(self, student_id):
+        return list(self._grades_by_student.get(student_id, []))
+
+    def grades_for_discipline(self, discipline_id):
+        return list(self._grades_by_discipline.get(discipline_id, []))
+
+    def grade_columns(self):
+        grades = self.grades.values()
+        return (array('q', [grade.student_id for grade in grades]),
+                array('q', [grade.discipline_id for grade in grades]),
+                array('q', [grade.grade for grade in grades]))
+
+    @staticmethod
+    def _grade_totals(grades_by_key):
+        return [(key, sum(grade.grade for grade in grades), len(grades)) for key, grades in grades_by_key.items()]
+
+    def student_grade_totals(self):
+        return self._grade_totals(self._grades_by_student)
+
+    def discipline_grade_totals(self):
+        return self._grade_totals(self._grades_by_discipline)
+
+    def batch(self):
+        return contextlib.nullcontext()
+
+    def flush(self):
+        pass
+
+    def search_students(self, search_string, limit=None, prefix=False):
+        return [self.students[student_id] for student_id in self._student_index.search(search_string, limit, prefix)]
+
+    def search_disciplines(self, search_string, limit=None, prefix=False):
+        return [self.disciplines[discipline_id] for discipline_id in
+                self._discipline_index.search(search_string, limit, prefix)]
 
     def remove_grade(self, grade):
-        self.grades.remove(grade)
+        stored = self._find_grade(grade)
+        if stored is None:
+            raise ValueError("Grade not found")
+        del self.grades[id(stored)]
+        self._unlink_grade(self._grades_by_student, stored.student_id, stored)
+        self._unlink_grade(self._grades_by_discipline, stored.discipline_id, stored)
+
+    def _find_grade(self, grade):
+        # Prefer the exact object; fall back to an equal grade so callers holding a copy can remove it too
+        candidates = self._grades_by_student.get(grade.student_id, [])
+        match = next((stored for stored in candidates if stored is grade), None)
+        if match is None:
+            match = next((stored for stored in candidates if stored.discipline_id == grade.discipline_id and
+                          stored.grade == grade.grade), None)
+        return match
+
+    @staticmethod
+    def _unlink_grade(index, key, grade):
+        grades = index[key]
+        for i in range(len(grades)):
+            if grades[i] is grade:
+                del grades[i]
+                break
+        if not grades:
+            del index[key]
+
+
+def _loads(*entity_classes):
+    """
+    Make a FileRepository method read the collections it uses from disk first, if they have not been read yet
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self._unloaded:
+                self._require(*entity_classes)
+            return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class FileRepository(MemoryRepository):
+    """
+    Memory repository mirrored to one file per collection. Every mutation is described to _save as a list of
+    (entity class, action, item) changes, where action is 'add', 'remove' or 'update'. Inside a batch the changes are
+    collected and saved together when it exits.
+
+    Given a flush_interval in seconds or a flush_after change count, the repository writes behind: changes are
+    buffered and saved together by a timer thread at most flush_interval seconds after the first of them, as soon as
+    flush_after of them are buffered, on flush() or close(), or when the interpreter exits.
 
+    Whole files are replaced by writing a temporary file and renaming it over the old one, so a crash leaves either
+    the old file or the new one. The fsync policy decides when written data is forced to disk: 'always' after every
+    save, 'never' leaves it to the operating system, and 'batched' syncs replacement files before renaming them but
+    syncs appended records and renames together, at most once every fsync_interval seconds and on flush() or close().
 
-class TextFileRepository(Repository):
-    def __init__(self, students_filename, disciplines_filename, grades_filename):
+    Nothing is read when the repository is created: each collection is loaded the first time a method needs it, so
+    a session that only works with disciplines never reads the grades file.
+    """
+    fsync_policies = ('always', 'batched', 'never')
+    fsync_interval = 1.0
+
+    def __init__(self, students_filename, disciplines_filename, grades_filename, flush_interval=None,
+                 flush_after=None, fsync='batched'):
+        if fsync not in self.fsync_policies:
+            raise ValueError(f"Invalid fsync policy: {fsync}")
+        super().__init__()
         self._students_filename = students_filename
         self._disciplines_filename = disciplines_filename
         self._grades_filename = grades_filename
-        self.students = self._read_from_file(self._students_filename, Student)
-        self.disciplines = self._read_from_file(self._disciplines_filename, Discipline)
-        self.grades = self._read_from_file(self._grades_filename, Grade)
+        self._pending = None
+        self._flush_interval = flush_interval
+        self._flush_after = flush_after
+        self._buffered = None
+        self._timer = None
+        self._lock = threading.RLock()
+        self._fsync = fsync
+        self._unsynced = set()
+        self._last_sync = time.monotonic()
+        self._load()
+        if flush_interval is not None or flush_after is not None:
+            self._buffered = []
+        if self._buffered is not None or fsync == 'batched':
+            atexit.register(self.flush)
 
-    def _write_to_file(self, filename, data):
-        with open(filename, 'w') as f:
-            for item in data:
-                if isinstance(item, Student):
-                    f.write(f"{item.student_id},{item.name}\n")
-                elif isinstance(item, Discipline):
-                    f.write(f"{item.discipline_id},{item.name}\n")
-                elif isinstance(item, Grade):
-                    f.write(f"{item.student_id},{item.discipline_id},{item.grade}\n")
+    def _load(self):
+        self._unloaded = {Student, Discipline, Grade}
+        self._loading = set()
+
+    def _require(self, *entity_classes):
+        # a collection stays unloaded until it is complete, so other threads wait for the lock instead of reading it
+        # half-built; the loading thread itself may use it while replaying
+        with self._lock:
+            for entity_class in entity_classes:
+                if entity_class in self._unloaded and entity_class not in self._loading:
+                    self._loading.add(entity_class)
+                    try:
+                        self._load_collection(entity_class)
+                    finally:
+                        self._loading.discard(entity_class)
+                    self._unloaded.discard(entity_class)
+
+    def _load_collection(self, entity_class):
+        for item in self._read_from_file(self._filename(entity_class), entity_class):
+            self._apply(entity_class, 'add', item)
 
     def _read_from_file(self, filename, entity_class):
-        data = []
+        raise NotImplementedError
+
+    def _save(self, changes):
+        raise NotImplementedError
+
+    def _changed(self, changes):
+        if self._pending is not None:
+            self._pending.extend(changes)
+        elif self._buffered is None:
+            self._save(changes)
+        else:
+            self._buffered.extend(changes)
+            if self._flush_after is not None and len(self._buffered) >= self._flush_after:
+                self.flush()
+            elif self._flush_interval is not None and self._timer is None:
+                self._timer = threading.Timer(self._flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self._lock:
+            if self._pending is not None:
+                yield
+                return
+            self._pending = []
+            try:
+                yield
+            finally:
+                changes, self._pending = self._pending, None
+                if changes:
+                    self._changed(changes)
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._buffered:
+                changes, self._buffered = self._buffered, []
+                try:
+                    self._save(changes)
+                except BaseException:
+                    # kept for the next flush, ahead of anything buffered since
+                    self._buffered[:0] = changes
+                    raise
+            self._sync()
+
+    @contextlib.contextmanager
+    def _replacing(self, filename, mode):
+        """
+        Open a temporary file that replaces filename once the block exits without an error
+        """
+        temporary = filename + '.tmp'
         try:
-            with open(filename, 'r') as f:
-                for line in f:
-                    item_data = line.strip().split(',')
-                    if entity_class == Student:
-                        data.append(Student(int(item_data[0]), item_data[1]))
-                    elif entity_class == Discipline:
-                        data.append(Discipline(int(item_data[0]), item_data[1]))
-                    elif entity_class == Grade:
-                        data.append(Grade(int(item_data[0]), int(item_data[1]), int(item_data[2])))
-        except (EOFError, FileNotFoundError):
-            pass
-        return data
+            with open(temporary, mode) as f:
+                yield f
+                if self._fsync != 'never':
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temporary, filename)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporary)
+            raise
+        self._written(os.path.dirname(os.path.abspath(filename)))
+
+    def _appended(self, f):
+        """
+        Apply the fsync policy to records just written to an open file
+        """
+        if self._fsync == 'always':
+            f.flush()
+            os.fsync(f.fileno())
+        elif self._fsync == 'batched':
+            self._written(os.path.abspath(f.name))
+
+    def _written(self, path):
+        if self._fsync == 'always':
+            self._fsync_path(path)
+        elif self._fsync == 'batched':
+            self._unsynced.add(path)
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        """
+        Force every file and directory written since the last sync to disk
+        """
+        for path in self._unsynced:
+            self._fsync_path(path)
+        self._unsynced.clear()
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def _fsync_path(path):
+        if os.path.isdir(path) and os.name != 'posix':
+            # directories cannot be opened for syncing outside POSIX systems
+            return
+        try:
+            descriptor = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def _drop_unsaved(self):
+        """
+        Forget the changes not saved yet, once the files have been rewritten from memory with them included
+        """
+        if self._pending is not None:
+            self._pending = []
+        if self._buffered is not None:
+            self._buffered = []
+
+    def close(self):
+        """
+        Flush the buffered changes and stop writing behind
+        """
+        self.flush()
+        atexit.unregister(self.flush)
+        self._buffered = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _filename(self, entity_class):
+        if entity_class == Student:
+            return self._students_filename
+        if entity_class == Discipline:
+            return self._disciplines_filename
+        return self._grades_filename
+
+    def _items(self, entity_class):
+        if entity_class == Student:
+            return self.students.values()
+        if entity_class == Discipline:
+            return self.disciplines.values()
+        return self.grades.values()
 
+    def _apply(self, entity_class, action, item):
+        """
+        Apply a change to the in-memory collections only, used when replaying stored changes. Removing a student or a
+        discipline leaves its grades alone: their removals are stored as changes of their own, and the collections are
+        loaded one at a time, so the grades may hold ones added back by later changes.
+        """
+        operations = {
+            (Student, 'add'): MemoryRepository.add_student,
+            (Student, 'remove'): MemoryRepository._forget_student,
+            (Student, 'update'): MemoryRepository.update_student,
+            (Discipline, 'add'): MemoryRepository.add_discipline,
+            (Discipline, 'remove'): MemoryRepository._forget_discipline,
+            (Discipline, 'update'): MemoryRepository.update_discipline,
+            (Grade, 'add'): MemoryRepository.grade_student,
+            (Grade, 'remove'): MemoryRepository.remove_grade,
+        }
+        operations[(entity_class, action)](self, item)
+
+    @_loads(Student)
     def add_student(self, student):
-        self.students.append(student)
-        self._write_to_file(self._students_filename, self.students)
+        with self._lock:
+            super().add_student(student)
+            self._changed([(Student, 'add', student)])
 
+    @_loads(Discipline)
     def add_discipline(self, discipline):
-        self.disciplines.append(discipline)
-        self._write_to_file(self._disciplines_filename, self.disciplines)
+        with self._lock:
+            super().add_discipline(discipline)
+            self._changed([(Discipline, 'add', discipline)])
 
+    @_loads(Student, Grade)
     def remove_student(self, student):
-        self.students = [s for s in self.students if s.student_id != student.student_id]
-        self._write_to_file(self._students_filename, self.students)
+        with self._lock:
+            grades = self.grades_for_student(student.student_id)
+            super().remove_student(student)
+            self._changed([(Grade, 'remove', grade) for grade in grades] + [(Student, 'remove', student)])
 
+    @_loads(Discipline, Grade)
     def remove_discipline(self, discipline):
-        self.disciplines = [d for d in self.disciplines if d.discipline_id != discipline.discipline_id]
-        self._write_to_file(self._disciplines_filename, self.disciplines)
+        with self._lock:
+            grades = self.grades_for_discipline(discipline.discipline_id)
+            super().remove_discipline(discipline)
+            self._changed([(Grade, 'remove', grade) for grade in grades] + [(Discipline, 'remove', discipline)])
 
+    @_loads(Student)
     def update_student(self, student):
-        for i in range(len(self.students)):
-            if self.students[i].student_id == student.student_id:
-                self.students[i] = student
-                break
-        self._write_to_file(self._students_filename, self.students)
+        with self._lock:
+            super().update_student(student)
+            self._changed([(Student, 'update', student)])
 
+    @_loads(Discipline)
     def update_discipline(self, discipline):
-        for i in range(len(self.disciplines)):
-            if self.disciplines[i].discipline_id == discipline.discipline_id:
-                self.disciplines[i] = discipline
-                break
-        self._write_to_file(self._disciplines_filename, self.disciplines)
+        with self._lock:
+            super().update_discipline(discipline)
+            self._changed([(Discipline, 'update', discipline)])
 
+    @_loads(Grade)
     def grade_student(self, grade):
-        self.grades.append(grade)
-        self._write_to_file(self._grades_filename, self.grades)
+        with self._lock:
+            super().grade_student(grade)
+            self._changed([(Grade, 'add', grade)])
 
+    @_loads(Grade)
+    def remove_grade(self, grade):
+        with self._lock:
+            stored = self._find_grade(grade)
+            super().remove_grade(grade)
+            self._changed([(Grade, 'remove', stored)])
+
+    @_loads(Student)
     def list_students(self):
-        return self.students
+        return super().list_students()
+
+    @_loads(Student)
+    def students_page(self, offset, limit):
+        return super().students_page(offset, limit)
+
+    @_loads(Student)
+    def get_student(self, student_id):
+        return super().get_student(student_id)
+
+    @_loads(Student)
+    def exists_student(self, student_id):
+        return super().exists_student(student_id)
 
+    @_loads(Student)
+    def search_students(self, search_string, limit=None, prefix=False):
+        return super().search_students(search_string, limit, prefix)
+
+    @_loads(Discipline)
     def list_disciplines(self):
-        return self.disciplines
+        return super().list_disciplines()
+
+    @_loads(Discipline)
+    def disciplines_page(self, offset, limit):
+        return super().disciplines_page(offset, limit)
+
+    @_loads(Discipline)
+    def get_discipline(self, discipline_id):
+        return super().get_discipline(discipline_id)
+
+    @_loads(Discipline)
+    def exists_discipline(self, discipline_id):
+        return super().exists_discipline(discipline_id)
+
+    @_loads(Discipline)
+    def search_disciplines(self, search_string, limit=None, prefix=False):
+        return super().search_disciplines(search_string, limit, prefix)
 
+    @_loads(Grade)
     def list_grades(self):
-        return self.grades
+        return super().list_grades()
 
-    def get_student(self, student_id):
-        return next((student for student in self.students if student.student_id == student_id), None)
+    @_loads(Grade)
+    def grades_page(self, offset, limit):
+        return super().grades_page(offset, limit)
 
-    def remove_grade(self, grade):
-        self.grades.remove(grade)
+    @_loads(Grade)
+    def grades_for_student(self, student_id):
+        return super().grades_for_student(student_id)
 
+    @_loads(Grade)
+    def grades_for_discipline(self, discipline_id):
+        return super().grades_for_discipline(discipline_id)
 
-class BinaryFileRepository(Repository):
-    def __init__(self, students_filename, disciplines_filename, grades_filename):
-        self._students_filename = students_filename
-        self._disciplines_filename = disciplines_filename
-        self._grades_filename = grades_filename
-        self.students = self._read_from_file(self._students_filename)
-        self.disciplines = self._read_from_file(self._disciplines_filename)
-        self.grades = self._read_from_file(self._grades_filename)
+    @_loads(Grade)
+    def grade_columns(self):
+        return super().grade_columns()
+
+    @_loads(Grade)
+    def student_grade_totals(self):
+        return super().student_grade_totals()
+
+    @_loads(Grade)
+    def discipline_grade_totals(self):
+        return super().discipline_grade_totals()
+
+
+class TextFileRepository(FileRepository):
+    @staticmethod
+    def _format(item):
+        if isinstance(item, Student):
+            return f"{item.student_id},{item.name}"
+        elif isinstance(item, Discipline):
+            return f"{item.discipline_id},{item.name}"
+        return f"{item.student_id},{item.discipline_id},{item.grade}"
+
+    @staticmethod
+    def _parse(line, entity_class):
+        if entity_class == Student:
+            item_data = line.split(',', 1)
+            return Student(int(item_data[0]), item_data[1])
+        elif entity_class == Discipline:
+            item_data = line.split(',', 1)
+            return Discipline(int(item_data[0]), item_data[1])
+        item_data = line.split(',')
+        return Grade(int(item_data[0]), int(item_data[1]), int(item_data[2]))
 
     def _write_to_file(self, filename, data):
-        with open(filename, 'wb') as f:
-            pickle.dump(data, f)
+        with self._replacing(filename, 'w') as f:
+            for item in data:
+                f.write(self._format(item) + "\n")
 
-    def _read_from_file(self, filename):
+    def _read_from_file(self, filename, entity_class):
+        try:
+            with open(filename, 'r') as f:
+                for line in f:
+                    yield self._parse(line.strip(), entity_class)
+        except (EOFError, FileNotFoundError):
+            pass
+
+    def _save(self, changes):
+        for entity_class in dict.fromkeys(entity_class for entity_class, action, item in changes):
+            self._write_to_file(self._filename(entity_class), self._items(entity_class))
+
+
+class JournaledTextFileRepository(TextFileRepository):
+    """
+    Text file repository that appends each change to a journal instead of rewriting the data files. The data files
+    are only rewritten when the journal grows past compact_threshold records, after which the journal is emptied.
+    Loading a collection replays only the journal records of its kind.
+    """
+    _kinds = {Student: 'student', Discipline: 'discipline', Grade: 'grade'}
+
+    def __init__(self, students_filename, disciplines_filename, grades_filename, journal_filename,
+                 compact_threshold=1000, flush_interval=None, flush_after=None, fsync='batched'):
+        self._journal_filename = journal_filename
+        self._compact_threshold = compact_threshold
+        self._journal_size = 0
+        super().__init__(students_filename, disciplines_filename, grades_filename, flush_interval, flush_after, fsync)
+
+    def _journal_lines(self):
+        """
+        :return: an iterator over the complete journal records, ending with None if the last one is torn
+        """
+        try:
+            with open(self._journal_filename, 'r') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        # a record torn by a crash mid-append was never acknowledged, so it is dropped
+                        yield None
+                        return
+                    yield line
+        except FileNotFoundError:
+            pass
+
+    def _load(self):
+        super()._load()
+        torn = False
+        for line in self._journal_lines():
+            if line is None:
+                torn = True
+            else:
+                self._journal_size += 1
+        if torn or self._journal_size > self._compact_threshold:
+            self.compact()
+
+    def _load_collection(self, entity_class):
+        super()._load_collection(entity_class)
+        kind = self._kinds[entity_class]
+        for line in self._journal_lines():
+            if line is not None and line.startswith(kind + ","):
+                line_kind, action, item_data = line.rstrip("\n").split(',', 2)
+                self._apply(entity_class, action, self._parse(item_data, entity_class))
+
+    def _save(self, changes):
+        with open(self._journal_filename, 'a') as f:
+            f.write("".join(f"{self._kinds[entity_class]},{action},{self._format(item)}\n"
+                            for entity_class, action, item in changes))
+            self._appended(f)
+        self._journal_size += len(changes)
+        if self._journal_size > self._compact_threshold:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the data files from memory and empty the journal
+        """
+        with self._lock:
+            self._require(Student, Discipline, Grade)
+            for entity_class in (Student, Discipline, Grade):
+                self._write_to_file(self._filename(entity_class), self._items(entity_class))
+            if self._fsync != 'never':
+                # the new data files have to be on disk before the journal holding their changes is emptied
+                self._sync()
+            with open(self._journal_filename, 'w') as f:
+                self._appended(f)
+            self._journal_size = 0
+            self._drop_unsaved()
+
+
+class BinaryFileRepository(FileRepository):
+    """
+    Binary repository storing one length-prefixed record per entity, each starting with a status byte. New entities
+    are appended, removals only overwrite the status byte of their record and updates do both. A file is compacted
+    once it holds more dead records than live ones. Ids and grades are stored as 64-bit integers. Files in the older
+    pickle format, or with the 32-bit records of the first version, are converted when loaded.
+    """
+    _magic = b'SMR2'
+    _header = struct.Struct('<BI')
+    _grade_record = struct.Struct('<BIqqq')
+    _id = struct.Struct('<q')
+    _old_records = {b'SMR1': (struct.Struct('<BIiii'), struct.Struct('<i'))}
+
+    def __init__(self, students_filename, disciplines_filename, grades_filename, compact_minimum=1024,
+                 flush_interval=None, flush_after=None, fsync='batched'):
+        self._compact_minimum = compact_minimum
+        self._offsets = {Student: {}, Discipline: {}, Grade: {}}
+        self._dead = {Student: 0, Discipline: 0, Grade: 0}
+        self._ends = {}
+        super().__init__(students_filename, disciplines_filename, grades_filename, flush_interval, flush_after, fsync)
+
+    @staticmethod
+    def _record_key(entity_class, item):
+        if entity_class == Student:
+            return item.student_id
+        elif entity_class == Discipline:
+            return item.discipline_id
+        return id(item)
+
+    def _encode(self, entity_class, item):
+        if entity_class == Grade:
+            return self._grade_record.pack(1, self._grade_record.size - self._header.size,
+                                           item.student_id, item.discipline_id, item.grade)
+        payload = self._id.pack(self._record_key(entity_class, item)) + item.name.encode('utf-8')
+        return self._header.pack(1, len(payload)) + payload
+
+    def _decode(self, entity_class, payload, id_record):
+        (item_id,) = id_record.unpack_from(payload)
+        return entity_class(item_id, payload[id_record.size:].decode('utf-8'))
+
+    def _write_to_file(self, filename, data):
+        with self._replacing(filename, 'wb') as f:
+            f.write(data)
+
+    def _read_from_file(self, filename, entity_class):
+        position = None
+        items = None
         try:
             with open(filename, 'rb') as f:
-                data = pickle.load(f)
-        except EOFError:
-            data = []
-        return data
+                magic = f.read(len(self._magic))
+                if magic == self._magic:
+                    position = yield from self._read_records(f, entity_class)
+                    size = f.tell()
+                elif magic in self._old_records:
+                    items = list(self._read_records(f, entity_class, *self._old_records[magic]))
+                else:
+                    f.seek(0)
+                    data = f.read()
+        except FileNotFoundError:
+            data = b''
+        if position is None:
+            if items is None:
+                items = pickle.loads(data) if data else []
+            self._rewrite(entity_class, items)
+            yield from items
+            return
+        if position != size:
+            # drop a record torn by a crash mid-append
+            with open(filename, 'r+b') as f:
+                f.truncate(position)
+                self._appended(f)
+        self._ends[entity_class] = position
+
+    def _read_records(self, f, entity_class, grade_record=None, id_record=None):
+        """
+        Yield the live records of a file positioned after its magic number, grades a block at a time
+        :param grade_record: the struct of the grade records, the current one when None
+        :param id_record: the struct of the student and discipline ids, the current one when None
+        :return: the position after the last complete record
+        """
+        grade_record = grade_record or self._grade_record
+        id_record = id_record or self._id
+        offsets = self._offsets[entity_class]
+        position = len(self._magic)
+        if entity_class == Grade:
+            size = grade_record.size
+            block_size = size * 4096
+            while True:
+                block = f.read(block_size)
+                end = len(block) // size * size
+                for status, length, student_id, discipline_id, value in grade_record.iter_unpack(
+                        memoryview(block)[:end]):
+                    if status:
+                        grade = Grade(student_id, discipline_id, value)
+                        offsets[id(grade)] = position
+                        yield grade
+                    else:
+                        self._dead[entity_class] += 1
+                    position += size
+                if len(block) < block_size:
+                    return position
+        data = f.read()
+        header_size = self._header.size
+        start = position
+        while position - start + header_size <= len(data):
+            status, length = self._header.unpack_from(data, position - start)
+            if position - start + header_size + length > len(data):
+                break
+            if status:
+                record = data[position - start + header_size:position - start + header_size + length]
+                item = self._decode(entity_class, record, id_record)
+                offsets[self._record_key(entity_class, item)] = position
+                yield item
+            else:
+                self._dead[entity_class] += 1
+            position += header_size + length
+        return position
+
+    def _rewrite(self, entity_class, items=None):
+        if items is None:
+            items = self._items(entity_class)
+        offsets = {}
+        records = [self._magic]
+        position = len(self._magic)
+        for item in items:
+            record = self._encode(entity_class, item)
+            offsets[self._record_key(entity_class, item)] = position
+            records.append(record)
+            position += len(record)
+        self._write_to_file(self._filename(entity_class), b''.join(records))
+        self._offsets[entity_class] = offsets
+        self._dead[entity_class] = 0
+        self._ends[entity_class] = position
+
+    def _save(self, changes):
+        changes_by_class = {}
+        for entity_class, action, item in changes:
+            changes_by_class.setdefault(entity_class, []).append((action, item))
+        for entity_class, class_changes in changes_by_class.items():
+            offsets = self._offsets[entity_class]
+            end = self._ends[entity_class]
+            with open(self._filename(entity_class), 'r+b') as f:
+                for action, item in class_changes:
+                    key = self._record_key(entity_class, item)
+                    offset = offsets.pop(key, None)
+                    if offset is not None:
+                        f.seek(offset)
+                        f.write(b'\x00')
+                        self._dead[entity_class] += 1
+                    if action == 'add' or (action == 'update' and offset is not None):
+                        record = self._encode(entity_class, item)
+                        f.seek(end)
+                        f.write(record)
+                        offsets[key] = end
+                        end += len(record)
+                self._appended(f)
+            self._ends[entity_class] = end
+            if self._dead[entity_class] > max(len(offsets), self._compact_minimum):
+                self._rewrite(entity_class)
+
+    def compact(self):
+        """
+        Rewrite every file with only its live records
+        """
+        with self._lock:
+            self._require(Student, Discipline, Grade)
+            for entity_class in (Student, Discipline, Grade):
+                self._rewrite(entity_class)
+            self._drop_unsaved()
+
+
+class GradeColumns:
+    """
+    Grades packed into three int32 columns (student id, discipline id, grade) of a memory-mapped file. The file starts
+    with a header holding the row count and the capacity of each column. Removing a row moves the last row into its
+    place, so the columns stay dense.
+    """
+    _magic = b'SMG1'
+    _header = struct.Struct('<4sII')
+
+    def __init__(self, filename, capacity=1024):
+        exists = os.path.exists(filename) and os.path.getsize(filename) >= self._header.size
+        self._file = open(filename, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, self._count, self._capacity = self._header.unpack(self._file.read(self._header.size))
+            if magic != self._magic:
+                self._file.close()
+                raise ValueError(f"{filename} is not a grade column file")
+        else:
+            self._count, self._capacity = 0, capacity
+            self._file.truncate(self._header.size + 3 * 4 * capacity)
+        self._map()
+        self._write_header()
+
+    def _map(self):
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        column_size = 4 * self._capacity
+        self._columns = [memoryview(self._mmap)[self._column_offset(column):][:column_size].cast('i')
+                         for column in range(3)]
+
+    def _unmap(self):
+        for column in self._columns:
+            column.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # views handed out by columns() still reference the old mapping, it is released with them
+            pass
+
+    def _column_offset(self, column, capacity=None):
+        return self._header.size + 4 * column * (capacity if capacity is not None else self._capacity)
+
+    def _write_header(self):
+        self._header.pack_into(self._mmap, 0, self._magic, self._count, self._capacity)
+
+    def _grow(self):
+        old_capacity = self._capacity
+        self._unmap()
+        self._capacity *= 2
+        self._file.truncate(self._header.size + 3 * 4 * self._capacity)
+        self._map()
+        for column in (2, 1):
+            self._mmap.move(self._column_offset(column), self._column_offset(column, old_capacity), 4 * self._count)
+        self._write_header()
+
+    def __len__(self):
+        return self._count
+
+    def row(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("grade row out of range")
+        return self._columns[0][index], self._columns[1][index], self._columns[2][index]
+
+    def append(self, student_id, discipline_id, grade):
+        if self._count == self._capacity:
+            self._grow()
+        row = self._count
+        self._columns[0][row] = student_id
+        self._columns[1][row] = discipline_id
+        self._columns[2][row] = grade
+        self._count += 1
+        self._write_header()
+        return row
+
+    def remove(self, index):
+        """
+        Remove a row by moving the last row into its place
+        :return: the former index of the moved row, or None when the last row was removed
+        """
+        last = self._count - 1
+        moved = None
+        if index != last:
+            for column in self._columns:
+                column[index] = column[last]
+            moved = last
+        self._count -= 1
+        self._write_header()
+        return moved
+
+    def columns(self):
+        """
+        :return: views of the student id, discipline id and grade columns, valid until the next change
+        """
+        return tuple(column[:self._count] for column in self._columns)
+
+    def sync(self):
+        """
+        Force the rows written so far to disk
+        """
+        if not self._file.closed:
+            self._mmap.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._mmap.flush()
+        self._unmap()
+        self._file.close()
+
+
+class GradeColumnsView(Sequence):
+    """
+    Read-only sequence over grade columns that builds Grade objects only when they are read
+    """
+    def __init__(self, columns):
+        self._columns = columns
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Grade(*self._columns.row(index))
+
+    def __iter__(self):
+        for student_id, discipline_id, grade in zip(*self._columns.columns()):
+            yield Grade(student_id, discipline_id, grade)
+
+
+class ColumnarRepository(BinaryFileRepository):
+    """
+    Binary repository keeping grades in GradeColumns instead of Grade objects. Students and disciplines are stored as
+    in BinaryFileRepository. The grade row indexes are only built the first time a grade is looked up or removed.
+    Grade rows are written straight to the mapped file, and synced on flush() and close() unless fsync is 'never'.
+    """
+    def _load(self):
+        super()._load()
+        self._columns = GradeColumns(self._grades_filename)
+        self._rows_by_student = None
+        self._rows_by_discipline = None
+
+    def _load_collection(self, entity_class):
+        # the grade columns are mapped, not loaded
+        if entity_class != Grade:
+            super()._load_collection(entity_class)
+
+    def _row_indexes(self):
+        if self._rows_by_student is None:
+            # built aside and published at once, so a concurrent reader never sees half an index
+            rows_by_student = {}
+            rows_by_discipline = {}
+            student_ids, discipline_ids, grades = self._columns.columns()
+            for row, (student_id, discipline_id) in enumerate(zip(student_ids, discipline_ids)):
+                rows_by_student.setdefault(student_id, array('i')).append(row)
+                rows_by_discipline.setdefault(discipline_id, array('i')).append(row)
+            self._rows_by_discipline, self._rows_by_student = rows_by_discipline, rows_by_student
+        return self._rows_by_student, self._rows_by_discipline
+
+    @staticmethod
+    def _replace_row(index, key, row, new_row):
+        rows = index[key]
+        position = rows.index(row)
+        if new_row is None:
+            rows.pop(position)
+            if not rows:
+                del index[key]
+        else:
+            rows[position] = new_row
+
+    def _remove_row(self, row):
+        rows_by_student, rows_by_discipline = self._row_indexes()
+        student_id, discipline_id, grade = self._columns.row(row)
+        self._replace_row(rows_by_student, student_id, row, None)
+        self._replace_row(rows_by_discipline, discipline_id, row, None)
+        moved = self._columns.remove(row)
+        if moved is not None:
+            student_id, discipline_id, grade = self._columns.row(row)
+            self._replace_row(rows_by_student, student_id, moved, row)
+            self._replace_row(rows_by_discipline, discipline_id, moved, row)
+
+    def _grades_at(self, rows):
+        return [Grade(*self._columns.row(row)) for row in sorted(rows)]
+
+    def grade_student(self, grade):
+        row = self._columns.append(grade.student_id, grade.discipline_id, grade.grade)
+        if self._rows_by_student is not None:
+            self._rows_by_student.setdefault(grade.student_id, array('i')).append(row)
+            self._rows_by_discipline.setdefault(grade.discipline_id, array('i')).append(row)
+
+    def remove_grade(self, grade):
+        rows_by_student, rows_by_discipline = self._row_indexes()
+        row = next((row for row in rows_by_student.get(grade.student_id, ())
+                    if self._columns.row(row)[1:] == (grade.discipline_id, grade.grade)), None)
+        if row is None:
+            raise ValueError("Grade not found")
+        self._remove_row(row)
+
+    def remove_student(self, student):
+        rows_by_student, rows_by_discipline = self._row_indexes()
+        for row in sorted(rows_by_student.get(student.student_id, ()), reverse=True):
+            self._remove_row(row)
+        super().remove_student(student)
+
+    def remove_discipline(self, discipline):
+        rows_by_student, rows_by_discipline = self._row_indexes()
+        for row in sorted(rows_by_discipline.get(discipline.discipline_id, ()), reverse=True):
+            self._remove_row(row)
+        super().remove_discipline(discipline)
+
+    def list_grades(self):
+        return GradeColumnsView(self._columns)
+
+    def grades_page(self, offset, limit):
+        grades = GradeColumnsView(self._columns)
+        return grades[offset:offset + limit], len(grades)
+
+    def grades_for_student(self, student_id):
+        rows_by_student, rows_by_discipline = self._row_indexes()
+        return self._grades_at(rows_by_student.get(student_id, ()))
+
+    def grades_for_discipline(self, discipline_id):
+        rows_by_student, rows_by_discipline = self._row_indexes()
+        return self._grades_at(rows_by_discipline.get(discipline_id, ()))
+
+    def grade_columns(self):
+        return self._columns.columns()
+
+    @staticmethod
+    def _column_totals(keys, grades):
+        totals = {}
+        for key, grade in zip(keys, grades):
+            entry = totals.get(key)
+            if entry is None:
+                totals[key] = [grade, 1]
+            else:
+                entry[0] += grade
+                entry[1] += 1
+        return [(key, total, count) for key, (total, count) in totals.items()]
+
+    def student_grade_totals(self):
+        student_ids, discipline_ids, grades = self._columns.columns()
+        return self._column_totals(student_ids, grades)
+
+    def discipline_grade_totals(self):
+        student_ids, discipline_ids, grades = self._columns.columns()
+        return self._column_totals(discipline_ids, grades)
+
+    def compact(self):
+        with self._lock:
+            self._require(Student, Discipline)
+            for entity_class in (Student, Discipline):
+                self._rewrite(entity_class)
+            self._drop_unsaved()
+
+    def flush(self):
+        with self._lock:
+            super().flush()
+            if self._fsync != 'never':
+                self._columns.sync()
+
+    def close(self):
+        super().close()
+        self._columns.close()
+
+
+class SqliteRepository(Repository):
+    """
+    Repository stored in an SQLite database. Grades reference their student and discipline with cascading deletes and
+    are indexed by both, and the averages and searches are computed by SQLite instead of in Python.
+    """
+    def __init__(self, database_filename):
+        self._batch_depth = 0
+        # the connection may be shared by threads behind a ThreadSafeRepository, which serializes the changes
+        self._connection = sqlite3.connect(database_filename, check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        # SQLite's lower() only folds ASCII; searches lower names as Python does, like the other repositories
+        self._connection.create_function("py_lower", 1, str.lower, deterministic=True)
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS students (
+                    student_id INTEGER NOT NULL UNIQUE,
+                    name TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS disciplines (
+                    discipline_id INTEGER NOT NULL UNIQUE,
+                    name TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS grades (
+                    student_id INTEGER NOT NULL REFERENCES students (student_id) ON DELETE CASCADE,
+                    discipline_id INTEGER NOT NULL REFERENCES disciplines (discipline_id) ON DELETE CASCADE,
+                    grade INTEGER NOT NULL);
+                CREATE INDEX IF NOT EXISTS grades_by_student ON grades (student_id);
+                CREATE INDEX IF NOT EXISTS grades_by_discipline ON grades (discipline_id);
+            """)
+
+    def _execute(self, statement, parameters=()):
+        if self._batch_depth:
+            return self._connection.execute(statement, parameters)
+        with self._connection:
+            return self._connection.execute(statement, parameters)
+
+    @contextlib.contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._connection.commit()
+
+    def flush(self):
+        if not self._batch_depth:
+            self._connection.commit()
+
+    def _query(self, statement, parameters=()):
+        return self._connection.execute(statement, parameters).fetchall()
 
     def add_student(self, student):
-        self.students.append(student)
-        self._write_to_file(self._students_filename, self.students)
+        self._execute("INSERT INTO students (student_id, name) VALUES (?, ?) "
+                      "ON CONFLICT (student_id) DO UPDATE SET name = excluded.name", (student.student_id, student.name))
 
     def add_discipline(self, discipline):
-        self.disciplines.append(discipline)
-        self._write_to_file(self._disciplines_filename, self.disciplines)
+        self._execute("INSERT INTO disciplines (discipline_id, name) VALUES (?, ?) "
+                      "ON CONFLICT (discipline_id) DO UPDATE SET name = excluded.name",
+                      (discipline.discipline_id, discipline.name))
 
     def remove_student(self, student):
-        self.students = [s for s in self.students if s.student_id != student.student_id]
-        self._write_to_file(self._students_filename, self.students)
+        self._execute("DELETE FROM students WHERE student_id = ?", (student.student_id,))
 
     def remove_discipline(self, discipline):
-        self.disciplines = [d for d in self.disciplines if d.discipline_id != discipline.discipline_id]
-        self._write_to_file(self._disciplines_filename, self.disciplines)
+        self._execute("DELETE FROM disciplines WHERE discipline_id = ?", (discipline.discipline_id,))
 
     def update_student(self, student):
-        for i in range(len(self.students)):
-            if self.students[i].student_id == student.student_id:
-                self.students[i] = student
-                break
-        self._write_to_file(self._students_filename, self.students)
+        self._execute("UPDATE students SET name = ? WHERE student_id = ?", (student.name, student.student_id))
 
     def update_discipline(self, discipline):
-        for i in range(len(self.disciplines)):
-            if self.disciplines[i].discipline_id == discipline.discipline_id:
-                self.disciplines[i] = discipline
-                break
-        self._write_to_file(self._disciplines_filename, self.disciplines)
-
-    def grade_student(self, grade):
-        self.grades.append(grade)
-        self._write_to_file(self._grades_filename, self.grades)
+        self._execute("UPDATE disciplines SET name = ? WHERE discipline_id = ?",
+                      (discipline.name, discipline.discipline_id))
 
     def list_students(self):
-        return self.students
+        return [Student(*row) for row in self._query("SELECT student_id, name FROM students ORDER BY rowid")]
 
     def list_disciplines(self):
-        return self.disciplines
+        return [Discipline(*row) for row in
+                self._query("SELECT discipline_id, name FROM disciplines ORDER BY rowid")]
+
+    def grade_student(self, grade):
+        self._execute("INSERT INTO grades (student_id, discipline_id, grade) VALUES (?, ?, ?)",
+                      (grade.student_id, grade.discipline_id, grade.grade))
 
     def list_grades(self):
-        return self.grades
+        return [Grade(*row) for row in
+                self._query("SELECT student_id, discipline_id, grade FROM grades ORDER BY rowid")]
+
+    def _page(self, table, columns, entity_class, offset, limit):
+        rows = self._query(f"SELECT {columns} FROM {table} ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset))
+        (total,), = self._query(f"SELECT COUNT(*) FROM {table}")
+        return [entity_class(*row) for row in rows], total
+
+    def students_page(self, offset, limit):
+        return self._page("students", "student_id, name", Student, offset, limit)
+
+    def disciplines_page(self, offset, limit):
+        return self._page("disciplines", "discipline_id, name", Discipline, offset, limit)
+
+    def grades_page(self, offset, limit):
+        return self._page("grades", "student_id, discipline_id, grade", Grade, offset, limit)
 
     def get_student(self, student_id):
-        return next((student for student in self.students if student.student_id == student_id), None)
+        rows = self._query("SELECT student_id, name FROM students WHERE student_id = ?", (student_id,))
+        return Student(*rows[0]) if rows else None
+
+    def get_discipline(self, discipline_id):
+        rows = self._query("SELECT discipline_id, name FROM disciplines WHERE discipline_id = ?", (discipline_id,))
+        return Discipline(*rows[0]) if rows else None
+
+    def exists_student(self, student_id):
+        return bool(self._query("SELECT 1 FROM students WHERE student_id = ?", (student_id,)))
+
+    def exists_discipline(self, discipline_id):
+        return bool(self._query("SELECT 1 FROM disciplines WHERE discipline_id = ?", (discipline_id,)))
 
     def remove_grade(self, grade):
-        self.grades.remove(grade)()
+        cursor = self._execute("DELETE FROM grades WHERE rowid = (SELECT rowid FROM grades WHERE student_id = ? AND "
+                               "discipline_id = ? AND grade = ? LIMIT 1)",
+                               (grade.student_id, grade.discipline_id, grade.grade))
+        if cursor.rowcount == 0:
+            raise ValueError("Grade not found")
+
+    def grades_for_student(self, student_id):
+        return [Grade(*row) for row in self._query("SELECT student_id, discipline_id, grade FROM grades "
+                                                   "WHERE student_id = ? ORDER BY rowid", (student_id,))]
+
+    def grades_for_discipline(self, discipline_id):
+        return [Grade(*row) for row in self._query("SELECT student_id, discipline_id, grade FROM grades "
+                                                   "WHERE discipline_id = ? ORDER BY rowid", (discipline_id,))]
+
+    def grade_columns(self):
+        columns = (array('q'), array('q'), array('q'))
+        for row in self._connection.execute("SELECT student_id, discipline_id, grade FROM grades ORDER BY rowid"):
+            for column, value in zip(columns, row):
+                column.append(value)
+        return columns
+
+    def student_grade_totals(self):
+        return self._query("SELECT student_id, SUM(grade), COUNT(*) FROM grades GROUP BY student_id")
+
+    def discipline_grade_totals(self):
+        return self._query("SELECT discipline_id, SUM(grade), COUNT(*) FROM grades GROUP BY discipline_id")
+
+    def _search(self, table, id_column, search_string, limit, prefix):
+        search_string = search_string.lower()
+        if prefix:
+            # a word prefix is the query found right after a space, once a space is put in front of the text
+            condition = f"instr(' ' || CAST({id_column} AS TEXT), ?) > 0 OR instr(' ' || py_lower(name), ?) > 0"
+            search_string = " " + search_string
+        else:
+            condition = f"instr(CAST({id_column} AS TEXT), ?) > 0 OR instr(py_lower(name), ?) > 0"
+        return self._query(f"SELECT {id_column}, name FROM {table} WHERE {condition} ORDER BY rowid LIMIT ?",
+                           (search_string, search_string, -1 if limit is None else limit))
+
+    def search_students(self, search_string, limit=None, prefix=False):
+        return [Student(*row) for row in self._search("students", "student_id", search_string, limit, prefix)]
+
+    def search_disciplines(self, search_string, limit=None, prefix=False):
+        return [Discipline(*row) for row in
+                self._search("disciplines", "discipline_id", search_string, limit, prefix)]
+
+    def close(self):
+        self._connection.close()
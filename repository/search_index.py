@@ -0,0 +1,70 @@
+class NGramIndex:
+    """
+    Case-insensitive substring index over a few texts per key. Every trigram of every text points to the keys whose
+    texts contain it, so a query of three or more characters only checks the keys holding all of its trigrams.
+    Shorter queries go over the texts in order, stopping as soon as the limit is reached. Results keep the order the
+    keys were added in, and updating a key keeps its place.
+    """
+    n = 3
+
+    def __init__(self):
+        self._texts = {}
+        self._ranks = {}
+        self._postings = {}
+        self._next_rank = 0
+
+    def _grams(self, texts):
+        return {text[i:i + self.n] for text in texts for i in range(len(text) - self.n + 1)}
+
+    def add(self, key, *texts):
+        """
+        Index the texts of a key, replacing the texts it had before
+        """
+        texts = tuple(text.lower() for text in texts)
+        if key in self._texts:
+            self._unlink(key)
+        else:
+            self._ranks[key] = self._next_rank
+            self._next_rank += 1
+        self._texts[key] = texts
+        for gram in self._grams(texts):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        self._unlink(key)
+        del self._texts[key]
+        del self._ranks[key]
+
+    def _unlink(self, key):
+        for gram in self._grams(self._texts[key]):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    @staticmethod
+    def _matches(texts, query, prefix):
+        if prefix:
+            return any(text.startswith(query) or " " + query in text for text in texts)
+        return any(query in text for text in texts)
+
+    def search(self, query, limit=None, prefix=False):
+        """
+        :param query: the text to look for
+        :param limit: the most keys to return, all of them when None
+        :param prefix: only match the query at the start of a text or of a word in it
+        :return: the matching keys, in the order they were added
+        """
+        query = query.lower()
+        if len(query) < self.n:
+            candidates = self._texts
+        else:
+            postings = sorted((self._postings.get(gram, set()) for gram in self._grams((query,))), key=len)
+            candidates = sorted(postings[0].intersection(*postings[1:]), key=self._ranks.__getitem__)
+        keys = []
+        for key in candidates:
+            if limit is not None and len(keys) >= limit:
+                break
+            if self._matches(self._texts[key], query, prefix):
+                keys.append(key)
+        return keys
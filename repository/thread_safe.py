@@ -0,0 +1,165 @@
+import contextlib
+import threading
+from array import array
+from src.repository import Repository
+
+
+class ReadWriteLock:
+    """
+    Lets many threads read at the same time, or one thread write. A waiting writer keeps new readers out, so a steady
+    stream of readers cannot starve it. The writing thread may take the lock again, to read or to write, but a reader
+    must not ask for the write lock.
+    """
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def reading(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def writing(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+                self._waiting_writers -= 1
+                self._writer = me
+            self._writes += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writes -= 1
+                if not self._writes:
+                    self._writer = None
+                    self._condition.notify_all()
+
+
+class ThreadSafeRepository(Repository):
+    """
+    Wraps any repository so it can be shared between threads. Reads run together under the read lock and return
+    copies, never views of the wrapped repository's state, so a caller iterating a result cannot see a later change.
+    Changes run alone under the write lock, and a batch holds the write lock until it exits, which makes a whole
+    Services operation and its undo registration one atomic step. The version counts the changes made so far, so
+    a reader can tell whether anything changed since it last looked.
+    """
+    def __init__(self, repository):
+        self.repository = repository
+        self.version = 0
+        self._lock = ReadWriteLock()
+
+    def _read(self, method, *args):
+        with self._lock.reading():
+            return method(*args)
+
+    def _write(self, method, *args):
+        with self._lock.writing():
+            self.version += 1
+            return method(*args)
+
+    def add_student(self, student):
+        self._write(self.repository.add_student, student)
+
+    def add_discipline(self, discipline):
+        self._write(self.repository.add_discipline, discipline)
+
+    def remove_student(self, student):
+        self._write(self.repository.remove_student, student)
+
+    def remove_discipline(self, discipline):
+        self._write(self.repository.remove_discipline, discipline)
+
+    def update_student(self, student):
+        self._write(self.repository.update_student, student)
+
+    def update_discipline(self, discipline):
+        self._write(self.repository.update_discipline, discipline)
+
+    def grade_student(self, grade):
+        self._write(self.repository.grade_student, grade)
+
+    def remove_grade(self, grade):
+        self._write(self.repository.remove_grade, grade)
+
+    def list_students(self):
+        return list(self._read(self.repository.list_students))
+
+    def list_disciplines(self):
+        return list(self._read(self.repository.list_disciplines))
+
+    def list_grades(self):
+        with self._lock.reading():
+            return list(self.repository.list_grades())
+
+    def students_page(self, offset, limit):
+        return self._read(self.repository.students_page, offset, limit)
+
+    def disciplines_page(self, offset, limit):
+        return self._read(self.repository.disciplines_page, offset, limit)
+
+    def grades_page(self, offset, limit):
+        return self._read(self.repository.grades_page, offset, limit)
+
+    def get_student(self, student_id):
+        return self._read(self.repository.get_student, student_id)
+
+    def get_discipline(self, discipline_id):
+        return self._read(self.repository.get_discipline, discipline_id)
+
+    def exists_student(self, student_id):
+        return self._read(self.repository.exists_student, student_id)
+
+    def exists_discipline(self, discipline_id):
+        return self._read(self.repository.exists_discipline, discipline_id)
+
+    def grades_for_student(self, student_id):
+        return list(self._read(self.repository.grades_for_student, student_id))
+
+    def grades_for_discipline(self, discipline_id):
+        return list(self._read(self.repository.grades_for_discipline, discipline_id))
+
+    def grade_columns(self):
+        # columns may be views of the wrapped repository's storage, valid only until its next change
+        with self._lock.reading():
+            return tuple(array('q', column) for column in self.repository.grade_columns())
+
+    def student_grade_totals(self):
+        return self._read(self.repository.student_grade_totals)
+
+    def discipline_grade_totals(self):
+        return self._read(self.repository.discipline_grade_totals)
+
+    def search_students(self, search_string, limit=None, prefix=False):
+        return self._read(self.repository.search_students, search_string, limit, prefix)
+
+    def search_disciplines(self, search_string, limit=None, prefix=False):
+        return self._read(self.repository.search_disciplines, search_string, limit, prefix)
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self._lock.writing(), self.repository.batch():
+            yield
+
+    def flush(self):
+        with self._lock.writing():
+            self.repository.flush()
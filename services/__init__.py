@@ -1,7 +1,13 @@
-import random
+import itertools
+import os
+import sys
+import threading
 from src.domain import Student, Discipline, Grade
-from src.repository import MemoryRepository, TextFileRepository, BinaryFileRepository
-from src.services.undo_services import UndoService, Command, Operation
+from src.repository import (MemoryRepository, TextFileRepository, BinaryFileRepository, JournaledTextFileRepository,
+                            ColumnarRepository, SqliteRepository)
+from src.services.undo_services import UndoService, UndoLog, Command, Operation
+from src.services.statistics import StatisticsEngine, RunningAverages
+from src.services.generators import DataGenerator
 
 
 class StudentIdInvalidInput(Exception):
@@ -50,9 +56,29 @@ class InvalidSearchString(Exception):
 
 
 class Services:
-    def __init__(self, repository):
+    # bounds of the undo history, and how often it takes a checkpoint of the data to replay long undos from
+    undo_limit = 1000
+    undo_memory_limit = 64 * 1024 * 1024
+    undo_checkpoint_interval = 500
+    undo_checkpoint_memory_limit = 64 * 1024 * 1024
+
+    def __init__(self, repository, statistics_engine=None, undo_log=None):
+        """
+        :param repository: the repository holding the students, disciplines and grades
+        :param statistics_engine: optional StatisticsEngine used for the grade statistics
+        """
         self.repository = repository
-        self.undo_service = UndoService()
+        self.statistics_engine = statistics_engine
+        # every operation, undo and redo included, runs in a repository batch: it is persisted once and, behind a
+        # ThreadSafeRepository, holds the write lock from its checks to its undo registration
+        log = UndoLog(undo_log, self, (Student, Discipline, Grade)) if undo_log is not None else None
+        self.undo_service = UndoService(repository.batch, self.undo_limit, self.undo_memory_limit, self._checkpoint,
+                                        self._restore_checkpoint, self.undo_checkpoint_interval, log,
+                                        self.undo_checkpoint_memory_limit)
+        self._running_averages = None
+        # guards the running averages, which changes update under the repository write lock while reports read them;
+        # never held while calling the repository, so it cannot deadlock with the repository lock
+        self._averages_lock = threading.RLock()
 
     def add_student(self, student_id, name):
         """
@@ -61,16 +87,17 @@ class Services:
         :param name: student name
         :return: adds the student to the repository
         """
-        if not isinstance(student_id, int):
-            raise StudentIdInvalidInput
-        if any(student.student_id == student_id for student in self.repository.list_students()):
-            raise StudentIdAlreadyExists
-        student = Student(student_id, name)
-        self.repository.add_student(student)
-        undo_command = Command(self.repository.remove_student, student)
-        redo_command = Command(self.repository.add_student, student)
-        operation = Operation(undo_command, redo_command)
-        self.undo_service.register(operation)
+        with self.repository.batch():
+            if not isinstance(student_id, int):
+                raise StudentIdInvalidInput
+            if self.repository.exists_student(student_id):
+                raise StudentIdAlreadyExists
+            student = Student(student_id, name)
+            self._insert_student(student)
+            undo_command = Command(self._delete_student, student)
+            redo_command = Command(self._insert_student, student)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
 
     def remove_student(self, student_id):
         """
@@ -78,14 +105,15 @@ class Services:
         :param student_id: student id
         :return: removes the student from the repository
         """
-        student = next((student for student in self.repository.list_students() if student.student_id == student_id), None)
-        if student is None:
-            raise StudentNotFound
-        self.repository.remove_student(student)
-        undo_command = Command(self.repository.add_student, student)
-        redo_command = Command(self.repository.remove_student, student)
-        operation = Operation(undo_command, redo_command)
-        self.undo_service.register(operation)
+        with self.repository.batch():
+            student = self.repository.get_student(student_id)
+            if student is None:
+                raise StudentNotFound
+            grades = self._delete_student(student)
+            undo_command = Command(self._restore_student, student, grades)
+            redo_command = Command(self._delete_student, student)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
 
     def add_discipline(self, discipline_id, name):
         """
@@ -94,16 +122,17 @@ class Services:
         :param name: discipline name
         :return: adds the discipline to the repository
         """
-        if not isinstance(discipline_id, int):
-            raise DisciplineIdInvalidInput
-        if any(discipline.discipline_id == discipline_id for discipline in self.repository.list_disciplines()):
-            raise DisciplineIdAlreadyExists
-        discipline = Discipline(discipline_id, name)
-        self.repository.add_discipline(discipline)
-        undo_command = Command(self.repository.remove_discipline, discipline)
-        redo_command = Command(self.repository.add_discipline, discipline)
-        operation = Operation(undo_command, redo_command)
-        self.undo_service.register(operation)
+        with self.repository.batch():
+            if not isinstance(discipline_id, int):
+                raise DisciplineIdInvalidInput
+            if self.repository.exists_discipline(discipline_id):
+                raise DisciplineIdAlreadyExists
+            discipline = Discipline(discipline_id, name)
+            self._insert_discipline(discipline)
+            undo_command = Command(self._delete_discipline, discipline)
+            redo_command = Command(self._insert_discipline, discipline)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
 
     def remove_discipline(self, discipline_id):
         """
@@ -111,16 +140,221 @@ class Services:
         :param discipline_id: the discipline id
         :return: removes the discipline from the repository
         """
-        discipline = next(
-            (discipline for discipline in self.repository.list_disciplines()
-             if discipline.discipline_id == discipline_id), None)
-        if discipline is None:
-            raise DisciplineNotFound
+        with self.repository.batch():
+            discipline = self.repository.get_discipline(discipline_id)
+            if discipline is None:
+                raise DisciplineNotFound
+            grades = self._delete_discipline(discipline)
+            undo_command = Command(self._restore_discipline, discipline, grades)
+            redo_command = Command(self._delete_discipline, discipline)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
+
+    def add_students_bulk(self, students):
+        """
+        Add many students as one undoable operation, persisted once
+        :param students: iterable of (student id, name) pairs
+        :return: adds every student to the repository, or none of them if any is invalid
+        """
+        with self.repository.batch():
+            new_students = []
+            new_ids = set()
+            for student_id, name in students:
+                if not isinstance(student_id, int):
+                    raise StudentIdInvalidInput
+                if student_id in new_ids or self.repository.exists_student(student_id):
+                    raise StudentIdAlreadyExists
+                new_ids.add(student_id)
+                new_students.append(Student(student_id, name))
+            self._insert_students(new_students)
+            undo_command = Command(self._delete_students, new_students)
+            redo_command = Command(self._insert_students, new_students)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
+
+    def add_disciplines_bulk(self, disciplines):
+        """
+        Add many disciplines as one undoable operation, persisted once
+        :param disciplines: iterable of (discipline id, name) pairs
+        :return: adds every discipline to the repository, or none of them if any is invalid
+        """
+        with self.repository.batch():
+            new_disciplines = []
+            new_ids = set()
+            for discipline_id, name in disciplines:
+                if not isinstance(discipline_id, int):
+                    raise DisciplineIdInvalidInput
+                if discipline_id in new_ids or self.repository.exists_discipline(discipline_id):
+                    raise DisciplineIdAlreadyExists
+                new_ids.add(discipline_id)
+                new_disciplines.append(Discipline(discipline_id, name))
+            self._insert_disciplines(new_disciplines)
+            undo_command = Command(self._delete_disciplines, new_disciplines)
+            redo_command = Command(self._insert_disciplines, new_disciplines)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
+
+    def grade_students_bulk(self, grades):
+        """
+        Grade many students as one undoable operation, persisted once
+        :param grades: iterable of (student id, discipline id, grade) tuples
+        :return: adds every grade to the repository, or none of them if any student or discipline does not exist
+        """
+        with self.repository.batch():
+            known_students = set()
+            known_disciplines = set()
+            new_grades = []
+            for student_id, discipline_id, grade_value in grades:
+                if student_id not in known_students:
+                    if not self.repository.exists_student(student_id):
+                        raise StudentNotFound
+                    known_students.add(student_id)
+                if discipline_id not in known_disciplines:
+                    if not self.repository.exists_discipline(discipline_id):
+                        raise DisciplineNotFound
+                    known_disciplines.add(discipline_id)
+                new_grades.append(Grade(student_id, discipline_id, grade_value))
+            self._insert_grades(new_grades)
+            undo_command = Command(self._delete_grades, new_grades)
+            redo_command = Command(self._insert_grades, new_grades)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
+
+    def _insert_students(self, students):
+        with self.repository.batch():
+            for student in students:
+                self._insert_student(student)
+
+    def _delete_students(self, students):
+        with self.repository.batch():
+            for student in reversed(students):
+                self._delete_student(student)
+
+    def _insert_disciplines(self, disciplines):
+        with self.repository.batch():
+            for discipline in disciplines:
+                self._insert_discipline(discipline)
+
+    def _delete_disciplines(self, disciplines):
+        with self.repository.batch():
+            for discipline in reversed(disciplines):
+                self._delete_discipline(discipline)
+
+    def _insert_grades(self, grades):
+        with self.repository.batch():
+            for grade in grades:
+                self._insert_grade(grade)
+
+    def _delete_grades(self, grades):
+        with self.repository.batch():
+            for grade in reversed(grades):
+                self._delete_grade(grade)
+
+    def _insert_student(self, student):
+        self.repository.add_student(student)
+        with self._averages_lock:
+            if self._running_averages is not None:
+                self._running_averages.students.add_key(student.student_id)
+
+    def _insert_discipline(self, discipline):
+        self.repository.add_discipline(discipline)
+        with self._averages_lock:
+            if self._running_averages is not None:
+                self._running_averages.disciplines.add_key(discipline.discipline_id)
+
+    def _insert_grade(self, grade):
+        self.repository.grade_student(grade)
+        with self._averages_lock:
+            if self._running_averages is not None:
+                self._running_averages.add(grade)
+
+    def _delete_grade(self, grade):
+        self.repository.remove_grade(grade)
+        with self._averages_lock:
+            if self._running_averages is not None:
+                self._running_averages.remove(grade)
+
+    def _delete_student(self, student):
+        grades = self.repository.grades_for_student(student.student_id)
+        self.repository.remove_student(student)
+        with self._averages_lock:
+            if self._running_averages is not None:
+                for grade in grades:
+                    self._running_averages.remove(grade)
+                self._running_averages.students.remove_key(student.student_id)
+        return grades
+
+    def _delete_discipline(self, discipline):
+        grades = self.repository.grades_for_discipline(discipline.discipline_id)
         self.repository.remove_discipline(discipline)
-        undo_command = Command(self.repository.add_discipline, discipline)
-        redo_command = Command(self.repository.remove_discipline, discipline)
-        operation = Operation(undo_command, redo_command)
-        self.undo_service.register(operation)
+        with self._averages_lock:
+            if self._running_averages is not None:
+                for grade in grades:
+                    self._running_averages.remove(grade)
+                self._running_averages.disciplines.remove_key(discipline.discipline_id)
+        return grades
+
+    def _restore_student(self, student, grades):
+        with self.repository.batch():
+            self._insert_student(student)
+            self._insert_grades(grades)
+
+    def _restore_discipline(self, discipline, grades):
+        with self.repository.batch():
+            self._insert_discipline(discipline)
+            self._insert_grades(grades)
+
+    def _checkpoint(self, limit=None):
+        """
+        :param limit: the most estimated bytes the snapshot may take, no limit when None
+        :return: a snapshot of the repository and its estimated size, or None when the estimate, made from the counts
+        alone, is over the limit; the entities are shared with the repository, so only the lists count
+        """
+        if limit is not None:
+            counts = (self.repository.students_page(0, 0)[1], self.repository.disciplines_page(0, 0)[1],
+                      self.repository.grades_page(0, 0)[1])
+            if sum(sys.getsizeof([]) + count * 8 for count in counts) > limit:
+                return None
+        snapshot = (self.repository.list_students(), self.repository.list_disciplines(),
+                    list(self.repository.list_grades()))
+        return snapshot, sum(sys.getsizeof(part) for part in snapshot)
+
+    def _restore_checkpoint(self, snapshot):
+        students, disciplines, grades = snapshot
+        with self.repository.batch():
+            for student in self.repository.list_students():
+                self.repository.remove_student(student)
+            for discipline in self.repository.list_disciplines():
+                self.repository.remove_discipline(discipline)
+            for grade in self.repository.list_grades():
+                self.repository.remove_grade(grade)
+            for student in students:
+                self.repository.add_student(student)
+            for discipline in disciplines:
+                self.repository.add_discipline(discipline)
+            for grade in grades:
+                self.repository.grade_student(grade)
+        self._running_averages = None
+
+    def _averages(self):
+        """
+        Running grade totals per student and discipline, read from the repository once and then updated by every
+        change made through the services, including undo and redo
+        """
+        averages = self._running_averages
+        if averages is None:
+            # read in a batch, so no change can come between the reads and the first update of the averages
+            with self.repository.batch():
+                averages = self._running_averages
+                if averages is None:
+                    averages = RunningAverages(
+                        [student.student_id for student in self.repository.list_students()],
+                        [discipline.discipline_id for discipline in self.repository.list_disciplines()],
+                        self.repository.student_grade_totals(),
+                        self.repository.discipline_grade_totals())
+                    with self._averages_lock:
+                        self._running_averages = averages
+        return averages
 
     def list_students(self):
         students = self.repository.list_students()
@@ -136,155 +370,206 @@ class Services:
         else:
             return []
 
-    def generate_students(self, n):
-        family_names = ["Joldes", "Onet", "Burz", "Goia", "Balea", "Pasca", "Vasiu"]
-        given_names = ["Costin", "Cristian", "Ionut", "Alexia", "Andra", "Rares", "Andrei"]
-        current_id = 1
-
-        while n > 0:
-            name = random.choice(family_names) + " " + random.choice(given_names)
-            self.add_student(current_id, name)
-            current_id += 1
-            n -= 1
-
-    def generate_disciplines(self, n):
-        disciplines = ["Math", "English", "French", "German", "Spanish", "History", "Geography", "Physics", "Chemistry",
-                       "Biology", "Computer Science", "Economics", "Philosophy", "Psychology", "Sociology",
-                       "Physical Education", "Music", "Art", "Religion", "Civic Education", "Latin", "Greek",
-                       "Romanian"]
-        current_id = 1
-
-        while n > 0:
-            name = random.choice(disciplines)
-            self.add_discipline(current_id, name)
-            current_id += 1
-            n -= 1
+    def generate_students(self, n, seed=None):
+        """
+        Add n random students with ids from 1, as one undoable operation
+        :param seed: the seed of the random names, different ones every time when None
+        """
+        self.add_students_bulk((student.student_id, student.name) for student in DataGenerator(seed).students(n))
+
+    def generate_disciplines(self, n, seed=None):
+        """
+        Add n random disciplines with ids from 1, as one undoable operation
+        :param seed: the seed of the random names, different ones every time when None
+        """
+        self.add_disciplines_bulk((discipline.discipline_id, discipline.name)
+                                  for discipline in DataGenerator(seed).disciplines(n))
 
     def grade_student(self, student_id, discipline_id, grade_value):
-        student = next((student for student in self.repository.list_students() if student.student_id == student_id),
-                       None)
-        if student is None:
-            raise StudentNotFound
-        discipline = next((discipline for discipline in self.repository.list_disciplines() if
-                           discipline.discipline_id == discipline_id), None)
-        if discipline is None:
-            raise DisciplineNotFound
-        grade = Grade(student_id, discipline_id, grade_value)
-        self.repository.grade_student(grade)
-        undo_command = Command(self.repository.remove_grade, grade)
-        redo_command = Command(self.repository.grade_student, grade)
-        operation = Operation(undo_command, redo_command)
-        self.undo_service.register(operation)
+        with self.repository.batch():
+            if not self.repository.exists_student(student_id):
+                raise StudentNotFound
+            if not self.repository.exists_discipline(discipline_id):
+                raise DisciplineNotFound
+            grade = Grade(student_id, discipline_id, grade_value)
+            self._insert_grade(grade)
+            undo_command = Command(self._delete_grade, grade)
+            redo_command = Command(self._insert_grade, grade)
+            operation = Operation(undo_command, redo_command)
+            self.undo_service.register(operation)
 
     def list_students_with_grades(self):
-        grades = self.repository.list_grades()
+        students = {student.student_id: student for student in self.repository.list_students()}
+        disciplines = {discipline.discipline_id: discipline for discipline in self.repository.list_disciplines()}
         students_with_grades = []
-        for grade in grades:
-            student = next(
-                (student for student in self.repository.list_students() if student.student_id == grade.student_id),
-                None)
-            discipline = next((discipline for discipline in self.repository.list_disciplines() if
-                               discipline.discipline_id == grade.discipline_id), None)
+        for grade in self.repository.list_grades():
+            student = students.get(grade.student_id)
+            discipline = disciplines.get(grade.discipline_id)
             if student and discipline:
                 students_with_grades.append((student, discipline, grade.grade))
         return students_with_grades
 
-    def generate_grades(self, n):
-        students = self.repository.list_students()
-        disciplines = self.repository.list_disciplines()
-        current_id = 1
-
-        while n > 0:
-            student = random.choice(students)
-            discipline = random.choice(disciplines)
-            grade_value = random.randint(1, 10)
-            grade = Grade(student.student_id, discipline.discipline_id, grade_value)
-            self.repository.grade_student(grade)
-            current_id += 1
-            n -= 1
-
-    def search_students(self, search_string):
+    def iter_students_with_grades(self):
+        """
+        Stream the grades grouped by student and discipline, one student at a time
+        :return: a generator of (student, discipline, grade values) tuples, in student list order
+        """
+        disciplines = {discipline.discipline_id: discipline for discipline in self.repository.list_disciplines()}
+        for student in self.repository.list_students():
+            grades_by_discipline = {}
+            for grade in self.repository.grades_for_student(student.student_id):
+                grades_by_discipline.setdefault(grade.discipline_id, []).append(grade.grade)
+            for discipline_id, grades in grades_by_discipline.items():
+                discipline = disciplines.get(discipline_id)
+                if discipline is not None:
+                    yield student, discipline, grades
+
+    def generate_grades(self, n, seed=None, distribution="uniform"):
+        """
+        Add n random grades of the existing students in the existing disciplines, as one undoable operation
+        :param seed: the seed of the random grades, different ones every time when None
+        :param distribution: the name of a distribution in GRADE_DISTRIBUTIONS, or a function drawing a grade
+        """
+        student_ids = [student.student_id for student in self.repository.list_students()]
+        discipline_ids = [discipline.discipline_id for discipline in self.repository.list_disciplines()]
+        grades = DataGenerator(seed).grades(student_ids, discipline_ids, n, distribution)
+        self.grade_students_bulk((grade.student_id, grade.discipline_id, grade.grade) for grade in grades)
+
+    def search_students(self, search_string, limit=None, prefix=False):
+        """
+        Students whose id or name contains the search string, ignoring case
+        :param search_string: the text to look for
+        :param limit: the most students to return, all of them when None
+        :param prefix: only match the start of the id or of a word in the name, for search as you type
+        :return: the matching students, in list order
+        """
         if not isinstance(search_string, str):
             raise InvalidSearchString
-        search_string = search_string.lower()
-        matching_students = [student for student in self.repository.list_students()
-                             if search_string in str(student.student_id).lower() or
-                             search_string in student.name.lower()]
-        return matching_students
+        return self.repository.search_students(search_string, limit, prefix)
 
-    def search_disciplines(self, search_string):
+    def search_disciplines(self, search_string, limit=None, prefix=False):
+        """
+        Disciplines whose id or name contains the search string, ignoring case
+        :param search_string: the text to look for
+        :param limit: the most disciplines to return, all of them when None
+        :param prefix: only match the start of the id or of a word in the name, for search as you type
+        :return: the matching disciplines, in list order
+        """
         if not isinstance(search_string, str):
             raise InvalidSearchString
-        search_string = search_string.lower()
-        matching_disciplines = [discipline for discipline in self.repository.list_disciplines()
-                                if search_string in str(discipline.discipline_id).lower() or
-                                search_string in discipline.name.lower()]
-        return matching_disciplines
+        return self.repository.search_disciplines(search_string, limit, prefix)
 
     def get_failing_students(self):
-        students = self.repository.list_students()
-        grades = self.repository.list_grades()
-        failing_students = []
-        for student in students:
-            student_grades = [grade.grade for grade in grades if grade.student_id == student.student_id]
-            if student_grades and sum(student_grades) / len(student_grades) < 5:
-                failing_students.append(student)
+        averages = self._averages()
+        with self._averages_lock:
+            student_ids = averages.students.below(5)
+        students = (self.repository.get_student(student_id) for student_id in student_ids)
+        failing_students = [student for student in students if student is not None]
         if not failing_students:
             raise StudentListIsEmpty
         return failing_students
 
-    def get_best_students(self):
-        students = self.repository.list_students()
-        grades = self.repository.list_grades()
-        student_averages = []
-        for student in students:
-            student_grades = [grade.grade for grade in grades if grade.student_id == student.student_id]
-            if student_grades:
-                average = sum(student_grades) / len(student_grades)
-                if average >= 5:
-                    student_averages.append((student, average))
-        student_averages.sort(key=lambda x: x[1], reverse=True)
-        if not student_averages:
+    def get_best_students(self, limit=None):
+        """
+        Students with an average of at least 5, best first
+        :param limit: the most students to return, all of them when None
+        :return: the list of students
+        """
+        averages = self._averages()
+        with self._averages_lock:
+            ranked = list(itertools.islice(averages.students.ranked(5), limit))
+        # a student removed since the ranking was copied is left out
+        students = (self.repository.get_student(student_id) for student_id, average in ranked)
+        best_students = [student for student in students if student is not None]
+        if not best_students:
             raise StudentListIsEmpty
-        return [student for student, average in student_averages]
+        return best_students
 
-    def get_best_disciplines(self):
-        disciplines = self.repository.list_disciplines()
-        grades = self.repository.list_grades()
-        discipline_averages = []
-        for discipline in disciplines:
-            discipline_grades = [grade.grade for grade in grades
-                                 if grade.discipline_id == discipline.discipline_id]
-            if discipline_grades:
-                average = sum(discipline_grades) / len(discipline_grades)
-                if average >= 5:
-                    discipline_averages.append((discipline, average))
-        discipline_averages.sort(key=lambda x: x[1], reverse=True)
-        if not discipline_averages:
+    def get_best_disciplines(self, limit=None):
+        """
+        Disciplines with an average of at least 5, best first
+        :param limit: the most disciplines to return, all of them when None
+        :return: the list of disciplines
+        """
+        averages = self._averages()
+        with self._averages_lock:
+            ranked = list(itertools.islice(averages.disciplines.ranked(5), limit))
+        disciplines = (self.repository.get_discipline(discipline_id) for discipline_id, average in ranked)
+        best_disciplines = [discipline for discipline in disciplines if discipline is not None]
+        if not best_disciplines:
             raise DisciplineListIsEmpty
-        return [discipline for discipline, average in discipline_averages]
+        return best_disciplines
+
+    def get_student_statistics(self):
+        """
+        Grade count, average, median, standard deviation and percentiles of every student with grades
+        :return: a list of (student, GradeStatistics) pairs
+        """
+        return (self.statistics_engine or StatisticsEngine(self.repository)).student_statistics()
+
+    def get_discipline_statistics(self):
+        """
+        Grade count, average, median, standard deviation and percentiles of every discipline with grades
+        :return: a list of (discipline, GradeStatistics) pairs
+        """
+        return (self.statistics_engine or StatisticsEngine(self.repository)).discipline_statistics()
 
     def list_grades_1(self):
         return self.repository.list_grades()
 
 
-def initialize_repository():
+def read_settings():
     settings = {}
     with open('settings.properties', 'r') as f:
         for line in f:
             key, value = line.strip().split(' = ')
             settings[key] = value
+    return settings
+
+
+def undo_log_path(settings):
+    """
+    :return: the undo_log setting, by default undo_log.jsonl next to the data files, or None for a
+    MemoryRepository, whose history cannot outlive it
+    """
+    if 'undo_log' in settings:
+        return settings['undo_log']
+    if settings['repository'] == 'MemoryRepository':
+        return None
+    data_file = settings.get('database', 'students.db') if settings['repository'] == 'SqliteRepository' else \
+        settings['students']
+    return os.path.join(os.path.dirname(data_file), 'undo_log.jsonl')
+
+
+def initialize_repository(settings=None):
+    if settings is None:
+        settings = read_settings()
 
     repository_type = settings['repository']
+    if repository_type == 'SqliteRepository':
+        return SqliteRepository(settings.get('database', 'students.db'))
     students_file = settings['students']
     disciplines_file = settings['disciplines']
     grades_file = settings['grades']
+    # write-behind: save at most every flush_interval seconds or every flush_after changes instead of on each change
+    flush_interval = float(settings['flush_interval']) if 'flush_interval' in settings else None
+    flush_after = int(settings['flush_after']) if 'flush_after' in settings else None
+    fsync = settings.get('fsync', 'batched')
 
     if repository_type == 'MemoryRepository':
         return MemoryRepository()
     elif repository_type == 'BinaryFileRepository':
-        return BinaryFileRepository(students_file, disciplines_file, grades_file)
+        return BinaryFileRepository(students_file, disciplines_file, grades_file, flush_interval=flush_interval,
+                                    flush_after=flush_after, fsync=fsync)
     elif repository_type == 'TextFileRepository':
-        return TextFileRepository(students_file, disciplines_file, grades_file)
+        return TextFileRepository(students_file, disciplines_file, grades_file, flush_interval=flush_interval,
+                                  flush_after=flush_after, fsync=fsync)
+    elif repository_type == 'ColumnarRepository':
+        return ColumnarRepository(students_file, disciplines_file, grades_file, flush_interval=flush_interval,
+                                  flush_after=flush_after, fsync=fsync)
+    elif repository_type == 'JournaledTextFileRepository':
+        return JournaledTextFileRepository(students_file, disciplines_file, grades_file,
+                                           settings.get('journal', 'journal.txt'), flush_interval=flush_interval,
+                                           flush_after=flush_after, fsync=fsync)
     else:
         raise ValueError(f"Invalid repository type: {repository_type}")
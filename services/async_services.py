@@ -0,0 +1,118 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from src.repository.thread_safe import ThreadSafeRepository
+from src.services import Services
+
+
+class AsyncServices:
+    """
+    Coroutine counterpart of Services for asyncio programs. Every call runs the matching Services method on a thread
+    pool, so reading and writing the repository files never blocks the event loop. The repository is wrapped in a
+    ThreadSafeRepository, which lets calls awaited at the same time run side by side: reads proceed together and
+    each change or undo is applied as one atomic operation.
+    """
+    def __init__(self, repository, statistics_engine=None, executor=None, max_workers=None):
+        """
+        :param repository: the repository to use, wrapped in a ThreadSafeRepository unless it already is one
+        :param statistics_engine: optional StatisticsEngine used for the grade statistics
+        :param executor: the executor running the calls, a thread pool owned by the facade when None
+        :param max_workers: the size of the owned thread pool
+        """
+        if not isinstance(repository, ThreadSafeRepository):
+            repository = ThreadSafeRepository(repository)
+        self.services = Services(repository, statistics_engine)
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers, thread_name_prefix="services")
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    async def add_student(self, student_id, name):
+        return await self._run(self.services.add_student, student_id, name)
+
+    async def remove_student(self, student_id):
+        return await self._run(self.services.remove_student, student_id)
+
+    async def add_discipline(self, discipline_id, name):
+        return await self._run(self.services.add_discipline, discipline_id, name)
+
+    async def remove_discipline(self, discipline_id):
+        return await self._run(self.services.remove_discipline, discipline_id)
+
+    async def grade_student(self, student_id, discipline_id, grade_value):
+        return await self._run(self.services.grade_student, student_id, discipline_id, grade_value)
+
+    async def grade_students(self, grades):
+        """
+        Submit many independent grades at once, each as its own undoable operation
+        :param grades: iterable of (student id, discipline id, grade) tuples
+        :return: for every grade, None if it was added or the exception that rejected it
+        """
+        return await asyncio.gather(*(self.grade_student(*grade) for grade in grades), return_exceptions=True)
+
+    async def add_students_bulk(self, students):
+        return await self._run(self.services.add_students_bulk, list(students))
+
+    async def add_disciplines_bulk(self, disciplines):
+        return await self._run(self.services.add_disciplines_bulk, list(disciplines))
+
+    async def grade_students_bulk(self, grades):
+        return await self._run(self.services.grade_students_bulk, list(grades))
+
+    async def list_students(self):
+        return await self._run(self.services.list_students)
+
+    async def list_disciplines(self):
+        return await self._run(self.services.list_disciplines)
+
+    async def list_students_with_grades(self):
+        return await self._run(self.services.list_students_with_grades)
+
+    async def list_grades_1(self):
+        return await self._run(self.services.list_grades_1)
+
+    async def search_students(self, search_string, limit=None, prefix=False):
+        return await self._run(self.services.search_students, search_string, limit, prefix)
+
+    async def search_disciplines(self, search_string, limit=None, prefix=False):
+        return await self._run(self.services.search_disciplines, search_string, limit, prefix)
+
+    async def get_failing_students(self):
+        return await self._run(self.services.get_failing_students)
+
+    async def get_best_students(self, limit=None):
+        return await self._run(self.services.get_best_students, limit)
+
+    async def get_best_disciplines(self, limit=None):
+        return await self._run(self.services.get_best_disciplines, limit)
+
+    async def get_student_statistics(self):
+        return await self._run(self.services.get_student_statistics)
+
+    async def get_discipline_statistics(self):
+        return await self._run(self.services.get_discipline_statistics)
+
+    async def undo(self):
+        return await self._run(self.services.undo_service.undo)
+
+    async def redo(self):
+        return await self._run(self.services.undo_service.redo)
+
+    async def flush(self):
+        return await self._run(self.services.repository.flush)
+
+    async def close(self):
+        """
+        Persist the buffered changes and shut down the owned thread pool
+        """
+        await self.flush()
+        if self._owns_executor:
+            self._executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
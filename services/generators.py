@@ -0,0 +1,107 @@
+import random
+from src.domain import Student, Discipline, Grade
+
+FAMILY_NAMES = ("Joldes", "Onet", "Burz", "Goia", "Balea", "Pasca", "Vasiu")
+GIVEN_NAMES = ("Costin", "Cristian", "Ionut", "Alexia", "Andra", "Rares", "Andrei")
+DISCIPLINE_NAMES = ("Math", "English", "French", "German", "Spanish", "History", "Geography", "Physics", "Chemistry",
+                    "Biology", "Computer Science", "Economics", "Philosophy", "Psychology", "Sociology",
+                    "Physical Education", "Music", "Art", "Religion", "Civic Education", "Latin", "Greek", "Romanian")
+
+# every distribution draws a grade from 1 to 10 with the given random number generator
+GRADE_DISTRIBUTIONS = {
+    "uniform": lambda rng: 1 + int(rng.random() * 10),
+    "normal": lambda rng: min(10, max(1, round(rng.gauss(7, 2)))),
+    "failing": lambda rng: min(10, max(1, round(rng.gauss(4, 2)))),
+}
+
+
+class UnknownDistribution(Exception):
+    def __init__(self):
+        super().__init__(f"The grade distribution must be one of {', '.join(GRADE_DISTRIBUTIONS)} or a function")
+
+
+def _distribution(distribution):
+    if callable(distribution):
+        return distribution
+    if distribution not in GRADE_DISTRIBUTIONS:
+        raise UnknownDistribution
+    return GRADE_DISTRIBUTIONS[distribution]
+
+
+class DataGenerator:
+    """
+    Generates synthetic students, disciplines and grades. Everything is drawn from one random number generator, so
+    the same seed always gives the same data. The entity methods return generators, and populate writes a whole data
+    set straight to a repository in one batch, persisted once, without the checks and the undo history of the
+    services; it is meant for filling empty repositories for load tests and benchmarks.
+    """
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def _picker(self, items):
+        # a tenth of the cost of random.choice, which the row loops would otherwise spend most of their time in
+        items, draw = list(items), self.random.random
+        count = len(items)
+        return lambda: items[int(draw() * count)]
+
+    def students(self, n, first_id=1):
+        """
+        :return: a generator of n students with consecutive ids starting at first_id
+        """
+        name = self._picker(f"{family_name} {given_name}" for family_name in FAMILY_NAMES for given_name in GIVEN_NAMES)
+        for student_id in range(first_id, first_id + n):
+            yield Student(student_id, name())
+
+    def disciplines(self, n, first_id=1):
+        """
+        :return: a generator of n disciplines with consecutive ids starting at first_id
+        """
+        name = self._picker(DISCIPLINE_NAMES)
+        for discipline_id in range(first_id, first_id + n):
+            yield Discipline(discipline_id, name())
+
+    def grades(self, student_ids, discipline_ids, n, distribution="uniform"):
+        """
+        :param student_ids: the sequence of ids to grade, each grade picking one at random
+        :param discipline_ids: the sequence of ids to grade in, each grade picking one at random
+        :param distribution: the name of a distribution in GRADE_DISTRIBUTIONS, or a function drawing a grade from a
+        random.Random
+        :return: a generator of n grades
+        """
+        draw, rng = _distribution(distribution), self.random
+        student_id, discipline_id = self._picker(student_ids), self._picker(discipline_ids)
+        for _ in range(n):
+            yield Grade(student_id(), discipline_id(), draw(rng))
+
+    def grades_per_student(self, student_ids, discipline_ids, per_student, distribution="uniform"):
+        """
+        :param per_student: how many grades each student gets, or a (fewest, most) pair to draw the number from
+        :return: a generator of the grades of every student, one student after the other
+        """
+        draw, rng, discipline_id = _distribution(distribution), self.random, self._picker(discipline_ids)
+        fewest, most = per_student if isinstance(per_student, tuple) else (per_student, per_student)
+        for student_id in student_ids:
+            for _ in range(rng.randint(fewest, most) if fewest != most else most):
+                yield Grade(student_id, discipline_id(), draw(rng))
+
+    def populate(self, repository, students, disciplines, grades_per_student=0, distribution="uniform"):
+        """
+        Add a generated data set to a repository, in one batch
+        :param students: the number of students, with ids from 1
+        :param disciplines: the number of disciplines, with ids from 1
+        :param grades_per_student: how many grades each student gets, or a (fewest, most) pair
+        :return: the number of grades added
+        """
+        count = 0
+        with repository.batch():
+            for student in self.students(students):
+                repository.add_student(student)
+            for discipline in self.disciplines(disciplines):
+                repository.add_discipline(discipline)
+            if disciplines:
+                discipline_ids = range(1, disciplines + 1)
+                for grade in self.grades_per_student(range(1, students + 1), discipline_ids, grades_per_student,
+                                                     distribution):
+                    repository.grade_student(grade)
+                    count += 1
+        return count
@@ -0,0 +1,211 @@
+import bisect
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+VECTORIZED = numpy is not None
+
+
+class GradeStatistics:
+    def __init__(self, count, mean, median, standard_deviation, percentiles):
+        self.count = count
+        self.mean = mean
+        self.median = median
+        self.standard_deviation = standard_deviation
+        self.percentiles = percentiles
+
+    def __str__(self):
+        percentiles = ", ".join(f"p{q}: {value:.2f}" for q, value in self.percentiles.items())
+        return (f"Grades: {self.count}, Average: {self.mean:.2f}, Median: {self.median:.2f}, "
+                f"Standard deviation: {self.standard_deviation:.2f}, {percentiles}")
+
+
+def _percentile(sorted_values, q):
+    position = (len(sorted_values) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+class StatisticsEngine:
+    """
+    Computes grade statistics per student or per discipline from the repository grade columns. With NumPy installed
+    the columns are turned into arrays once per query and every group is reduced at the same time with bincount and
+    a single sort, otherwise the grades are grouped in Python. Percentiles interpolate linearly between grades.
+    """
+    def __init__(self, repository, percentiles=(25, 75, 90)):
+        self.repository = repository
+        self.percentiles = tuple(percentiles)
+
+    def _grouped(self, by_student):
+        """
+        :return: a dict mapping every id that has grades to its GradeStatistics
+        """
+        student_ids, discipline_ids, grades = self.repository.grade_columns()
+        keys = student_ids if by_student else discipline_ids
+        if VECTORIZED:
+            return self._grouped_arrays(numpy.asarray(keys, dtype=numpy.int64),
+                                        numpy.asarray(grades, dtype=numpy.float64))
+        groups = {}
+        for key, grade in zip(keys, grades):
+            groups.setdefault(key, []).append(grade)
+        statistics = {}
+        for key, values in groups.items():
+            values.sort()
+            mean = sum(values) / len(values)
+            deviation = math.sqrt(sum((value - mean) ** 2 for value in values) / len(values))
+            statistics[key] = GradeStatistics(len(values), mean, _percentile(values, 50), deviation,
+                                              {q: _percentile(values, q) for q in self.percentiles})
+        return statistics
+
+    def _grouped_arrays(self, keys, values):
+        if not len(keys):
+            return {}
+        unique_keys, groups = numpy.unique(keys, return_inverse=True)
+        counts = numpy.bincount(groups)
+        means = numpy.bincount(groups, weights=values) / counts
+        deviations = numpy.sqrt(numpy.bincount(groups, weights=(values - means[groups]) ** 2) / counts)
+        # sorting by group, then by grade, puts every group's grades in order in one contiguous run
+        sorted_values = values[numpy.lexsort((values, groups))]
+        starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+
+        def percentile(q):
+            position = (counts - 1) * q / 100
+            low = numpy.floor(position).astype(numpy.int64)
+            high = numpy.minimum(low + 1, counts - 1)
+            low_values = sorted_values[starts + low]
+            return low_values + (sorted_values[starts + high] - low_values) * (position - low)
+
+        medians = percentile(50)
+        percentiles = {q: percentile(q) for q in self.percentiles}
+        return {int(key): GradeStatistics(int(counts[i]), float(means[i]), float(medians[i]), float(deviations[i]),
+                                          {q: float(column[i]) for q, column in percentiles.items()})
+                for i, key in enumerate(unique_keys)}
+
+    def student_statistics(self):
+        statistics = self._grouped(True)
+        return [(student, statistics[student.student_id]) for student in self.repository.list_students()
+                if student.student_id in statistics]
+
+    def discipline_statistics(self):
+        statistics = self._grouped(False)
+        return [(discipline, statistics[discipline.discipline_id]) for discipline in self.repository.list_disciplines()
+                if discipline.discipline_id in statistics]
+
+
+class Leaderboard:
+    """
+    Grade total and count of every student or discipline id, with the ids kept sorted by descending average in a list
+    searched with bisect. Ids with the same average keep the order they were added in, as a stable sort of the
+    repository list would.
+    """
+    def __init__(self, keys=()):
+        self._totals = {}
+        self._ranks = {}
+        self._entries = []
+        self._next_rank = 0
+        for key in keys:
+            self.add_key(key)
+
+    def _rank(self, key):
+        rank = self._ranks.get(key)
+        if rank is None:
+            rank = self._ranks[key] = self._next_rank
+            self._next_rank += 1
+        return rank
+
+    def _entry(self, key):
+        total, count = self._totals[key]
+        return -(total / count), self._rank(key), key
+
+    def _unlist(self, key):
+        if key in self._totals:
+            del self._entries[bisect.bisect_left(self._entries, self._entry(key))]
+
+    def _list(self, key):
+        if key in self._totals:
+            bisect.insort(self._entries, self._entry(key))
+
+    def add_key(self, key):
+        """
+        Rank a new id after every id added before it
+        """
+        self._rank(key)
+
+    def load(self, totals):
+        """
+        Replace the grades with totals, a dict mapping ids to [grade total, grade count] lists, sorting the ids once.
+        Ids not added before are ranked in the order of the dict.
+        """
+        for key in totals:
+            self._rank(key)
+        self._totals = totals
+        self._entries = sorted(self._entry(key) for key in totals)
+
+    def remove_key(self, key):
+        self._unlist(key)
+        self._ranks.pop(key, None)
+        self._list(key)
+
+    def change(self, key, grade, count):
+        """
+        Add count grades of the given value to an id, or remove them when count is negative
+        """
+        self._unlist(key)
+        entry = self._totals.get(key)
+        if entry is None:
+            self._totals[key] = [grade * count, count]
+        else:
+            entry[0] += grade * count
+            entry[1] += count
+            if not entry[1]:
+                del self._totals[key]
+        self._list(key)
+
+    def average(self, key):
+        entry = self._totals.get(key)
+        return entry[0] / entry[1] if entry is not None else None
+
+    def ranked(self, minimum):
+        """
+        :return: an iterator of (id, average) pairs with an average of at least minimum, best first
+        """
+        end = bisect.bisect_right(self._entries, (-minimum, math.inf))
+        for index in range(end):
+            negative_average, rank, key = self._entries[index]
+            yield key, -negative_average
+
+    def below(self, maximum):
+        """
+        :return: the ids with an average lower than maximum, in the order they were added
+        """
+        start = bisect.bisect_right(self._entries, (-maximum, math.inf))
+        return [key for negative_average, rank, key in sorted(self._entries[start:], key=lambda entry: entry[1])]
+
+
+class RunningAverages:
+    """
+    Leaderboards of the students and disciplines, updated one grade at a time so the reports never go over the grades
+    again
+    """
+    def __init__(self, student_ids=(), discipline_ids=(), student_totals=(), discipline_totals=()):
+        """
+        :param student_totals: (student id, grade total, grade count) triples, as given by the repository
+        :param discipline_totals: (discipline id, grade total, grade count) triples
+        """
+        self.students = Leaderboard(student_ids)
+        self.disciplines = Leaderboard(discipline_ids)
+        # loaded and sorted once, as changing the leaderboards grade by grade moves list entries every time
+        self.students.load({key: [total, count] for key, total, count in student_totals})
+        self.disciplines.load({key: [total, count] for key, total, count in discipline_totals})
+
+    def add(self, grade):
+        self.students.change(grade.student_id, grade.grade, 1)
+        self.disciplines.change(grade.discipline_id, grade.grade, 1)
+
+    def remove(self, grade):
+        self.students.change(grade.student_id, grade.grade, -1)
+        self.disciplines.change(grade.discipline_id, grade.grade, -1)
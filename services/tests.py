@@ -1,9 +1,32 @@
+import asyncio
+import http.client
+import io
+import json
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from src.repository import MemoryRepository, Repository, StudentNotFound
+import unittest.mock
+from src.repository import (MemoryRepository, Repository, StudentNotFound, TextFileRepository,
+                            JournaledTextFileRepository, BinaryFileRepository, ColumnarRepository, GradeColumns,
+                            SqliteRepository)
+from src.repository.search_index import NGramIndex
+from src.repository.thread_safe import ReadWriteLock, ThreadSafeRepository
 from src.domain import Student, Discipline, Grade
 from src.services import (Services, StudentIdInvalidInput, StudentIdAlreadyExists, StudentNotFound,
                           DisciplineIdInvalidInput, DisciplineIdAlreadyExists, DisciplineNotFound, StudentListIsEmpty,
                           DisciplineListIsEmpty, InvalidSearchString)
+from src.services import statistics
+from src.services.statistics import StatisticsEngine, Leaderboard
+from src.services.undo_services import UndoRedoError, UndoService, UndoLog, Command, Operation
+from src.services.async_services import AsyncServices
+from src.services.transfer import DataTransfer, UnknownFormat
+from src.services.generators import DataGenerator, UnknownDistribution
+from src.ui.http_server import create_server
 
 
 class TestServices(unittest.TestCase):
@@ -98,6 +121,19 @@ class TestServices(unittest.TestCase):
         self.assertEqual(self.services.list_students_with_grades()[0][1].discipline_id, 1)
         self.assertEqual(self.services.list_students_with_grades()[0][2], 10)
 
+    def test_iter_students_with_grades(self):
+        self.services.add_student(1, "Costin Joldes")
+        self.services.add_student(2, "Costin Joldes")
+        self.services.add_discipline(1, "Math")
+        self.services.add_discipline(2, "English")
+        self.services.grade_student(2, 1, 7)
+        self.services.grade_student(1, 2, 10)
+        self.services.grade_student(1, 1, 9)
+        self.services.grade_student(1, 2, 8)
+        groups = [(student.student_id, discipline.discipline_id, grades)
+                  for student, discipline, grades in self.services.iter_students_with_grades()]
+        self.assertEqual(groups, [(1, 2, [10, 8]), (1, 1, [9]), (2, 1, [7])])
+
     def test_search_students(self):
         self.services.add_student(1, "Costin Joldes")
         self.services.add_student(2, "Cristian Onet")
@@ -118,6 +154,52 @@ class TestServices(unittest.TestCase):
         self.assertEqual(len(self.services.search_disciplines("French")), 1)
         self.assertEqual(len(self.services.search_disciplines("a")), 3)
 
+    def test_search_students_limit_and_prefix(self):
+        self.services.add_student(1, "Costin Joldes")
+        self.services.add_student(2, "Cristian Onet")
+        self.services.add_student(3, "Ionut Burz")
+        self.services.add_student(4, "Alexia Goia")
+        self.services.add_student(5, "Andra Balea")
+        self.assertEqual([student.student_id for student in self.services.search_students("on")], [2, 3])
+        self.assertEqual([student.student_id for student in self.services.search_students("on", prefix=True)], [2])
+        self.assertEqual([student.student_id for student in self.services.search_students("an", limit=2)], [2, 5])
+        self.assertEqual([student.student_id for student in self.services.search_students("ndr", prefix=True)], [])
+        self.services.remove_student(2)
+        self.assertEqual([student.student_id for student in self.services.search_students("onet")], [])
+        self.services.undo_service.undo()
+        self.assertEqual([student.student_id for student in self.services.search_students("ONET")], [2])
+
+    def test_bulk_add_and_grade(self):
+        self.services.add_students_bulk([(1, "Costin Joldes"), (2, "Cristian Onet")])
+        self.services.add_disciplines_bulk([(1, "Math"), (2, "English")])
+        self.services.grade_students_bulk([(1, 1, 10), (2, 1, 4), (2, 2, 8)])
+        self.assertEqual([student.name for student in self.services.list_students()],
+                         ["Costin Joldes", "Cristian Onet"])
+        self.assertEqual(len(self.services.list_grades_1()), 3)
+        self.assertEqual([student.student_id for student in self.services.get_best_students()], [1, 2])
+        self.services.undo_service.undo()
+        self.assertEqual(self.services.list_grades_1(), [])
+        self.services.undo_service.undo()
+        self.assertEqual(self.services.list_disciplines(), [])
+        self.services.undo_service.redo()
+        self.services.undo_service.redo()
+        self.assertEqual(len(self.services.list_grades_1()), 3)
+
+    def test_bulk_validates_before_adding(self):
+        self.services.add_student(1, "Costin Joldes")
+        with self.assertRaises(StudentIdAlreadyExists):
+            self.services.add_students_bulk([(2, "Cristian Onet"), (1, "Ionut Burz")])
+        with self.assertRaises(StudentIdAlreadyExists):
+            self.services.add_students_bulk([(3, "Cristian Onet"), (3, "Ionut Burz")])
+        with self.assertRaises(DisciplineIdInvalidInput):
+            self.services.add_disciplines_bulk([(1, "Math"), ("2", "English")])
+        self.services.add_discipline(1, "Math")
+        with self.assertRaises(DisciplineNotFound):
+            self.services.grade_students_bulk([(1, 1, 10), (1, 2, 9)])
+        self.assertEqual(len(self.services.list_students()), 1)
+        self.assertEqual(len(self.services.list_disciplines()), 1)
+        self.assertEqual(self.services.list_grades_1(), [])
+
     def test_get_failing_students(self):
         self.services.add_student(1, "Costin Joldes")
         self.services.add_student(2, "Cristian Onet")
@@ -211,6 +293,66 @@ class TestServices(unittest.TestCase):
         self.services.grade_student(1, 4, 5)
         self.assertEqual(len(self.services.get_best_disciplines()), 2)
 
+    def test_remove_discipline_removes_grades(self):
+        self.services.add_student(1, "Costin Joldes")
+        self.services.add_discipline(1, "Math")
+        self.services.add_discipline(2, "English")
+        self.services.grade_student(1, 1, 10)
+        self.services.grade_student(1, 2, 4)
+        self.services.remove_discipline(1)
+        self.assertEqual(len(self.services.list_grades_1()), 1)
+        self.services.undo_service.undo()
+        self.assertEqual(len(self.services.list_grades_1()), 2)
+
+    def test_undo_remove_student_restores_grades(self):
+        self.services.add_student(1, "Costin Joldes")
+        self.services.add_discipline(1, "Math")
+        self.services.grade_student(1, 1, 10)
+        self.services.remove_student(1)
+        self.assertEqual(len(self.services.list_grades_1()), 0)
+        self.services.undo_service.undo()
+        self.assertEqual(len(self.services.list_grades_1()), 1)
+        self.services.undo_service.redo()
+        self.assertEqual(len(self.services.list_grades_1()), 0)
+
+    def test_reports_follow_undo_redo(self):
+        self.services.add_student(1, "Costin Joldes")
+        self.services.add_student(2, "Cristian Onet")
+        self.services.add_discipline(1, "Math")
+        self.services.grade_student(1, 1, 10)
+        self.services.grade_student(2, 1, 3)
+        self.assertEqual([student.student_id for student in self.services.get_best_students()], [1])
+        self.services.grade_student(2, 1, 10)
+        self.assertEqual([student.student_id for student in self.services.get_best_students()], [1, 2])
+        self.services.undo_service.undo()
+        self.assertEqual([student.student_id for student in self.services.get_failing_students()], [2])
+        self.services.remove_discipline(1)
+        with self.assertRaises(StudentListIsEmpty):
+            self.services.get_best_students()
+        with self.assertRaises(DisciplineListIsEmpty):
+            self.services.get_best_disciplines()
+        self.services.undo_service.undo()
+        self.assertEqual([student.student_id for student in self.services.get_best_students()], [1])
+        self.services.remove_student(1)
+        self.services.undo_service.undo()
+        self.services.undo_service.redo()
+        with self.assertRaises(StudentListIsEmpty):
+            self.services.get_best_students()
+        with self.assertRaises(DisciplineListIsEmpty):
+            self.services.get_best_disciplines()
+
+    def test_get_best_students_limit(self):
+        for student_id in range(1, 6):
+            self.services.add_student(student_id, f"Student {student_id}")
+        self.services.add_discipline(1, "Math")
+        for student_id, grade in ((1, 7), (2, 9), (3, 7), (4, 10), (5, 4)):
+            self.services.grade_student(student_id, 1, grade)
+        self.assertEqual([student.student_id for student in self.services.get_best_students()], [4, 2, 1, 3])
+        self.assertEqual([student.student_id for student in self.services.get_best_students(limit=3)], [4, 2, 1])
+        self.services.grade_student(3, 1, 10)
+        self.assertEqual([student.student_id for student in self.services.get_best_students(limit=3)], [4, 2, 3])
+        self.assertEqual([discipline.discipline_id for discipline in self.services.get_best_disciplines(limit=1)], [1])
+
     def test_add_student_invalid_id(self):
         with self.assertRaises(StudentIdInvalidInput):
             self.services.add_student("invalid_id", "Test Student")
@@ -254,6 +396,473 @@ class TestServices(unittest.TestCase):
             self.services.search_disciplines(123)
 
 
+class TestUndoService(unittest.TestCase):
+    def test_limits_the_number_of_operations(self):
+        values = []
+        undo_service = UndoService(max_operations=3)
+        for value in range(5):
+            values.append(value)
+            undo_service.register(Operation(Command(values.pop), Command(values.append, value)))
+        self.assertEqual((undo_service.undo_count, undo_service.redo_count), (3, 0))
+        undo_service.undo(3)
+        self.assertEqual(values, [0, 1])
+        with self.assertRaises(UndoRedoError):
+            undo_service.undo()
+        undo_service.redo(2)
+        self.assertEqual(values, [0, 1, 2, 3])
+
+    def test_limits_the_estimated_memory(self):
+        services = Services(MemoryRepository())
+        services.undo_service = UndoService(max_bytes=10000)
+        services.add_students_bulk([(student_id, "Student") for student_id in range(100)])
+        services.add_students_bulk([(student_id, "Student") for student_id in range(100, 120)])
+        self.assertEqual(services.undo_service.undo_count, 1)
+        self.assertLessEqual(services.undo_service.memory, 10000)
+        services.undo_service.undo()
+        self.assertEqual(len(services.list_students()), 100)
+
+    def test_long_undo_replays_from_a_checkpoint(self):
+        services = Services(MemoryRepository())
+        services.undo_service = UndoService(services.repository.batch, checkpoint=services._checkpoint,
+                                            restore=services._restore_checkpoint, checkpoint_interval=10)
+        services.add_discipline(1, "Math")
+        for student_id in range(1, 50):
+            services.add_student(student_id, f"Student {student_id}")
+            services.grade_student(student_id, 1, student_id % 10 + 1)
+        expected = [student.student_id for student in services.get_best_students()]
+        with unittest.mock.patch.object(services, "_delete_student", wraps=services._delete_student) as delete:
+            services.undo_service.undo(95)
+            self.assertEqual(delete.call_count, 0)
+        self.assertEqual(services.undo_service.undo_count, 4)
+        self.assertEqual([student.student_id for student in services.list_students()], [1, 2])
+        self.assertEqual([student.student_id for student in services.get_failing_students()], [1])
+        services.undo_service.undo()
+        self.assertEqual(len(services.list_grades_1()), 1)
+        services.undo_service.redo(96)
+        self.assertEqual([student.student_id for student in services.get_best_students()], expected)
+        services.undo_service.undo(50)
+        services.add_student(100, "Costin Joldes")
+        services.undo_service.undo(25)
+        self.assertEqual(len(services.list_students()), 12)
+        services.undo_service.redo(25)
+        self.assertEqual(len(services.list_students()), 25)
+        self.assertTrue(services.repository.exists_student(100))
+        with self.assertRaises(UndoRedoError):
+            services.undo_service.redo()
+
+
+    def test_snapshots_never_push_operations_out(self):
+        class SmallServices(Services):
+            undo_memory_limit = 200000
+            undo_checkpoint_interval = 5
+            undo_checkpoint_memory_limit = 200000
+
+        services = SmallServices(MemoryRepository())
+        DataGenerator(1).populate(services.repository, 30000, 0)
+        for count in range(1, 11):
+            services.add_student(30000 + count, "Student")
+            self.assertEqual(services.undo_service.undo_count, count)
+        services.undo_service.undo(10)
+        self.assertEqual(len(services.list_students()), 30000)
+
+    def test_checkpoints_hold_large_ids(self):
+        services = Services(MemoryRepository())
+        services.undo_service = UndoService(services.repository.batch, checkpoint=services._checkpoint,
+                                            restore=services._restore_checkpoint, checkpoint_interval=2)
+        services.add_discipline(3_000_000_000, "Math")
+        services.add_student(3_000_000_000, "Costin Joldes")
+        services.grade_student(3_000_000_000, 3_000_000_000, 9)
+        services.add_student(1, "Cristian Onet")
+        services.undo_service.undo(4)
+        services.undo_service.redo(3)
+        self.assertEqual([student.student_id for student in services.get_best_students()], [3_000_000_000])
+
+    def test_oversized_snapshots_are_never_built(self):
+        services = Services(MemoryRepository())
+        DataGenerator(1).populate(services.repository, 1000, 1, 1)
+        self.assertIsNone(services._checkpoint(1000))
+        with unittest.mock.patch.object(services.repository, "list_grades", side_effect=AssertionError):
+            self.assertIsNone(services._checkpoint(1000))
+        snapshot, size = services._checkpoint(10 ** 6)
+        self.assertEqual([len(part) for part in snapshot], [1000, 1, 1000])
+        self.assertLess(size, 10 ** 6)
+
+    def test_checkpoints_have_a_budget_of_their_own(self):
+        snapshots = []
+
+        def checkpoint(limit):
+            snapshots.append(len(snapshots))
+            return snapshots[-1], 100
+
+        undo_service = UndoService(max_bytes=10 ** 6, checkpoint=checkpoint, restore=lambda snapshot: None,
+                                   checkpoint_interval=1, max_checkpoint_bytes=250)
+        for value in range(5):
+            undo_service.register(Operation(Command(int), Command(int)))
+        self.assertEqual(undo_service.undo_count, 5)
+        self.assertLessEqual(undo_service.memory - 5 * Operation(Command(int), Command(int)).size(), 200)
+
+    def test_transaction_is_one_step(self):
+        services = Services(MemoryRepository())
+        services.add_discipline(1, "Math")
+        with services.undo_service.transaction():
+            services.add_student(1, "Costin Joldes")
+            services.add_student(2, "Cristian Onet")
+            with services.undo_service.transaction():
+                services.grade_student(1, 1, 10)
+        self.assertEqual(services.undo_service.undo_count, 2)
+        services.undo_service.undo()
+        self.assertEqual((len(services.list_students()), len(services.list_grades_1())), (0, 0))
+        services.undo_service.redo()
+        self.assertEqual([student.student_id for student in services.get_best_students()], [1])
+
+    def test_transaction_rolls_back_on_error(self):
+        services = Services(MemoryRepository())
+        services.add_discipline(1, "Math")
+        with self.assertRaises(StudentIdAlreadyExists):
+            with services.undo_service.transaction():
+                services.add_student(1, "Costin Joldes")
+                services.grade_student(1, 1, 10)
+                services.add_student(1, "Cristian Onet")
+        self.assertEqual((len(services.list_students()), len(services.list_grades_1())), (0, 0))
+        self.assertEqual((services.undo_service.undo_count, services.undo_service.redo_count), (1, 0))
+
+    def test_transaction_is_persisted_once(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        repository = JournaledTextFileRepository(*(os.path.join(directory.name, name)
+                                                   for name in ("s.txt", "d.txt", "g.txt", "journal.txt")))
+        services = Services(repository)
+        with unittest.mock.patch.object(repository, "_save", wraps=repository._save) as save:
+            services.generate_students(50)
+            services.generate_disciplines(5)
+            services.generate_grades(200)
+        self.assertEqual(save.call_count, 3)
+        services.undo_service.undo()
+        self.assertEqual(len(services.list_grades_1()), 0)
+        self.assertEqual(len(services.list_students()), 50)
+
+
+class TestStatisticsEngine(unittest.TestCase):
+    def setUp(self):
+        self.repository = MemoryRepository()
+        self.services = Services(self.repository, StatisticsEngine(self.repository))
+        for student_id in range(1, 4):
+            self.services.add_student(student_id, f"Student {student_id}")
+        for discipline_id in range(1, 6):
+            self.services.add_discipline(discipline_id, f"Discipline {discipline_id}")
+        for student_id, grades in ((1, (1, 2, 5, 5, 5)), (2, (10, 9, 10, 10, 8)), (3, (5, 2, 4, 2, 2))):
+            for discipline_id, grade in enumerate(grades, 1):
+                self.services.grade_student(student_id, discipline_id, grade)
+
+    def test_student_statistics(self):
+        student, result = self.services.get_student_statistics()[0]
+        self.assertEqual(student.student_id, 1)
+        self.assertEqual(result.count, 5)
+        self.assertAlmostEqual(result.mean, 3.6)
+        self.assertEqual(result.median, 5)
+        self.assertAlmostEqual(result.standard_deviation, 1.7435595774162693)
+        self.assertEqual(result.percentiles, {25: 2, 75: 5, 90: 5})
+
+    def test_discipline_statistics(self):
+        by_discipline = {discipline.discipline_id: result for discipline, result in
+                         self.services.get_discipline_statistics()}
+        self.assertEqual(by_discipline[1].median, 5)
+        self.assertEqual(by_discipline[2].percentiles[25], 2)
+        self.assertAlmostEqual(by_discipline[2].percentiles[90], 7.6)
+
+    def test_reports_match_repository(self):
+        plain_services = Services(self.repository)
+        self.assertEqual(self.services.get_best_students(), plain_services.get_best_students())
+        self.assertEqual(self.services.get_failing_students(), plain_services.get_failing_students())
+        self.assertEqual(self.services.get_best_disciplines(), plain_services.get_best_disciplines())
+
+    @unittest.skipUnless(statistics.VECTORIZED, "NumPy is not installed")
+    def test_vectorized_matches_python(self):
+        vectorized = [(student.student_id, vars(result)) for student, result in self.services.get_student_statistics()]
+        with unittest.mock.patch.object(statistics, "VECTORIZED", False):
+            python = [(student.student_id, vars(result)) for student, result in self.services.get_student_statistics()]
+        self.assertEqual(len(vectorized), len(python))
+        for (vectorized_id, vectorized_values), (python_id, python_values) in zip(vectorized, python):
+            self.assertEqual(vectorized_id, python_id)
+            for name in ("count", "mean", "median", "standard_deviation"):
+                self.assertAlmostEqual(vectorized_values[name], python_values[name])
+            for q in python_values["percentiles"]:
+                self.assertAlmostEqual(vectorized_values["percentiles"][q], python_values["percentiles"][q])
+
+
+class TestNGramIndex(unittest.TestCase):
+    def test_update_keeps_order(self):
+        index = NGramIndex()
+        index.add(1, "1", "Costin Joldes")
+        index.add(2, "2", "Cristian Onet")
+        self.assertEqual(index.search("jold"), [1])
+        index.add(1, "1", "Costin Pasca")
+        self.assertEqual(index.search("jold"), [])
+        self.assertEqual(index.search("c"), [1, 2])
+        self.assertEqual(index.search("pasca"), [1])
+        index.remove(1)
+        self.assertEqual(index.search("c"), [2])
+
+
+class TestLeaderboard(unittest.TestCase):
+    def test_order(self):
+        leaderboard = Leaderboard([1, 2, 3])
+        leaderboard.change(3, 8, 1)
+        leaderboard.change(1, 8, 1)
+        leaderboard.change(2, 4, 2)
+        self.assertEqual(list(leaderboard.ranked(5)), [(1, 8.0), (3, 8.0)])
+        self.assertEqual(leaderboard.below(5), [2])
+        leaderboard.change(2, 10, 6)
+        self.assertEqual(leaderboard.average(2), 8.5)
+        self.assertEqual([key for key, average in leaderboard.ranked(5)], [2, 1, 3])
+        leaderboard.change(1, 8, -1)
+        self.assertIsNone(leaderboard.average(1))
+        self.assertEqual([key for key, average in leaderboard.ranked(0)], [2, 3])
+
+    def test_load_matches_changes(self):
+        columns = ([4, 2, 4, 9, 2, 7], [1, 1, 2, 2, 1, 3], [6, 9, 10, 3, 7, 6])
+        averages = statistics.RunningAverages([1, 2, 3], [3, 2, 1], [(4, 16, 2), (2, 16, 2), (9, 3, 1), (7, 6, 1)],
+                                              [(1, 22, 3), (2, 13, 2), (3, 6, 1)])
+        students, disciplines = Leaderboard([1, 2, 3]), Leaderboard([3, 2, 1])
+        for student_id, discipline_id, grade in zip(*columns):
+            students.change(student_id, grade, 1)
+            disciplines.change(discipline_id, grade, 1)
+        for loaded, changed in ((averages.students, students), (averages.disciplines, disciplines)):
+            self.assertEqual(list(loaded.ranked(0)), list(changed.ranked(0)))
+            self.assertEqual(loaded.below(11), changed.below(11))
+        averages.students.change(9, 3, -1)
+        self.assertEqual([key for key, average in averages.students.ranked(0)], [2, 4, 7])
+
+
+class TestDataTransfer(unittest.TestCase):
+    def setUp(self):
+        self.services = Services(MemoryRepository())
+        self.transfer = DataTransfer(self.services, chunk_size=2)
+
+    def test_import_collects_row_errors(self):
+        students = io.StringIO("student_id,name\n1,Costin Joldes\n2,Cristian Onet\nx,Ionut Burz\n1,Alexia Goia\n"
+                               "3,\n4,Andra Balea\n")
+        report = self.transfer.import_students(students)
+        self.assertEqual(report.imported, 3)
+        self.assertEqual([error.line for error in report.errors], [4, 5, 6])
+        self.assertEqual([student.student_id for student in self.services.list_students()], [1, 2, 4])
+        self.services.undo_service.undo()
+        self.assertEqual([student.student_id for student in self.services.list_students()], [1, 2])
+
+    def test_import_jsonl(self):
+        self.services.add_student(1, "Costin Joldes")
+        disciplines = io.StringIO('{"discipline_id": 1, "name": "Math"}\nnot json\n\n{"discipline_id": 2, '
+                                  '"name": "English"}\n')
+        report = self.transfer.import_disciplines(disciplines, "jsonl")
+        self.assertEqual((report.imported, [error.line for error in report.errors]), (2, [2]))
+        grades = io.StringIO('{"student_id": 1, "discipline_id": 1, "grade": 9}\n'
+                             '{"student_id": 2, "discipline_id": 1, "grade": 9}\n'
+                             '{"student_id": 1, "discipline_id": 2, "grade": "7"}\n')
+        report = self.transfer.import_grades(grades, "jsonl")
+        self.assertEqual((report.imported, [error.line for error in report.errors]), (2, [2]))
+        self.assertEqual([grade.grade for grade in self.services.list_grades_1()], [9, 7])
+
+    def test_export_round_trip(self):
+        self.services.add_students_bulk([(1, "Costin, Joldes"), (2, "Cristian Onet")])
+        self.services.add_discipline(1, "Math")
+        self.services.grade_students_bulk([(1, 1, 10), (2, 1, 4)])
+        copy = Services(MemoryRepository())
+        for file_format in ("csv", "jsonl"):
+            for kind in ("students", "disciplines", "grades"):
+                f = io.StringIO()
+                self.assertGreater(getattr(self.transfer, "export_" + kind)(f, file_format), 0)
+                f.seek(0)
+                if file_format == "csv":
+                    report = getattr(DataTransfer(copy), "import_" + kind)(f, file_format)
+                    self.assertEqual(report.errors, [])
+        self.assertEqual([student.name for student in copy.list_students()], ["Costin, Joldes", "Cristian Onet"])
+        self.assertEqual([(grade.student_id, grade.grade) for grade in copy.list_grades_1()], [(1, 10), (2, 4)])
+        f = io.StringIO()
+        self.transfer.export_grades(f, "jsonl")
+        self.assertEqual(f.getvalue().splitlines()[0], '{"student_id": 1, "discipline_id": 1, "grade": 10}')
+
+    def test_unknown_format(self):
+        with self.assertRaises(UnknownFormat):
+            self.transfer.import_students(io.StringIO(""), "xml")
+
+    def test_export_reads_a_page_at_a_time(self):
+        self.services.add_students_bulk([(student_id, f"Student {student_id}") for student_id in range(1, 6)])
+        self.services.add_discipline(1, "Math")
+        self.services.grade_students_bulk([(student_id, 1, 9) for student_id in range(1, 6)])
+        repository = self.services.repository
+        with unittest.mock.patch.object(repository, "list_students", side_effect=AssertionError), \
+                unittest.mock.patch.object(repository, "grade_columns", side_effect=AssertionError), \
+                unittest.mock.patch.object(repository, "students_page", wraps=repository.students_page) as pages:
+            f = io.StringIO()
+            self.assertEqual(self.transfer.export_students(f, "jsonl"), 5)
+            self.assertEqual(self.transfer.export_grades(io.StringIO(), "csv"), 5)
+        self.assertEqual([call.args for call in pages.call_args_list], [(0, 2), (2, 2), (4, 2)])
+        self.assertEqual(f.getvalue().splitlines()[4], '{"student_id": 5, "name": "Student 5"}')
+
+
+class TestAsyncServices(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.services = AsyncServices(MemoryRepository(), max_workers=4)
+        self.addAsyncCleanup(self.services.close)
+
+    async def test_concurrent_operations(self):
+        await asyncio.gather(*(self.services.add_student(student_id, f"Student {student_id}")
+                               for student_id in range(20)))
+        await self.services.add_discipline(1, "Math")
+        results = await self.services.grade_students([(student_id, 1, student_id % 10 + 1)
+                                                      for student_id in range(25)])
+        self.assertEqual(results[:20], [None] * 20)
+        self.assertTrue(all(isinstance(result, StudentNotFound) for result in results[20:]))
+        self.assertEqual(len(await self.services.list_grades_1()), 20)
+        self.assertEqual(len(await self.services.get_best_students()), 12)
+        await self.services.undo()
+        self.assertEqual(len(await self.services.list_grades_1()), 19)
+        with self.assertRaises(StudentIdAlreadyExists):
+            await self.services.add_student(1, "Costin Joldes")
+        self.assertEqual([student.student_id for student in await self.services.search_students("Student 1", limit=2)],
+                         [1, 10])
+
+    async def test_saving_does_not_block_the_loop(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        repository = TextFileRepository(*(os.path.join(directory.name, name) for name in ("s.txt", "d.txt", "g.txt")))
+        services = AsyncServices(repository)
+        self.addAsyncCleanup(services.close)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        self.addCleanup(ticker.cancel)
+        with unittest.mock.patch.object(TextFileRepository, '_save', side_effect=lambda changes: time.sleep(0.2)):
+            await services.add_student(1, "Costin Joldes")
+        self.assertGreater(ticks, 5)
+
+
+class TestHttpServer(unittest.TestCase):
+    def setUp(self):
+        self.services = Services(ThreadSafeRepository(MemoryRepository()))
+        self.server = create_server(self.services)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.connection = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        self.addCleanup(self.connection.close)
+
+    def request(self, method, path, body=None, headers=None):
+        self.connection.request(method, path, json.dumps(body) if body is not None else None, headers or {})
+        response = self.connection.getresponse()
+        data = response.read()
+        return response, json.loads(data) if data else None
+
+    def test_keep_alive_and_pagination(self):
+        for student_id in range(1, 8):
+            response, body = self.request("POST", "/students", {"student_id": student_id, "name": f"S{student_id}"})
+            self.assertEqual(response.status, 201)
+        socket = self.connection.sock
+        response, body = self.request("GET", "/students?offset=2&limit=3")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body["total"], 7)
+        self.assertEqual([student["student_id"] for student in body["items"]], [3, 4, 5])
+        self.assertEqual(self.request("GET", "/students?offset=6")[1]["items"], [{"student_id": 7, "name": "S7"}])
+        self.assertEqual(self.request("GET", "/students?limit=100000")[1]["limit"], 500)
+        self.assertIs(self.connection.sock, socket)
+
+    def test_crud_and_errors(self):
+        self.assertEqual(self.request("POST", "/students", {"student_id": 1, "name": "Ana"})[0].status, 201)
+        self.assertEqual(self.request("POST", "/students", {"student_id": 1, "name": "Ana"})[0].status, 409)
+        self.assertEqual(self.request("POST", "/students", {"student_id": "x", "name": "Ana"})[0].status, 400)
+        self.assertEqual(self.request("POST", "/students", {"name": "Ana"})[0].status, 400)
+        self.assertEqual(self.request("POST", "/disciplines", {"discipline_id": 2, "name": "Math"})[0].status, 201)
+        self.assertEqual(self.request("POST", "/grades", {"student_id": 1, "discipline_id": 2, "grade": 9})[0].status,
+                         201)
+        self.assertEqual(self.request("POST", "/grades", {"student_id": 5, "discipline_id": 2, "grade": 9})[0].status,
+                         404)
+        self.assertEqual(self.request("GET", "/grades")[1]["items"],
+                         [{"student_id": 1, "discipline_id": 2, "grade": 9}])
+        self.assertEqual(self.request("GET", "/students/1")[1], {"student_id": 1, "name": "Ana"})
+        self.assertEqual(self.request("GET", "/students/search?q=an")[1]["items"], [{"student_id": 1, "name": "Ana"}])
+        self.assertEqual(self.request("GET", "/reports/best-students")[1]["items"], [{"student_id": 1, "name": "Ana"}])
+        self.assertEqual(self.request("GET", "/reports/best-disciplines?limit=1")[1]["items"],
+                         [{"discipline_id": 2, "name": "Math"}])
+        self.assertEqual(self.request("GET", "/reports/failing-students")[1]["items"], [])
+        self.assertEqual(self.request("DELETE", "/students/1")[0].status, 204)
+        self.assertEqual(self.request("GET", "/students/1")[0].status, 404)
+        self.assertEqual(self.request("DELETE", "/students/1")[0].status, 404)
+        self.assertEqual(self.request("POST", "/undo")[0].status, 204)
+        self.assertEqual(self.request("GET", "/grades")[1]["total"], 1)
+        self.assertEqual(self.request("POST", "/redo")[0].status, 204)
+        self.assertEqual(self.request("POST", "/redo")[0].status, 409)
+        self.assertEqual(self.request("GET", "/teachers")[0].status, 404)
+
+    def test_etag(self):
+        self.request("POST", "/students", {"student_id": 1, "name": "Ana"})
+        response, body = self.request("GET", "/reports/best-students")
+        etag = response.getheader("ETag")
+        response, body = self.request("GET", "/reports/best-students", headers={"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertIsNone(body)
+        self.request("POST", "/disciplines", {"discipline_id": 1, "name": "Math"})
+        self.request("POST", "/grades", {"student_id": 1, "discipline_id": 1, "grade": 8})
+        response, body = self.request("GET", "/reports/best-students", headers={"If-None-Match": etag})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body["items"], [{"student_id": 1, "name": "Ana"}])
+        self.assertNotEqual(response.getheader("ETag"), etag)
+
+    def test_bodies_are_validated(self):
+        self.request("GET", "/students")
+        socket = self.connection.sock
+        for student_id, name in ((1, 5), (True, "Ana"), (1.5, "Ana")):
+            response, error = self.request("POST", "/students", {"student_id": student_id, "name": name})
+            self.assertEqual(response.status, 400)
+        self.assertEqual(self.request("POST", "/grades", {"student_id": [1], "discipline_id": 1, "grade": 9})[0].status,
+                         400)
+        self.assertEqual(self.request("GET", "/students")[1]["total"], 0)
+        self.assertEqual(self.request("GET", "/students/search?q=5")[1]["items"], [])
+        self.assertIs(self.connection.sock, socket)
+
+    def test_unexpected_errors_answer_500(self):
+        with unittest.mock.patch.object(self.services, "get_failing_students", side_effect=RuntimeError):
+            response, body = self.request("GET", "/reports/failing-students")
+        self.assertEqual(response.status, 500)
+        self.assertIn("error", body)
+        self.assertEqual(self.request("GET", "/reports/failing-students")[0].status, 200)
+
+    def test_unread_bodies_are_drained(self):
+        self.assertEqual(self.request("POST", "/nosuch", {"student_id": 1, "name": "Ana"})[0].status, 404)
+        self.assertEqual(self.request("POST", "/undo", {"steps": 1})[0].status, 409)
+        self.assertEqual(self.request("DELETE", "/students/1", {"student_id": 1})[0].status, 404)
+        response, body = self.request("GET", "/students")
+        self.assertEqual((response.status, body["total"]), (200, 0))
+
+    def test_negative_limits_are_clamped(self):
+        self.request("POST", "/students", {"student_id": 1, "name": "Ana"})
+        self.request("POST", "/disciplines", {"discipline_id": 1, "name": "Math"})
+        self.request("POST", "/grades", {"student_id": 1, "discipline_id": 1, "grade": 9})
+        for path in ("/reports/best-students?limit=-1", "/reports/best-disciplines?limit=-1",
+                     "/students/search?q=a&limit=-1"):
+            response, body = self.request("GET", path)
+            self.assertEqual((response.status, body["items"]), (200, []))
+        self.assertEqual(len(self.request("GET", "/reports/best-students?limit=1")[1]["items"]), 1)
+
+    def test_etag_names_the_server(self):
+        etag = self.request("GET", "/students")[0].getheader("ETag")
+        other = create_server(self.services)
+        self.addCleanup(other.server_close)
+        self.assertNotEqual(other.instance, self.server.instance)
+        self.assertIn(self.server.instance, etag)
+
+    def test_requires_a_thread_safe_repository(self):
+        with self.assertRaises(ValueError):
+            create_server(Services(MemoryRepository()))
+
+
 class TestMemoryRepository(unittest.TestCase):
     def setUp(self):
         self.repository = MemoryRepository()
@@ -278,6 +887,771 @@ class TestMemoryRepository(unittest.TestCase):
         self.assertEqual(disciplines[0].discipline_id, 1)
         self.assertEqual(disciplines[0].name, "Updated Discipline")
 
+    def test_get_discipline(self):
+        discipline = Discipline(1, "Test Discipline")
+        self.repository.add_discipline(discipline)
+        self.assertIs(self.repository.get_discipline(1), discipline)
+        self.assertIsNone(self.repository.get_discipline(2))
+
+    def test_exists_student(self):
+        self.repository.add_student(Student(1, "Test Student"))
+        self.assertTrue(self.repository.exists_student(1))
+        self.assertFalse(self.repository.exists_student(2))
+        self.repository.remove_student(self.repository.get_student(1))
+        self.assertFalse(self.repository.exists_student(1))
+
+    def test_exists_discipline(self):
+        self.repository.add_discipline(Discipline(1, "Test Discipline"))
+        self.assertTrue(self.repository.exists_discipline(1))
+        self.assertFalse(self.repository.exists_discipline(2))
+
+    def test_pages(self):
+        for student_id in range(1, 6):
+            self.repository.add_student(Student(student_id, "Test Student"))
+        page, total = self.repository.students_page(3, 5)
+        self.assertEqual(([student.student_id for student in page], total), ([4, 5], 5))
+        self.assertEqual(self.repository.grades_page(0, 5), ([], 0))
+
+    def test_grade_totals(self):
+        self.repository.add_student(Student(1, "Test Student"))
+        self.repository.add_discipline(Discipline(1, "Test Discipline"))
+        for value in (4, 9, 8):
+            self.repository.grade_student(Grade(1, 1, value))
+        self.repository.remove_grade(self.repository.grades_for_student(1)[0])
+        self.assertEqual(self.repository.student_grade_totals(), [(1, 17, 2)])
+        self.assertEqual(self.repository.discipline_grade_totals(), [(1, 17, 2)])
+
+    def test_grade_indexes(self):
+        self.repository.add_student(Student(1, "Test Student"))
+        self.repository.add_student(Student(2, "Other Student"))
+        self.repository.add_discipline(Discipline(1, "Test Discipline"))
+        first_grade = Grade(1, 1, 10)
+        second_grade = Grade(2, 1, 7)
+        self.repository.grade_student(first_grade)
+        self.repository.grade_student(second_grade)
+        self.assertEqual(self.repository.grades_for_student(1), [first_grade])
+        self.assertEqual(self.repository.grades_for_discipline(1), [first_grade, second_grade])
+        self.repository.remove_grade(second_grade)
+        self.assertEqual(self.repository.grades_for_discipline(1), [first_grade])
+        self.assertEqual(self.repository.grades_for_student(2), [])
+        self.repository.remove_student(self.repository.get_student(1))
+        self.assertEqual(self.repository.grades_for_discipline(1), [])
+        self.assertEqual(self.repository.list_grades(), [])
+
+
+class FileRepositoryTestMixin:
+    filenames = ()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filenames = [os.path.join(self.directory.name, name) for name in self.filenames]
+
+    @staticmethod
+    def state(repository):
+        return ([(student.student_id, student.name) for student in repository.list_students()],
+                [(discipline.discipline_id, discipline.name) for discipline in repository.list_disciplines()],
+                [(grade.student_id, grade.discipline_id, grade.grade) for grade in repository.list_grades()])
+
+    def fill(self, repository):
+        repository.add_student(Student(1, "Costin Joldes"))
+        repository.add_student(Student(2, "Cristian Onet"))
+        repository.add_discipline(Discipline(1, "Math"))
+        repository.add_discipline(Discipline(2, "English"))
+        repository.grade_student(Grade(1, 1, 10))
+        repository.grade_student(Grade(2, 1, 4))
+        repository.grade_student(Grade(2, 2, 7))
+        repository.update_discipline(Discipline(2, "French"))
+        repository.remove_student(repository.get_student(1))
+        repository.remove_grade(Grade(2, 2, 7))
+
+    def assert_pages(self, repository):
+        self.fill(repository)
+        repository.grade_student(Grade(2, 2, 9))
+        repository.grade_student(Grade(2, 1, 5))
+        students, disciplines, grades = self.state(repository)
+        page, total = repository.grades_page(1, 2)
+        self.assertEqual(([(grade.student_id, grade.discipline_id, grade.grade) for grade in page], total),
+                         (grades[1:3], 3))
+        self.assertEqual(repository.grades_page(3, 5), ([], 3))
+        page, total = repository.disciplines_page(1, 5)
+        self.assertEqual(([(discipline.discipline_id, discipline.name) for discipline in page], total),
+                         (disciplines[1:], 2))
+        self.assertEqual(repository.students_page(0, 0), ([], 1))
+
+    def assert_grade_totals(self, repository):
+        self.fill(repository)
+        repository.grade_student(Grade(2, 2, 9))
+        repository.grade_student(Grade(2, 1, 5))
+        self.assertEqual(sorted(repository.student_grade_totals()), [(2, 18, 3)])
+        self.assertEqual(sorted(repository.discipline_grade_totals()), [(1, 9, 2), (2, 9, 1)])
+
+
+class TestJournaledTextFileRepository(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.txt", "disciplines.txt", "grades.txt", "journal.txt")
+
+    def open_repository(self, compact_threshold=1000):
+        return JournaledTextFileRepository(*self.filenames, compact_threshold=compact_threshold)
+
+    def test_replay(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        self.assertEqual(self.state(self.open_repository()), self.state(repository))
+        self.assertEqual(self.state(repository), ([(2, "Cristian Onet")], [(1, "Math"), (2, "French")], [(2, 1, 4)]))
+        self.assertFalse(os.path.exists(self.filenames[0]))
+
+    def test_compaction(self):
+        repository = self.open_repository(compact_threshold=3)
+        self.fill(repository)
+        with open(self.filenames[3]) as f:
+            self.assertLessEqual(len(f.readlines()), 3)
+        self.assertTrue(os.path.exists(self.filenames[0]))
+        self.assertEqual(self.state(self.open_repository()), self.state(repository))
+
+    def test_torn_record_is_ignored(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        with open(self.filenames[3], 'a') as f:
+            f.write("student,add,3,Ionut")
+        reopened = self.open_repository()
+        self.assertEqual(self.state(reopened), self.state(repository))
+        reopened.add_student(Student(3, "Ionut Burz"))
+        self.assertEqual(self.state(self.open_repository()), self.state(reopened))
+
+
+    def test_batch_saves_once(self):
+        repository = self.open_repository()
+        services = Services(repository)
+        with unittest.mock.patch.object(repository, '_save', wraps=repository._save) as save:
+            services.add_students_bulk([(1, "Costin Joldes"), (2, "Cristian Onet"), (3, "Ionut Burz")])
+            services.add_disciplines_bulk([(1, "Math")])
+            services.grade_students_bulk([(1, 1, 10), (2, 1, 4), (3, 1, 7)])
+            services.remove_student(2)
+            services.undo_service.undo()
+        self.assertEqual(save.call_count, 5)
+        self.assertEqual(self.state(self.open_repository()), self.state(repository))
+
+
+class TestBinaryFileRepository(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.bin", "disciplines.bin", "grades.bin")
+
+    def open_repository(self, compact_minimum=1024):
+        return BinaryFileRepository(*self.filenames, compact_minimum=compact_minimum)
+
+    def test_grade_totals(self):
+        self.assert_grade_totals(self.open_repository())
+
+    def test_pages(self):
+        self.assert_pages(self.open_repository())
+        # pages read first load the collections they need
+        repository = self.open_repository()
+        self.assertEqual(len(repository.grades_page(0, 5)[0]), 3)
+        self.assertEqual(repository.students_page(0, 5)[1], 1)
+
+    def test_reload(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        self.assertEqual(self.state(self.open_repository()), self.state(repository))
+
+    def test_remove_only_marks_record(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        size = os.path.getsize(self.filenames[2])
+        repository.remove_grade(Grade(2, 1, 4))
+        self.assertEqual(os.path.getsize(self.filenames[2]), size)
+        self.assertEqual(self.open_repository().list_grades(), [])
+
+    def test_compaction(self):
+        repository = self.open_repository(compact_minimum=0)
+        self.fill(repository)
+        self.assertEqual(os.path.getsize(self.filenames[2]), 4 + 29)
+        self.assertEqual(self.state(self.open_repository()), self.state(repository))
+
+    def test_pickle_files_are_converted(self):
+        with open(self.filenames[0], 'wb') as f:
+            pickle.dump([Student(1, "Costin Joldes")], f)
+        with open(self.filenames[2], 'wb') as f:
+            pickle.dump([Grade(1, 1, 10)], f)
+        repository = self.open_repository()
+        repository.add_student(Student(2, "Cristian Onet"))
+        self.assertEqual(self.state(self.open_repository()),
+                         ([(1, "Costin Joldes"), (2, "Cristian Onet")], [], [(1, 1, 10)]))
+
+    def test_32_bit_files_are_converted(self):
+        with open(self.filenames[0], 'wb') as f:
+            f.write(b'SMR1' + struct.pack('<BIi', 1, 17, 1) + b'Costin Joldes')
+        with open(self.filenames[2], 'wb') as f:
+            f.write(b'SMR1' + struct.pack('<BIiii', 1, 12, 1, 1, 10))
+        self.assertEqual(self.state(self.open_repository()), ([(1, "Costin Joldes")], [], [(1, 1, 10)]))
+        with open(self.filenames[2], 'rb') as f:
+            self.assertEqual(f.read(4), b'SMR2')
+        self.assertEqual(self.state(self.open_repository()), ([(1, "Costin Joldes")], [], [(1, 1, 10)]))
+
+    def test_large_ids(self):
+        services = Services(self.open_repository())
+        services.add_student(3_000_000_000, "Costin Joldes")
+        services.add_discipline(-3_000_000_000, "Math")
+        services.grade_student(3_000_000_000, -3_000_000_000, 10)
+        self.assertEqual(self.state(self.open_repository()),
+                         ([(3_000_000_000, "Costin Joldes")], [(-3_000_000_000, "Math")],
+                          [(3_000_000_000, -3_000_000_000, 10)]))
+
+
+class TestColumnarRepository(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.bin", "disciplines.bin", "grades.columns")
+
+    def open_repository(self):
+        repository = ColumnarRepository(*self.filenames)
+        self.addCleanup(repository.close)
+        return repository
+
+    def test_reload(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        state = self.state(repository)
+        self.assertEqual(state, ([(2, "Cristian Onet")], [(1, "Math"), (2, "French")], [(2, 1, 4)]))
+        repository.close()
+        self.assertEqual(self.state(self.open_repository()), state)
+
+    def test_grade_indexes(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        repository.add_student(Student(3, "Ionut Burz"))
+        for value in range(1, 11):
+            repository.grade_student(Grade(3, 2, value))
+        repository.remove_grade(Grade(3, 2, 1))
+        self.assertEqual(sorted(grade.grade for grade in repository.grades_for_student(3)), list(range(2, 11)))
+        repository.remove_discipline(repository.get_discipline(1))
+        self.assertEqual(repository.grades_for_student(2), [])
+        self.assertEqual(len(repository.list_grades()), 9)
+        repository.remove_student(repository.get_student(3))
+        self.assertEqual(len(repository.list_grades()), 0)
+        self.assertEqual(repository.grades_for_discipline(2), [])
+
+    def test_columns_grow(self):
+        columns = GradeColumns(os.path.join(self.directory.name, "grow.columns"), capacity=2)
+        self.addCleanup(columns.close)
+        for row in range(5):
+            columns.append(row, row + 10, row + 20)
+        self.assertEqual(columns.remove(1), 4)
+        self.assertEqual([list(column) for column in columns.columns()], [[0, 4, 2, 3], [10, 14, 12, 13],
+                                                                          [20, 24, 22, 23]])
+
+    def test_services_read_columns(self):
+        services = Services(self.open_repository())
+        services.add_student(1, "Costin Joldes")
+        services.add_student(2, "Cristian Onet")
+        services.add_discipline(1, "Math")
+        services.grade_student(1, 1, 10)
+        services.grade_student(2, 1, 3)
+        self.assertEqual([student.student_id for student in services.get_best_students()], [1])
+        self.assertEqual([student.student_id for student in services.get_failing_students()], [2])
+        self.assertEqual(services.list_students_with_grades()[1][2], 3)
+
+    def test_pages(self):
+        self.assert_pages(self.open_repository())
+
+    def test_grade_totals(self):
+        self.assert_grade_totals(self.open_repository())
+
+
+class TestSqliteRepository(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.db",)
+
+    def open_repository(self):
+        repository = SqliteRepository(self.filenames[0])
+        self.addCleanup(repository.close)
+        return repository
+
+    def test_reload(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        self.assertEqual(self.state(repository), ([(2, "Cristian Onet")], [(1, "Math"), (2, "French")], [(2, 1, 4)]))
+        self.assertEqual(self.state(self.open_repository()), self.state(repository))
+
+    def test_remove_discipline_cascades(self):
+        repository = self.open_repository()
+        self.fill(repository)
+        repository.remove_discipline(repository.get_discipline(1))
+        self.assertEqual(repository.list_grades(), [])
+        self.assertFalse(repository.exists_discipline(1))
+        self.assertTrue(repository.exists_student(2))
+
+    def test_search_folds_case_beyond_ascii(self):
+        repository = self.open_repository()
+        memory = MemoryRepository()
+        for student in (Student(1, "Ștefan Țiriac"), Student(2, "Ärger Öz"), Student(3, "Stefan Tiriac")):
+            repository.add_student(student)
+            memory.add_student(student)
+        for search_string, prefix in (("ștefan", False), ("ȚIR", False), ("ö", True), ("stefan", False)):
+            found = repository.search_students(search_string, None, prefix)
+            expected = memory.search_students(search_string, None, prefix)
+            self.assertEqual([student.student_id for student in found], [student.student_id for student in expected])
+        self.assertEqual([student.student_id for student in repository.search_students("ștefan")], [1])
+
+    def test_batch_commits_once(self):
+        repository = self.open_repository()
+        with repository.batch():
+            repository.add_student(Student(1, "Costin Joldes"))
+            with repository.batch():
+                repository.add_discipline(Discipline(1, "Math"))
+            self.assertTrue(repository._connection.in_transaction)
+            repository.grade_student(Grade(1, 1, 10))
+        self.assertFalse(repository._connection.in_transaction)
+        self.assertEqual(self.state(self.open_repository()), ([(1, "Costin Joldes")], [(1, "Math")], [(1, 1, 10)]))
+
+    def test_services_push_down(self):
+        services = Services(self.open_repository())
+        for student_id, name in ((1, "Costin Joldes"), (2, "Cristian Onet"), (3, "Ionut Burz")):
+            services.add_student(student_id, name)
+        services.add_discipline(1, "Math")
+        services.add_discipline(2, "English")
+        services.grade_student(1, 1, 6)
+        services.grade_student(2, 1, 10)
+        services.grade_student(3, 2, 2)
+        with unittest.mock.patch.object(services.repository, "grade_columns", side_effect=AssertionError):
+            self.assertEqual([student.student_id for student in services.get_best_students()], [2, 1])
+        self.assertEqual([student.student_id for student in services.get_failing_students()], [3])
+        self.assertEqual([discipline.name for discipline in services.get_best_disciplines()], ["Math"])
+        self.assertEqual([student.student_id for student in services.search_students("O")], [1, 2, 3])
+        self.assertEqual([discipline.name for discipline in services.search_disciplines("2")], ["English"])
+        services.remove_student(2)
+        services.undo_service.undo()
+        self.assertEqual(len(services.list_grades_1()), 3)
+
+    def test_pages(self):
+        self.assert_pages(self.open_repository())
+
+    def test_grade_totals(self):
+        self.assert_grade_totals(self.open_repository())
+
+
+class TestLazyLoading(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.txt", "disciplines.txt", "grades.txt", "journal.txt")
+
+    def loaded_classes(self, repository, use):
+        with unittest.mock.patch.object(type(repository), '_load_collection', autospec=True,
+                                        side_effect=type(repository)._load_collection) as load:
+            use(repository)
+        return [call.args[1] for call in load.call_args_list]
+
+    def test_collections_load_on_first_use(self):
+        for repository_class, count in ((TextFileRepository, 3), (JournaledTextFileRepository, 4),
+                                        (BinaryFileRepository, 3)):
+            filenames = [name + repository_class.__name__ for name in self.filenames[:count]]
+            self.fill(repository_class(*filenames))
+            repository = repository_class(*filenames)
+            self.assertEqual(self.loaded_classes(repository, repository_class.list_disciplines), [Discipline])
+            self.assertEqual(self.state(repository),
+                             ([(2, "Cristian Onet")], [(1, "Math"), (2, "French")], [(2, 1, 4)]))
+
+    def test_removal_loads_grades(self):
+        self.fill(BinaryFileRepository(*self.filenames[:3]))
+        repository = BinaryFileRepository(*self.filenames[:3])
+        loaded = self.loaded_classes(repository, lambda r: r.remove_student(r.get_student(2)))
+        self.assertEqual(loaded, [Student, Grade])
+        self.assertEqual(self.state(BinaryFileRepository(*self.filenames[:3])), ([], [(1, "Math"), (2, "French")], []))
+
+    def test_grades_loaded_before_students_survive_a_removal_undone(self):
+        repository = JournaledTextFileRepository(*self.filenames)
+        services = Services(repository)
+        services.add_student(1, "Costin Joldes")
+        services.add_discipline(1, "Math")
+        services.grade_student(1, 1, 9)
+        services.remove_student(1)
+        services.undo_service.undo()
+        repository.close()
+        repository = JournaledTextFileRepository(*self.filenames)
+        self.addCleanup(repository.close)
+        self.assertEqual(len(repository.list_grades()), 1)
+        self.assertEqual(len(repository.list_students()), 1)
+        self.assertEqual(len(repository.list_disciplines()), 1)
+        self.assertEqual(len(repository.list_grades()), 1)
+        repository.compact()
+        self.assertEqual(self.state(JournaledTextFileRepository(*self.filenames))[2], [(1, 1, 9)])
+
+    def test_concurrent_first_reads_wait_for_the_whole_collection(self):
+        repository = TextFileRepository(*self.filenames[:3])
+        repository.add_student(Student(1, "Costin Joldes"))
+        repository.add_discipline(Discipline(1, "Math"))
+        with repository.batch():
+            for value in range(2000):
+                repository.grade_student(Grade(1, 1, value % 10 + 1))
+        repository = ThreadSafeRepository(TextFileRepository(*self.filenames[:3]))
+        # the grades are the last collection to load, so no other one keeps the readers at the lock
+        repository.list_students()
+        repository.list_disciplines()
+        started = threading.Event()
+        apply = TextFileRepository._apply
+
+        def slow_apply(self, entity_class, action, item):
+            apply(self, entity_class, action, item)
+            if entity_class is Grade and not started.is_set():
+                started.set()
+                time.sleep(0.1)
+
+        with unittest.mock.patch.object(TextFileRepository, '_apply', autospec=True, side_effect=slow_apply):
+            loader = threading.Thread(target=repository.list_grades)
+            loader.start()
+            started.wait(5)
+            grades = repository.grades_for_student(1)
+            loader.join()
+        self.assertEqual(len(grades), 2000)
+
+    def test_services_startup_reads_no_grades(self):
+        self.fill(TextFileRepository(*self.filenames[:3]))
+        repository = TextFileRepository(*self.filenames[:3])
+        services = Services(repository)
+        services.add_discipline(3, "German")
+        self.assertEqual(len(services.list_students()), 1)
+        self.assertIn(Grade, repository._unloaded)
+        self.assertEqual(len(services.list_grades_1()), 1)
+
+
+class TestWriteBehind(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.txt", "disciplines.txt", "grades.txt", "journal.txt")
+
+    def test_flush_after(self):
+        repository = TextFileRepository(*self.filenames[:3], flush_after=3)
+        self.addCleanup(repository.close)
+        repository.add_student(Student(1, "Costin Joldes"))
+        repository.add_discipline(Discipline(1, "Math"))
+        self.assertFalse(os.path.exists(self.filenames[0]))
+        repository.grade_student(Grade(1, 1, 10))
+        self.assertEqual(self.state(TextFileRepository(*self.filenames[:3])), self.state(repository))
+
+    def test_flush_interval(self):
+        repository = BinaryFileRepository(*self.filenames[:3], flush_interval=0.01)
+        self.addCleanup(repository.close)
+        self.fill(repository)
+        deadline = time.monotonic() + 5
+        while repository._buffered and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.state(BinaryFileRepository(*self.filenames[:3])), self.state(repository))
+
+    def test_failed_flush_keeps_the_changes(self):
+        for repository_class, count in ((JournaledTextFileRepository, 4), (BinaryFileRepository, 3)):
+            filenames = [filename + repository_class.__name__ for filename in self.filenames[:count]]
+            repository = repository_class(*filenames, flush_after=100)
+            self.addCleanup(repository.close)
+            self.fill(repository)
+            with unittest.mock.patch.object(repository, '_save', side_effect=OSError):
+                with self.assertRaises(OSError):
+                    repository.flush()
+            repository.add_student(Student(3, "Ionut Burz"))
+            repository.flush()
+            reopened = repository_class(*filenames)
+            self.assertEqual(self.state(reopened), self.state(repository))
+            self.assertEqual(len(self.state(reopened)[0]), 2)
+
+    def test_close_flushes(self):
+        with JournaledTextFileRepository(*self.filenames, flush_after=100) as repository:
+            services = Services(repository)
+            services.add_students_bulk([(1, "Costin Joldes"), (2, "Cristian Onet")])
+            services.add_discipline(1, "Math")
+            services.grade_student(1, 1, 10)
+            self.assertFalse(os.path.exists(self.filenames[3]))
+        self.assertEqual(self.state(JournaledTextFileRepository(*self.filenames)), self.state(repository))
+
+    def test_compact_drops_buffered_changes(self):
+        for repository_class in (BinaryFileRepository, ColumnarRepository):
+            filenames = [filename + repository_class.__name__ for filename in self.filenames[:3]]
+            with repository_class(*filenames, flush_after=100) as repository:
+                self.fill(repository)
+                repository.compact()
+                state = self.state(repository)
+            reopened = repository_class(*filenames)
+            self.assertEqual(self.state(reopened), state)
+            if repository_class is ColumnarRepository:
+                reopened.close()
+        repository = JournaledTextFileRepository(*self.filenames, flush_after=100)
+        self.fill(repository)
+        repository.compact()
+        repository.close()
+        self.assertEqual(self.state(JournaledTextFileRepository(*self.filenames)), self.state(repository))
+
+
+class TestDurableWrites(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.txt", "disciplines.txt", "grades.txt", "journal.txt")
+
+    def test_failed_write_keeps_old_file(self):
+        repository = TextFileRepository(*self.filenames[:3])
+        repository.add_student(Student(1, "Costin Joldes"))
+        with unittest.mock.patch.object(TextFileRepository, '_format', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                repository.add_student(Student(2, "Cristian Onet"))
+        self.assertEqual(self.state(TextFileRepository(*self.filenames[:3]))[0], [(1, "Costin Joldes")])
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["students.txt"])
+
+    def fsync_count(self, repository_class, fsync, *filenames):
+        with unittest.mock.patch('os.fsync', wraps=os.fsync) as synced:
+            repository = repository_class(*filenames, fsync=fsync)
+            self.fill(repository)
+            before_close = synced.call_count
+            repository.close()
+        return before_close, synced.call_count
+
+    def test_fsync_policies(self):
+        never = self.fsync_count(BinaryFileRepository, 'never', *(name + ".never" for name in self.filenames[:3]))
+        self.assertEqual(never, (0, 0))
+        always = self.fsync_count(BinaryFileRepository, 'always', *(name + ".always" for name in self.filenames[:3]))
+        self.assertGreaterEqual(always[0], 10)
+        with unittest.mock.patch.object(JournaledTextFileRepository, 'fsync_interval', 3600):
+            batched = self.fsync_count(JournaledTextFileRepository, 'batched', *self.filenames)
+        self.assertEqual(batched, (0, 1))
+        self.assertEqual(self.state(JournaledTextFileRepository(*self.filenames)),
+                         ([(2, "Cristian Onet")], [(1, "Math"), (2, "French")], [(2, 1, 4)]))
+
+    def test_invalid_fsync_policy(self):
+        with self.assertRaises(ValueError):
+            TextFileRepository(*self.filenames[:3], fsync='sometimes')
+
+
+class TestDataGenerator(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.txt", "disciplines.txt", "grades.txt", "journal.txt")
+
+    def test_same_seed_same_data(self):
+        def data(seed):
+            generator = DataGenerator(seed)
+            return ([student.name for student in generator.students(50)],
+                    [discipline.name for discipline in generator.disciplines(10)],
+                    [(grade.student_id, grade.discipline_id, grade.grade)
+                     for grade in generator.grades_per_student(range(1, 51), range(1, 11), (0, 5))])
+
+        self.assertEqual(data(7), data(7))
+        self.assertNotEqual(data(7), data(8))
+
+    def test_distributions(self):
+        generator = DataGenerator(1)
+        normal = [grade.grade for grade in generator.grades([1], [1], 2000, "normal")]
+        failing = [grade.grade for grade in generator.grades([1], [1], 2000, "failing")]
+        self.assertTrue(all(1 <= grade <= 10 for grade in normal + failing))
+        self.assertAlmostEqual(sum(normal) / len(normal), 7, delta=0.3)
+        self.assertLess(sum(failing) / len(failing), 5)
+        self.assertEqual({grade.grade for grade in generator.grades([1], [1], 10, lambda rng: 9)}, {9})
+        with self.assertRaises(UnknownDistribution):
+            list(generator.grades([1], [1], 1, "bimodal"))
+
+    def test_populate_persists_once(self):
+        repository = JournaledTextFileRepository(*self.filenames)
+        with unittest.mock.patch.object(repository, "_save", wraps=repository._save) as save:
+            count = DataGenerator(3).populate(repository, 200, 10, grades_per_student=(1, 4))
+        self.assertEqual(save.call_count, 1)
+        repository.close()
+        repository = JournaledTextFileRepository(*self.filenames)
+        self.addCleanup(repository.close)
+        self.assertEqual([len(part) for part in self.state(repository)], [200, 10, count])
+        self.assertTrue(200 <= count <= 800)
+
+    def test_services_generate_in_one_step(self):
+        services = Services(MemoryRepository())
+        services.generate_students(30, seed=1)
+        services.generate_disciplines(5, seed=1)
+        services.generate_grades(100, seed=1, distribution="normal")
+        self.assertEqual(len(services.list_grades_1()), 100)
+        services.undo_service.undo()
+        self.assertEqual(len(services.list_grades_1()), 0)
+        services.undo_service.undo()
+        self.assertEqual(len(services.list_disciplines()), 0)
+        with self.assertRaises(StudentIdAlreadyExists):
+            services.generate_students(31)
+
+
+class TestUndoLog(FileRepositoryTestMixin, unittest.TestCase):
+    filenames = ("students.txt", "disciplines.txt", "grades.txt", "undo_log.jsonl")
+
+    def services(self, services_class=Services):
+        repository = TextFileRepository(*self.filenames[:3])
+        self.addCleanup(repository.close)
+        return services_class(repository, undo_log=self.filenames[3])
+
+    def test_undo_and_redo_after_a_restart(self):
+        services = self.services()
+        services.add_discipline(1, "Math")
+        services.add_students_bulk([(1, "Costin Joldes"), (2, "Cristian Onet")])
+        with services.undo_service.transaction():
+            services.grade_student(1, 1, 10)
+            services.grade_student(2, 1, 4)
+        services.remove_student(1)
+        services.add_student(3, "Ionut Burz")
+        services.undo_service.undo()
+        services.repository.close()
+
+        with unittest.mock.patch.object(UndoLog, "load", autospec=True, side_effect=UndoLog.load) as load:
+            services = self.services()
+            self.assertEqual(load.call_count, 0)
+            services.undo_service.undo()
+            self.assertEqual(load.call_count, 1)
+        self.assertEqual(self.state(services.repository)[2], [(2, 1, 4), (1, 1, 10)])
+        services.undo_service.undo()
+        self.assertEqual(self.state(services.repository)[2], [])
+        services.undo_service.redo(2)
+        self.assertEqual([student.student_id for student in services.get_failing_students()], [2])
+        services.repository.close()
+
+        services = self.services()
+        self.assertEqual((services.undo_service.undo_count, services.undo_service.redo_count), (4, 1))
+        services.undo_service.redo()
+        self.assertEqual(self.state(services.repository)[0], [(2, "Cristian Onet"), (3, "Ionut Burz")])
+        services.undo_service.clear()
+        services.repository.close()
+        self.assertEqual(self.services().undo_service.undo_count, 0)
+
+    def test_log_is_rewritten_with_the_kept_history(self):
+        class BoundedServices(Services):
+            undo_limit = 5
+
+        services = self.services(BoundedServices)
+        # left to grow during the session, to be rewritten on the next start
+        with unittest.mock.patch.object(UndoService, "log_compact_minimum", 10 ** 6):
+            for student_id in range(1, 300):
+                services.add_student(student_id, "Student")
+        services.repository.close()
+        with open(self.filenames[3], "a") as f:
+            f.write('{"register":')
+        services = self.services(BoundedServices)
+        self.assertEqual(services.undo_service.undo_count, 5)
+        with open(self.filenames[3]) as f:
+            self.assertEqual(len(f.readlines()), 5)
+        services.undo_service.undo(5)
+        self.assertEqual(len(services.list_students()), 294)
+
+    def test_log_is_compacted_during_a_session(self):
+        class BoundedServices(Services):
+            undo_limit = 10
+
+        services = self.services(BoundedServices)
+        limit = 2 * 10 + UndoService.log_compact_minimum + 1
+        for student_id in range(1, 1000):
+            services.add_student(student_id, "Student")
+            if student_id % 7 == 0:
+                services.undo_service.undo(2)
+                services.undo_service.redo()
+            with open(self.filenames[3]) as f:
+                self.assertLessEqual(len(f.readlines()), limit)
+        expected = (services.undo_service.undo_count, services.undo_service.redo_count, self.state(services.repository))
+        services.repository.close()
+        services = self.services(BoundedServices)
+        self.assertEqual((services.undo_service.undo_count, services.undo_service.redo_count,
+                          self.state(services.repository)), expected)
+        services.undo_service.undo(expected[0])
+        self.assertEqual(len(services.list_students()), len(expected[2][0]) - expected[0])
+
+
+class TestThreadSafeRepository(unittest.TestCase):
+    def test_writer_excludes_readers(self):
+        lock = ReadWriteLock()
+        events = []
+
+        def write():
+            with lock.writing():
+                events.append("write")
+
+        with lock.reading():
+            writer = threading.Thread(target=write)
+            writer.start()
+            time.sleep(0.05)
+            events.append("read")
+        writer.join(5)
+        self.assertEqual(events, ["read", "write"])
+
+    def test_writer_may_reenter(self):
+        lock = ReadWriteLock()
+        with lock.writing():
+            with lock.writing(), lock.reading():
+                pass
+        with lock.reading():
+            pass
+
+    def stress(self, repository):
+        # switch threads as often as possible so unguarded state would be caught mid-change
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        repository = ThreadSafeRepository(repository)
+        services = Services(repository)
+        services.add_disciplines_bulk([(discipline_id, f"Discipline {discipline_id}") for discipline_id in range(5)])
+        errors = []
+        # undo and redo act on whichever thread's operation is last, so another thread's student may be gone
+        expected_errors = (UndoRedoError, StudentNotFound, StudentIdAlreadyExists, StudentListIsEmpty)
+
+        def attempt(operation, *args):
+            try:
+                operation(*args)
+            except expected_errors:
+                pass
+            except Exception as error:
+                errors.append(error)
+
+        def writer(worker):
+            for index in range(60):
+                student_id = worker * 1000 + index
+                attempt(services.add_student, student_id, f"Student {student_id}")
+                attempt(services.grade_student, student_id, index % 5, index % 10 + 1)
+                if index % 3 == 0:
+                    attempt(services.remove_student, student_id)
+                if index % 7 == 0:
+                    attempt(services.undo_service.undo)
+                if index % 11 == 0:
+                    attempt(services.undo_service.redo)
+                if index % 5 == 0:
+                    attempt(services.get_best_students)
+
+        def reader():
+            for index in range(150):
+                try:
+                    student_ids, discipline_ids, grades = repository.grade_columns()
+                    self.assertEqual(len(student_ids), len(grades))
+                    for grade in repository.list_grades():
+                        self.assertIn(grade.discipline_id, range(5))
+                    if index % 10 == 0:
+                        services.get_failing_students()
+                        services.get_best_disciplines(3)
+                except (StudentListIsEmpty, DisciplineListIsEmpty):
+                    pass
+                except Exception as error:
+                    errors.append(error)
+
+        threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(6)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        students = {student.student_id for student in repository.list_students()}
+        grades = repository.list_grades()
+        self.assertTrue(all(grade.student_id in students for grade in grades))
+        averages = {}
+        for grade in grades:
+            averages.setdefault(grade.student_id, []).append(grade.grade)
+        expected = sorted((student_id for student_id, values in averages.items() if sum(values) / len(values) >= 5))
+        self.assertEqual(sorted(student.student_id for student in services.get_best_students()), expected)
+
+    def test_reports_leave_the_write_lock_alone(self):
+        repository = ThreadSafeRepository(MemoryRepository())
+        services = Services(repository)
+        services.add_student(1, "Costin Joldes")
+        services.add_student(2, "Cristian Onet")
+        services.add_discipline(1, "Math")
+        services.grade_student(1, 1, 9)
+        services.grade_student(2, 1, 3)
+        services.get_best_students()
+        with unittest.mock.patch.object(repository._lock, "writing", side_effect=AssertionError):
+            self.assertEqual([student.student_id for student in services.get_best_students(1)], [1])
+            self.assertEqual([student.student_id for student in services.get_failing_students()], [2])
+            self.assertEqual([discipline.discipline_id for discipline in services.get_best_disciplines()], [1])
+
+    def test_stress_memory(self):
+        self.stress(MemoryRepository())
+
+    def test_stress_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filenames = [os.path.join(directory, name) for name in ("s.bin", "d.bin", "g.bin")]
+            repository = BinaryFileRepository(*filenames, fsync='never')
+            self.stress(repository)
+            self.assertEqual(FileRepositoryTestMixin.state(BinaryFileRepository(*filenames)),
+                             FileRepositoryTestMixin.state(repository))
+
 
 class TestRepository(unittest.TestCase):
     def setUp(self):
@@ -315,6 +1689,47 @@ class TestRepository(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             self.repository.list_disciplines()
 
+    def test_get_discipline(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.get_discipline(None)
+
+    def test_exists_student(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.exists_student(None)
+
+    def test_exists_discipline(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.exists_discipline(None)
+
+    def test_grades_for_student(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.grades_for_student(None)
+
+    def test_grades_for_discipline(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.grades_for_discipline(None)
+
+    def test_grade_columns(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.grade_columns()
+
+    def test_student_grade_totals(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.student_grade_totals()
+
+    def test_search_students(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.search_students("")
+
+
+    def test_batch(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.batch()
+
+    def test_flush(self):
+        with self.assertRaises(NotImplementedError):
+            self.repository.flush()
+
 
 class TestDomain(unittest.TestCase):
     def test_student(self):
@@ -335,3 +1750,31 @@ class TestDomain(unittest.TestCase):
         self.assertEqual(grade.discipline_id, 1)
         self.assertEqual(grade.grade, 10)
         self.assertEqual(str(grade), "Student id: 1, Discipline id: 1, Grade: 10")
+
+    def test_equality_and_hashing(self):
+        self.assertEqual(Student(1, "Costin Joldes"), Student(1, "Cristian Onet"))
+        self.assertNotEqual(Student(1, "Costin Joldes"), Discipline(1, "Costin Joldes"))
+        self.assertEqual(len({Discipline(1, "Math"), Discipline(1, "Algebra"), Discipline(2, "Math")}), 2)
+        self.assertEqual(Grade(1, 2, 10), Grade(1, 2, 10))
+        self.assertNotEqual(Grade(1, 2, 10), Grade(1, 2, 9))
+        self.assertEqual({Grade(1, 2, 10): "a"}[Grade(1, 2, 10)], "a")
+        with self.assertRaises(AttributeError):
+            Student(1, "Costin Joldes").email = "costin@example.com"
+
+    def test_identity_fields_are_read_only(self):
+        student = Student(1, "Costin Joldes")
+        students = {student}
+        for entity, field in ((student, "student_id"), (Discipline(1, "Math"), "discipline_id"),
+                              (Grade(1, 2, 10), "student_id"), (Grade(1, 2, 10), "grade")):
+            with self.assertRaises(AttributeError):
+                setattr(entity, field, 5)
+        student.name = "Cristian Onet"
+        self.assertIn(Student(1, "Ionut Burz"), students)
+        self.assertEqual(student.name, "Cristian Onet")
+
+    def test_unpickle(self):
+        student = pickle.loads(pickle.dumps(Student(1, "Costin Joldes")))
+        self.assertEqual((student.student_id, student.name), (1, "Costin Joldes"))
+        legacy = Grade.__new__(Grade)
+        legacy.__setstate__({"student_id": 1, "discipline_id": 2, "grade": 10})
+        self.assertEqual(legacy, Grade(1, 2, 10))
@@ -0,0 +1,226 @@
+import csv
+import json
+
+FORMATS = ("csv", "jsonl")
+STUDENT_FIELDS = ("student_id", "name")
+DISCIPLINE_FIELDS = ("discipline_id", "name")
+GRADE_FIELDS = ("student_id", "discipline_id", "grade")
+
+
+class UnknownFormat(Exception):
+    def __init__(self):
+        super().__init__("The format must be csv or jsonl")
+
+
+class RowError:
+    def __init__(self, line, message):
+        self.line = line
+        self.message = message
+
+    def __str__(self):
+        return f"Line {self.line}: {self.message}"
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def __str__(self):
+        return f"Imported: {self.imported}, Rejected: {len(self.errors)}"
+
+
+def _records(file, file_format, fields):
+    """
+    :return: an iterator of (line number, field values) pairs, with None instead of the values of a row that cannot
+    be read
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, [row.get(field) for field in fields]
+        return
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, [record.get(field) for field in fields] if isinstance(record, dict) else None
+
+
+def _integer(value, field):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError(f"{field} must be an integer")
+
+
+def _name(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("name must not be empty")
+    return value
+
+
+class DataTransfer:
+    """
+    Streams students, disciplines and grades between the services and CSV or JSON Lines files. Imports read the file
+    one row at a time and hand the valid rows to the bulk operations a chunk at a time, so only one chunk is ever held
+    in memory and every chunk is persisted once and undone in one step. Invalid rows are collected in the report
+    instead of stopping the import. Exports read the repository a page of chunk_size entities at a time and write it
+    one row at a time, so they too hold only one chunk in memory.
+    """
+    def __init__(self, services, chunk_size=1000):
+        self.services = services
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _check_format(file_format):
+        if file_format not in FORMATS:
+            raise UnknownFormat
+
+    def _import(self, file, file_format, fields, parse, add_bulk):
+        self._check_format(file_format)
+        report = ImportReport()
+        chunk = []
+        chunk_keys = set()
+        for line_number, values in _records(file, file_format, fields):
+            try:
+                if values is None:
+                    raise ValueError("the row cannot be read")
+                row = parse(values, chunk_keys)
+            except ValueError as error:
+                report.errors.append(RowError(line_number, str(error)))
+                continue
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                add_bulk(chunk)
+                report.imported += len(chunk)
+                chunk = []
+                chunk_keys.clear()
+        if chunk:
+            add_bulk(chunk)
+            report.imported += len(chunk)
+        return report
+
+    def import_students(self, file, file_format="csv"):
+        """
+        Add the students of a file with student_id and name fields
+        :param file: an open text file
+        :param file_format: csv or jsonl
+        :return: an ImportReport with the number of students added and the rejected rows
+        """
+        repository = self.services.repository
+
+        def parse(values, chunk_ids):
+            student_id = _integer(values[0], "student_id")
+            name = _name(values[1])
+            if student_id in chunk_ids or repository.exists_student(student_id):
+                raise ValueError("a student with this id already exists")
+            chunk_ids.add(student_id)
+            return student_id, name
+
+        return self._import(file, file_format, STUDENT_FIELDS, parse, self.services.add_students_bulk)
+
+    def import_disciplines(self, file, file_format="csv"):
+        """
+        Add the disciplines of a file with discipline_id and name fields
+        :param file: an open text file
+        :param file_format: csv or jsonl
+        :return: an ImportReport with the number of disciplines added and the rejected rows
+        """
+        repository = self.services.repository
+
+        def parse(values, chunk_ids):
+            discipline_id = _integer(values[0], "discipline_id")
+            name = _name(values[1])
+            if discipline_id in chunk_ids or repository.exists_discipline(discipline_id):
+                raise ValueError("a discipline with this id already exists")
+            chunk_ids.add(discipline_id)
+            return discipline_id, name
+
+        return self._import(file, file_format, DISCIPLINE_FIELDS, parse, self.services.add_disciplines_bulk)
+
+    def import_grades(self, file, file_format="csv"):
+        """
+        Add the grades of a file with student_id, discipline_id and grade fields
+        :param file: an open text file
+        :param file_format: csv or jsonl
+        :return: an ImportReport with the number of grades added and the rejected rows
+        """
+        repository = self.services.repository
+        known_students = set()
+        known_disciplines = set()
+
+        def parse(values, chunk_keys):
+            student_id = _integer(values[0], "student_id")
+            discipline_id = _integer(values[1], "discipline_id")
+            grade = _integer(values[2], "grade")
+            if student_id not in known_students:
+                if not repository.exists_student(student_id):
+                    raise ValueError("student with this id does not exist")
+                known_students.add(student_id)
+            if discipline_id not in known_disciplines:
+                if not repository.exists_discipline(discipline_id):
+                    raise ValueError("discipline with this id does not exist")
+                known_disciplines.add(discipline_id)
+            return student_id, discipline_id, grade
+
+        return self._import(file, file_format, GRADE_FIELDS, parse, self.services.grade_students_bulk)
+
+    def _rows(self, page, row):
+        """
+        :param page: a repository page method, taking an offset and a limit
+        :return: an iterator of the rows of every entity, read a page at a time
+        """
+        offset = 0
+        while True:
+            items, total = page(offset, self.chunk_size)
+            for item in items:
+                yield row(item)
+            offset += len(items)
+            if not items or offset >= total:
+                return
+
+    def _export(self, file, file_format, fields, rows):
+        self._check_format(file_format)
+        count = 0
+        if file_format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                file.write(json.dumps(dict(zip(fields, row))) + "\n")
+                count += 1
+        return count
+
+    def export_students(self, file, file_format="csv"):
+        """
+        :return: the number of students written to the file
+        """
+        rows = self._rows(self.services.repository.students_page, lambda student: (student.student_id, student.name))
+        return self._export(file, file_format, STUDENT_FIELDS, rows)
+
+    def export_disciplines(self, file, file_format="csv"):
+        """
+        :return: the number of disciplines written to the file
+        """
+        rows = self._rows(self.services.repository.disciplines_page,
+                          lambda discipline: (discipline.discipline_id, discipline.name))
+        return self._export(file, file_format, DISCIPLINE_FIELDS, rows)
+
+    def export_grades(self, file, file_format="csv"):
+        """
+        :return: the number of grades written to the file
+        """
+        rows = self._rows(self.services.repository.grades_page,
+                          lambda grade: (grade.student_id, grade.discipline_id, grade.grade))
+        return self._export(file, file_format, GRADE_FIELDS, rows)
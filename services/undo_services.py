@@ -1,8 +1,38 @@
+import contextlib
+import json
+import os
+import sys
+
+
 class UndoRedoError(Exception):
     def __init__(self):
         super().__init__("No operation to undo/redo")
 
 
+def estimate_size(value, seen=None):
+    """
+    Rough number of bytes held by a value: the value itself plus the items of containers and the slots of slotted
+    objects, such as the domain entities, counting an object reached twice only once. Other objects, bound methods
+    among them, count only their own size.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(key, seen) + estimate_size(item, seen) for key, item in value.items())
+    else:
+        for cls in type(value).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(value, name):
+                    size += estimate_size(getattr(value, name), seen)
+    return size
+
+
 class Command:
     def __init__(self, fun_name, *fun_params):
         self.__fun_name = fun_name
@@ -14,6 +44,15 @@ class Command:
     def __call__(self, *args, **kwargs):
         return self.call()
 
+    def size(self, seen=None):
+        return sys.getsizeof(self) + sys.getsizeof(self.__fun_name) + estimate_size(self.__fun_params, seen)
+
+    def record(self, encode):
+        """
+        :return: the name of the method the command calls and its encoded parameters
+        """
+        return [self.__fun_name.__name__, [encode(param) for param in self.__fun_params]]
+
 
 class Operation:
     def __init__(self, undo_command: Command, redo_command: Command):
@@ -26,32 +65,377 @@ class Operation:
     def redo(self):
         return self.__redo()
 
+    def size(self):
+        """
+        :return: the estimated bytes held by the operation, counting what both commands share once
+        """
+        seen = set()
+        return sys.getsizeof(self) + self.__undo.size(seen) + self.__redo.size(seen)
+
+    def record(self, encode):
+        return {"undo": self.__undo.record(encode), "redo": self.__redo.record(encode)}
+
+
+class CompoundOperation:
+    """
+    Operations undone and redone together, as one step of the history
+    """
+    def __init__(self, operations):
+        self.__operations = operations
+
+    def undo(self):
+        for o in reversed(self.__operations):
+            o.undo()
+
+    def redo(self):
+        for o in self.__operations:
+            o.redo()
+
+    def size(self):
+        return sys.getsizeof(self) + sys.getsizeof(self.__operations) + sum(o.size() for o in self.__operations)
+
+    def record(self, encode):
+        return {"operations": [o.record(encode) for o in self.__operations]}
+
+
+class UndoLog:
+    """
+    Keeps the undo history in a JSON Lines file, so undo and redo keep working after a restart. Every line records a
+    registered operation, an undo or a redo. An operation is written as the names of the methods its commands
+    call and the fields of the entities they pass, and is bound again to the methods of the target, the Services, when
+    the log is read. The UndoService reads the log only when the history is first needed, and rewrites it with just
+    the history it keeps whenever the log has grown well past that, when it is read or as lines are appended.
+    """
+    def __init__(self, path, target, entity_types):
+        """
+        :param path: the log file
+        :param target: the object whose methods the commands call
+        :param entity_types: the slotted entity classes the commands may pass, built again from their fields
+        """
+        self.path = path
+        self.target = target
+        self.entity_types = {entity_type.__name__: entity_type for entity_type in entity_types}
+        # the lines the file holds, known once it is loaded
+        self.lines = 0
+
+    def _encode(self, value):
+        if isinstance(value, (list, tuple)):
+            return {"list": [self._encode(item) for item in value]}
+        name = type(value).__name__
+        if self.entity_types.get(name) is type(value):
+            return {name: [getattr(value, field) for field in type(value).__slots__]}
+        return value
+
+    def _decode(self, value):
+        if not isinstance(value, dict):
+            return value
+        if "list" in value:
+            return [self._decode(item) for item in value["list"]]
+        (name, fields), = value.items()
+        return self.entity_types[name](*fields)
+
+    def _operation(self, record):
+        if "operations" in record:
+            return CompoundOperation([self._operation(operation) for operation in record["operations"]])
+        return Operation(*(Command(getattr(self.target, name), *(self._decode(param) for param in params))
+                           for name, params in (record["undo"], record["redo"])))
+
+    def _append(self, record):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.lines += 1
+
+    def registered(self, operation):
+        self._append({"register": operation.record(self._encode)})
+
+    def undone(self, steps):
+        self._append({"undo": steps})
+
+    def redone(self, steps):
+        self._append({"redo": steps})
+
+    def clear(self):
+        open(self.path, "w").close()
+        self.lines = 0
+
+    def load(self):
+        """
+        :return: the undo and redo stacks the log leads to, and the number of lines it holds
+        """
+        undo, redo, lines = [], [], 0
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return undo, redo, lines
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a line torn by a crash while it was written
+                    continue
+                lines += 1
+                if "register" in record:
+                    undo.append(self._operation(record["register"]))
+                    redo.clear()
+                elif "undo" in record:
+                    moved = undo[len(undo) - record["undo"]:]
+                    del undo[len(undo) - record["undo"]:]
+                    redo.extend(reversed(moved))
+                elif "redo" in record:
+                    moved = redo[len(redo) - record["redo"]:]
+                    del redo[len(redo) - record["redo"]:]
+                    undo.extend(reversed(moved))
+        self.lines = lines
+        return undo, redo, lines
+
+    def rewrite(self, undo, redo):
+        """
+        Replace the log with one that leads to the given stacks: their operations in order, then the undo of the
+        redoable ones
+        """
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            for operation in undo + redo[::-1]:
+                f.write(json.dumps({"register": operation.record(self._encode)}, separators=(",", ":")) + "\n")
+            if redo:
+                f.write(json.dumps({"undo": len(redo)}) + "\n")
+        os.replace(self.path + ".tmp", self.path)
+        self.lines = len(undo) + len(redo) + (1 if redo else 0)
+
 
 class UndoService:
-    def __init__(self):
+    """
+    Undo and redo history. It can be bounded by the number of operations it keeps, by their estimated size, or both;
+    the oldest operations are forgotten first. With a checkpoint function, a snapshot of the data is taken every
+    checkpoint_interval operations, and undoing or redoing many operations at once restores the nearest snapshot and
+    replays only the operations between it and the target, instead of walking every operation on the way. With an
+    UndoLog, the history is read from the log when it is first needed and every change to it is appended to the log.
+    """
+    # the log is rewritten when it holds more than twice the lines of the kept history plus this many
+    log_compact_minimum = 100
+
+    def __init__(self, atomic=None, max_operations=None, max_bytes=None, checkpoint=None, restore=None,
+                 checkpoint_interval=None, log=None, max_checkpoint_bytes=None):
+        """
+        :param atomic: returns the context manager every change to the history runs in, so an undo or redo and its
+        bookkeeping happen as one step; nothing when None
+        :param max_operations: the most operations kept, undoable and redoable together; no limit when None
+        :param max_bytes: the most estimated bytes held by the operations; no limit when None
+        :param checkpoint: called with the most estimated bytes a snapshot may take, None for no limit; returns a
+        (snapshot, estimated bytes) pair of the current data, or None without building the snapshot when it would not
+        fit
+        :param restore: puts the data back as it was when a snapshot was taken
+        :param checkpoint_interval: take a checkpoint every this many operations; no checkpoints when None
+        :param log: the UndoLog keeping the history between runs; only in memory when None
+        :param max_checkpoint_bytes: the most estimated bytes held by the checkpoints, a budget of their own so a large
+        snapshot never pushes operations out of the history; the oldest checkpoints are dropped to make room, and a
+        snapshot larger than the whole budget is not kept. No limit when None
+        """
+        if (checkpoint is None) != (restore is None):
+            raise ValueError("checkpoint and restore must be given together")
         self.__undo = []
         self.__redo = []
+        self.__atomic = atomic or contextlib.nullcontext
+        self.__max_operations = max_operations
+        self.__max_bytes = max_bytes
+        self.__checkpoint = checkpoint
+        self.__restore = restore
+        self.__checkpoint_interval = checkpoint_interval if checkpoint is not None else None
+        # operations are numbered by the position they lead to; __first is the position before the oldest one kept
+        self.__first = 0
+        self.__sizes = {}
+        self.__checkpoints = {}
+        self.__bytes = 0
+        self.__max_checkpoint_bytes = max_checkpoint_bytes
+        self.__checkpoint_bytes = 0
+        self.__transaction = None
+        self.__log = log
+        self.__loaded = log is None
+
+    @property
+    def undo_count(self):
+        self.__load()
+        return len(self.__undo)
+
+    @property
+    def redo_count(self):
+        self.__load()
+        return len(self.__redo)
+
+    @property
+    def memory(self):
+        """
+        :return: the estimated bytes held by the kept operations and checkpoints
+        """
+        self.__load()
+        return self.__bytes + self.__checkpoint_bytes
+
+    def __load(self):
+        if self.__loaded:
+            return
+        self.__loaded = True
+        self.__undo, self.__redo, lines = self.__log.load()
+        for operation in self.__undo + self.__redo:
+            self.__sizes[id(operation)] = size = operation.size()
+            self.__bytes += size
+        self.__evict()
+        self.__compact_log()
+
+    def __compact_log(self):
+        if self.__log.lines > 2 * (len(self.__undo) + len(self.__redo)) + self.log_compact_minimum:
+            self.__log.rewrite(self.__undo, self.__redo)
+
+    def __position(self):
+        return self.__first + len(self.__undo)
+
+    def __forget(self, operation):
+        self.__bytes -= self.__sizes.pop(id(operation))
+
+    def __drop_checkpoints(self, keep):
+        for position in [position for position in self.__checkpoints if not keep(position)]:
+            self.__checkpoint_bytes -= self.__checkpoints.pop(position)[1]
 
     def clear(self):
-        self.__undo.clear()
-        self.__redo.clear()
+        with self.__atomic():
+            self.__undo.clear()
+            self.__redo.clear()
+            self.__first = 0
+            self.__sizes.clear()
+            self.__checkpoints.clear()
+            self.__bytes = 0
+            self.__checkpoint_bytes = 0
+            if self.__log is not None:
+                self.__loaded = True
+                self.__log.clear()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group every operation registered inside the block into one step of the history. The block runs in one atomic
+        step, a repository batch for Services, so its changes are persisted once when it exits. If the block raises,
+        the operations registered so far are undone and the history is left as it was. A transaction inside another
+        one joins it.
+        """
+        with self.__atomic():
+            if self.__transaction is not None:
+                yield
+                return
+            self.__transaction = operations = []
+            try:
+                yield
+            except BaseException:
+                self.__transaction = None
+                for o in reversed(operations):
+                    o.undo()
+                raise
+            self.__transaction = None
+            if operations:
+                self.register(CompoundOperation(operations))
 
     def register(self, operation: Operation):
-        self.__undo.append(operation)
-        self.__redo.clear()
+        with self.__atomic():
+            if self.__transaction is not None:
+                self.__transaction.append(operation)
+                return
+            self.__load()
+            self.__undo.append(operation)
+            for redo_operation in self.__redo:
+                self.__forget(redo_operation)
+            self.__redo.clear()
+            position = self.__position()
+            # checkpoints from here on belong to the forgotten redo history
+            self.__drop_checkpoints(lambda checkpoint: checkpoint < position)
+            self.__sizes[id(operation)] = size = operation.size()
+            self.__bytes += size
+            self.__evict()
+            if self.__checkpoint_interval and position % self.__checkpoint_interval == 0:
+                snapshot = self.__checkpoint(self.__max_checkpoint_bytes)
+                if snapshot is not None:
+                    self.__keep_checkpoint(position, snapshot)
+            if self.__log is not None:
+                self.__log.registered(operation)
+                self.__compact_log()
 
-    def undo(self):
-        if not self.__undo:
-            raise UndoRedoError
+    def __keep_checkpoint(self, position, snapshot):
+        size = snapshot[1]
+        limit = self.__max_checkpoint_bytes
+        if limit is not None:
+            if size > limit:
+                return
+            for oldest in sorted(self.__checkpoints):
+                if self.__checkpoint_bytes + size <= limit:
+                    break
+                self.__checkpoint_bytes -= self.__checkpoints.pop(oldest)[1]
+        self.__checkpoints[position] = snapshot
+        self.__checkpoint_bytes += size
 
-        o = self.__undo.pop()
-        self.__redo.append(o)
-        o.undo()
+    def __evict(self):
+        while self.__undo and (self.__max_operations is not None and len(self.__undo) > self.__max_operations or
+                               self.__max_bytes is not None and self.__bytes > self.__max_bytes):
+            self.__forget(self.__undo.pop(0))
+            self.__first += 1
+            first = self.__first
+            self.__drop_checkpoints(lambda checkpoint: checkpoint >= first)
 
-    def redo(self):
-        if not self.__redo:
-            raise UndoRedoError
+    def __shortcut(self, start, target):
+        """
+        :return: the checkpoint to replay from on the way from start to target, or None when walking the operations
+        is cheaper, that is when the checkpoint does not save more than an interval of operations
+        """
+        low = self.__first if target < start else start + 1
+        candidates = [position for position in self.__checkpoints if low <= position <= target]
+        if not candidates:
+            return None
+        checkpoint = max(candidates)
+        if abs(target - start) - (target - checkpoint) <= self.__checkpoint_interval:
+            return None
+        return checkpoint
+
+    def undo(self, steps=1):
+        """
+        :param steps: how many operations to undo
+        """
+        with self.__atomic():
+            self.__load()
+            if steps < 1 or steps > len(self.__undo):
+                raise UndoRedoError
+
+            start = self.__position()
+            target = start - steps
+            operations = self.__undo[target - self.__first:]
+            del self.__undo[target - self.__first:]
+            self.__redo.extend(reversed(operations))
+            checkpoint = self.__shortcut(start, target)
+            if checkpoint is None:
+                for o in reversed(operations):
+                    o.undo()
+            else:
+                self.__restore(self.__checkpoints[checkpoint][0])
+                for o in self.__undo[checkpoint - self.__first:]:
+                    o.redo()
+            if self.__log is not None:
+                self.__log.undone(steps)
+                self.__compact_log()
+
+    def redo(self, steps=1):
+        """
+        :param steps: how many operations to redo
+        """
+        with self.__atomic():
+            self.__load()
+            if steps < 1 or steps > len(self.__redo):
+                raise UndoRedoError
 
-        o = self.__redo.pop()
-        self.__undo.append(o)
-        o.redo()
+            start = self.__position()
+            operations = self.__redo[-steps:][::-1]
+            del self.__redo[-steps:]
+            self.__undo.extend(operations)
+            checkpoint = self.__shortcut(start, start + steps)
+            if checkpoint is not None:
+                self.__restore(self.__checkpoints[checkpoint][0])
+                operations = self.__undo[checkpoint - self.__first:]
+            for o in operations:
+                o.redo()
+            if self.__log is not None:
+                self.__log.redone(steps)
+                self.__compact_log()
@@ -1,7 +1,9 @@
 from src.services import Services, StudentIdAlreadyExists, StudentIdInvalidInput, StudentNotFound
 from src.services import DisciplineIdAlreadyExists, DisciplineIdInvalidInput, DisciplineNotFound
 from src.services import initialize_repository, StudentListIsEmpty, DisciplineListIsEmpty, InvalidSearchString
+from src.services import read_settings, undo_log_path
 from src.services.undo_services import UndoRedoError
+from src.services.transfer import DataTransfer, UnknownFormat, FORMATS
 
 
 class UI:
@@ -85,15 +87,9 @@ class UI:
 
     def list_students_with_grade(self):
         try:
-            students_with_grades = self.services.list_students_with_grades()
-            student_discipline_grades = {}
-            for student, discipline, grade_value in students_with_grades:
-                if (student.name, discipline.name) not in student_discipline_grades:
-                    student_discipline_grades[(student.name, discipline.name)] = []
-                student_discipline_grades[(student.name, discipline.name)].append(grade_value)
-            for (student_name, discipline_name), grades in student_discipline_grades.items():
+            for student, discipline, grades in self.services.iter_students_with_grades():
                 print(
-                    f"Student name: {student_name}, Discipline name: {discipline_name}, "
+                    f"Student name: {student.name}, Discipline name: {discipline.name}, "
                     f"grades: {', '.join(map(str, grades))}")
         except StudentListIsEmpty as ve:
             print(ve)
@@ -140,77 +136,133 @@ class UI:
         except DisciplineListIsEmpty as ve:
             print(ve)
 
+    @staticmethod
+    def _transfer_target():
+        kind = input("Enter what to transfer (students, disciplines, grades): ").strip()
+        if kind not in ("students", "disciplines", "grades"):
+            print("Invalid option")
+            return None
+        filename = input("Enter file name (.csv or .jsonl): ").strip()
+        return kind, filename, filename.rsplit(".", 1)[-1].lower()
+
+    def import_records(self):
+        target = self._transfer_target()
+        if target is None:
+            return
+        kind, filename, file_format = target
+        try:
+            with open(filename, newline='') as f:
+                report = getattr(DataTransfer(self.services), "import_" + kind)(f, file_format)
+        except (OSError, UnknownFormat) as ve:
+            print(ve)
+            return
+        print(report)
+        for error in report.errors:
+            print(error)
+
+    def export_records(self):
+        target = self._transfer_target()
+        if target is None:
+            return
+        kind, filename, file_format = target
+        # checked before the file is opened for writing, which would empty it
+        if file_format not in FORMATS:
+            print(UnknownFormat())
+            return
+        try:
+            with open(filename, 'w', newline='') as f:
+                count = getattr(DataTransfer(self.services), "export_" + kind)(f, file_format)
+        except (OSError, UnknownFormat) as ve:
+            print(ve)
+            return
+        print(f"Exported: {count}")
+
     def run(self):
+        # sample grades are only added along with sample students or disciplines, so starting up never reads grades
+        generated = False
         if not self.services.list_students():
             self.services.generate_students(20)
+            generated = True
         if not self.services.list_disciplines():
             self.services.generate_disciplines(20)
-        if not self.services.list_students_with_grades():
+            generated = True
+        if generated:
             self.services.generate_grades(20)
-        self.services.undo_service.clear()
-        while True:
-            print("1. Add a student")
-            print("2. Add a discipline")
-            print("3. Remove a student")
-            print("4. Remove a discipline")
-            print("5. Display all students")
-            print("6. Display all disciplines")
-            print("7. Grade a student")
-            print("8. Display all students with grades")
-            print("9. Search students")
-            print("10. Search disciplines")
-            print("11. Display failing students")
-            print("12. Display best students")
-            print("13. Display best disciplines")
-            print("14. Undo operation")
-            print("15. Redo operation")
-            print("0. Exit")
-            option = input("Choose an option: ")
-            if option == "1":
-                self.add_student()
-            elif option == "2":
-                self.add_discipline()
-            elif option == "3":
-                self.remove_student()
-            elif option == "4":
-                self.remove_discipline()
-            elif option == "5":
-                self.list_students()
-            elif option == "6":
-                self.list_disciplines()
-            elif option == "7":
-                self.grade_student()
-            elif option == "8":
-                self.list_students_with_grade()
-            elif option == "9":
-                self.search_students()
-            elif option == "10":
-                self.search_disciplines()
-            elif option == "11":
-                self.get_failing_students()
-            elif option == "12":
-                self.get_best_students()
-            elif option == "13":
-                self.get_best_disciplines()
-            elif option == "14":
-                try:
-                    self.services.undo_service.undo()
-                except UndoRedoError as e:
-                    print(e)
-            elif option == "15":
-                try:
-                    self.services.undo_service.redo()
-                except UndoRedoError as e:
-                    print(e)
-            elif option == "0":
-                break
-            else:
-                print("Invalid option")
+            # the history, kept between runs, belongs to data that is no longer there
+            self.services.undo_service.clear()
+        try:
+            while True:
+                print("1. Add a student")
+                print("2. Add a discipline")
+                print("3. Remove a student")
+                print("4. Remove a discipline")
+                print("5. Display all students")
+                print("6. Display all disciplines")
+                print("7. Grade a student")
+                print("8. Display all students with grades")
+                print("9. Search students")
+                print("10. Search disciplines")
+                print("11. Display failing students")
+                print("12. Display best students")
+                print("13. Display best disciplines")
+                print("14. Undo operation")
+                print("15. Redo operation")
+                print("16. Import from a file")
+                print("17. Export to a file")
+                print("0. Exit")
+                option = input("Choose an option: ")
+                if option == "1":
+                    self.add_student()
+                elif option == "2":
+                    self.add_discipline()
+                elif option == "3":
+                    self.remove_student()
+                elif option == "4":
+                    self.remove_discipline()
+                elif option == "5":
+                    self.list_students()
+                elif option == "6":
+                    self.list_disciplines()
+                elif option == "7":
+                    self.grade_student()
+                elif option == "8":
+                    self.list_students_with_grade()
+                elif option == "9":
+                    self.search_students()
+                elif option == "10":
+                    self.search_disciplines()
+                elif option == "11":
+                    self.get_failing_students()
+                elif option == "12":
+                    self.get_best_students()
+                elif option == "13":
+                    self.get_best_disciplines()
+                elif option == "14":
+                    try:
+                        self.services.undo_service.undo()
+                    except UndoRedoError as e:
+                        print(e)
+                elif option == "15":
+                    try:
+                        self.services.undo_service.redo()
+                    except UndoRedoError as e:
+                        print(e)
+                elif option == "16":
+                    self.import_records()
+                elif option == "17":
+                    self.export_records()
+                elif option == "0":
+                    break
+                else:
+                    print("Invalid option")
+        finally:
+            self.services.repository.flush()
 
 
 def main():
-    repository = initialize_repository()
-    services = Services(repository)
+    settings = read_settings()
+    repository = initialize_repository(settings)
+    services = Services(repository, undo_log=undo_log_path(settings))
 
     ui = UI(services)
     ui.run()
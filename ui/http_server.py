@@ -0,0 +1,333 @@
+"""
+HTTP/JSON front end for Services, for several clerks sharing one repository. Connections are kept alive between
+requests, list endpoints are paginated with offset and limit by the repository, and every GET answers with an ETag
+holding the server instance and the repository version, so a client repeating a request with If-None-Match gets 304
+Not Modified until something changes or the server restarts.
+
+    python -m src.ui.http_server --port 8000
+
+    GET    /students?offset=0&limit=50         GET    /disciplines?offset=0&limit=50
+    GET    /students/<id>                      GET    /disciplines/<id>
+    POST   /students {"student_id", "name"}    POST   /disciplines {"discipline_id", "name"}
+    DELETE /students/<id>                      DELETE /disciplines/<id>
+    GET    /students/search?q=&limit=&prefix=  GET    /disciplines/search?q=&limit=&prefix=
+    GET    /grades?offset=0&limit=50           POST   /grades {"student_id", "discipline_id", "grade"}
+    GET    /reports/best-students?limit=       GET    /reports/best-disciplines?limit=
+    GET    /reports/failing-students           POST   /undo, /redo
+"""
+import argparse
+import json
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from src.repository.thread_safe import ThreadSafeRepository
+from src.services import (Services, StudentIdAlreadyExists, StudentIdInvalidInput, StudentNotFound,
+                          DisciplineIdAlreadyExists, DisciplineIdInvalidInput, DisciplineNotFound, StudentListIsEmpty,
+                          DisciplineListIsEmpty, InvalidSearchString, initialize_repository, read_settings,
+                          undo_log_path)
+from src.services.transfer import STUDENT_FIELDS, DISCIPLINE_FIELDS, GRADE_FIELDS
+from src.services.undo_services import UndoRedoError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+ERROR_STATUSES = (
+    ((StudentNotFound, DisciplineNotFound), HTTPStatus.NOT_FOUND),
+    ((StudentIdAlreadyExists, DisciplineIdAlreadyExists, UndoRedoError), HTTPStatus.CONFLICT),
+    ((StudentIdInvalidInput, DisciplineIdInvalidInput, InvalidSearchString), HTTPStatus.BAD_REQUEST),
+)
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _student(student):
+    return {"student_id": student.student_id, "name": student.name}
+
+
+def _discipline(discipline):
+    return {"discipline_id": discipline.discipline_id, "name": discipline.name}
+
+
+def _integer(query, name, default=None):
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} is required")
+        return default
+    try:
+        return int(values[0])
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+
+
+def _limit(query, default):
+    return min(max(_integer(query, "limit", default), 0), MAX_PAGE_SIZE)
+
+
+def _page(query):
+    return max(_integer(query, "offset", 0), 0), _limit(query, DEFAULT_PAGE_SIZE)
+
+
+def _valid(field, value):
+    if field == "name":
+        return isinstance(value, str)
+    # bool is an int subclass, but true is no id or grade
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _flag(query, name):
+    return query.get(name, [""])[0] in ("1", "true")
+
+
+class ServicesRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes every request to the handler method named in ROUTES, which returns the status and the JSON body. A path
+    part written <id> matches an integer, handed to the method after the query.
+    """
+    protocol_version = "HTTP/1.1"
+    server_version = "StudentManagement/1.0"
+
+    ROUTES = {
+        "GET": (
+            (("students",), "list_students"),
+            (("students", "search"), "search_students"),
+            (("students", "<id>"), "get_student"),
+            (("disciplines",), "list_disciplines"),
+            (("disciplines", "search"), "search_disciplines"),
+            (("disciplines", "<id>"), "get_discipline"),
+            (("grades",), "list_grades"),
+            (("reports", "best-students"), "best_students"),
+            (("reports", "best-disciplines"), "best_disciplines"),
+            (("reports", "failing-students"), "failing_students"),
+        ),
+        "POST": (
+            (("students",), "add_student"),
+            (("disciplines",), "add_discipline"),
+            (("grades",), "grade_student"),
+            (("undo",), "undo"),
+            (("redo",), "redo"),
+        ),
+        "DELETE": (
+            (("students", "<id>"), "remove_student"),
+            (("disciplines", "<id>"), "remove_discipline"),
+        ),
+    }
+
+    @property
+    def services(self):
+        return self.server.services
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body=None, etag=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _body(self, *fields):
+        try:
+            body = json.loads(self._data or b"{}")
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "the body must be JSON")
+        if not isinstance(body, dict) or any(field not in body for field in fields):
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"the body must be a JSON object with {', '.join(fields)}")
+        for field in fields:
+            if not _valid(field, body[field]):
+                kind = "a string" if field == "name" else "an integer"
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"{field} must be {kind}")
+        return [body[field] for field in fields]
+
+    def _route(self, parts):
+        for pattern, name in self.ROUTES[self.command]:
+            if len(pattern) == len(parts) and all(p == part or p == "<id>" for p, part in zip(pattern, parts)):
+                try:
+                    ids = [int(part) for p, part in zip(pattern, parts) if p == "<id>"]
+                except ValueError:
+                    continue
+                return getattr(self, name), ids
+        raise HttpError(HTTPStatus.NOT_FOUND, "no such resource")
+
+    def _handle(self):
+        # read whatever the route does with it, or the body would be taken for the next request on the connection
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # the end of the body is unknown, so the connection cannot carry another request
+            self.close_connection = True
+            self._send(HTTPStatus.BAD_REQUEST, {"error": "Content-Length must be a non-negative integer"})
+            return
+        self._data = self.rfile.read(length)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        try:
+            handler, ids = self._route([part for part in url.path.split("/") if part])
+            # the version is read before the data, so a response is never tagged newer than its content
+            etag = f'"{self.server.instance}-{self.services.repository.version}"' if self.command == "GET" else None
+            if etag is not None and etag in self.headers.get("If-None-Match", ""):
+                self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+                return
+            status, body = handler(query, *ids)
+        except HttpError as error:
+            self._send(error.status, {"error": str(error)})
+            return
+        except Exception as error:
+            for errors, status in ERROR_STATUSES:
+                if isinstance(error, errors):
+                    self._send(status, {"error": str(error)})
+                    return
+            # answered rather than raised, so the connection stays open for the next request
+            self.log_error("%s %s failed: %r", self.command, self.path, error)
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal server error"})
+            return
+        self._send(status, body, etag)
+
+    do_GET = do_POST = do_DELETE = _handle
+
+    def list_students(self, query):
+        offset, limit = _page(query)
+        students, total = self.services.repository.students_page(offset, limit)
+        return HTTPStatus.OK, {"offset": offset, "limit": limit, "total": total,
+                               "items": [_student(student) for student in students]}
+
+    def list_disciplines(self, query):
+        offset, limit = _page(query)
+        disciplines, total = self.services.repository.disciplines_page(offset, limit)
+        return HTTPStatus.OK, {"offset": offset, "limit": limit, "total": total,
+                               "items": [_discipline(discipline) for discipline in disciplines]}
+
+    def list_grades(self, query):
+        offset, limit = _page(query)
+        grades, total = self.services.repository.grades_page(offset, limit)
+        return HTTPStatus.OK, {"offset": offset, "limit": limit, "total": total,
+                               "items": [{"student_id": grade.student_id, "discipline_id": grade.discipline_id,
+                                          "grade": grade.grade} for grade in grades]}
+
+    def get_student(self, query, student_id):
+        student = self.services.repository.get_student(student_id)
+        if student is None:
+            raise StudentNotFound
+        return HTTPStatus.OK, _student(student)
+
+    def get_discipline(self, query, discipline_id):
+        discipline = self.services.repository.get_discipline(discipline_id)
+        if discipline is None:
+            raise DisciplineNotFound
+        return HTTPStatus.OK, _discipline(discipline)
+
+    def search_students(self, query):
+        students = self.services.search_students(query.get("q", [""])[0], _limit(query, MAX_PAGE_SIZE),
+                                                 _flag(query, "prefix"))
+        return HTTPStatus.OK, {"items": [_student(student) for student in students]}
+
+    def search_disciplines(self, query):
+        disciplines = self.services.search_disciplines(query.get("q", [""])[0],
+                                                       _limit(query, MAX_PAGE_SIZE), _flag(query, "prefix"))
+        return HTTPStatus.OK, {"items": [_discipline(discipline) for discipline in disciplines]}
+
+    def best_students(self, query):
+        try:
+            students = self.services.get_best_students(_limit(query, MAX_PAGE_SIZE))
+        except StudentListIsEmpty:
+            students = []
+        return HTTPStatus.OK, {"items": [_student(student) for student in students]}
+
+    def best_disciplines(self, query):
+        try:
+            disciplines = self.services.get_best_disciplines(_limit(query, MAX_PAGE_SIZE))
+        except DisciplineListIsEmpty:
+            disciplines = []
+        return HTTPStatus.OK, {"items": [_discipline(discipline) for discipline in disciplines]}
+
+    def failing_students(self, query):
+        try:
+            students = self.services.get_failing_students()
+        except StudentListIsEmpty:
+            students = []
+        return HTTPStatus.OK, {"items": [_student(student) for student in students]}
+
+    def add_student(self, query):
+        student_id, name = self._body(*STUDENT_FIELDS)
+        self.services.add_student(student_id, name)
+        return HTTPStatus.CREATED, {"student_id": student_id, "name": name}
+
+    def add_discipline(self, query):
+        discipline_id, name = self._body(*DISCIPLINE_FIELDS)
+        self.services.add_discipline(discipline_id, name)
+        return HTTPStatus.CREATED, {"discipline_id": discipline_id, "name": name}
+
+    def grade_student(self, query):
+        student_id, discipline_id, grade = self._body(*GRADE_FIELDS)
+        self.services.grade_student(student_id, discipline_id, grade)
+        return HTTPStatus.CREATED, {"student_id": student_id, "discipline_id": discipline_id, "grade": grade}
+
+    def remove_student(self, query, student_id):
+        self.services.remove_student(student_id)
+        return HTTPStatus.NO_CONTENT, None
+
+    def remove_discipline(self, query, discipline_id):
+        self.services.remove_discipline(discipline_id)
+        return HTTPStatus.NO_CONTENT, None
+
+    def undo(self, query):
+        self.services.undo_service.undo()
+        return HTTPStatus.NO_CONTENT, None
+
+    def redo(self, query):
+        self.services.undo_service.redo()
+        return HTTPStatus.NO_CONTENT, None
+
+
+def create_server(services, host="127.0.0.1", port=0, verbose=False):
+    """
+    :param services: Services over a ThreadSafeRepository, shared by the threads serving the requests
+    :param port: the port to listen on, any free one when 0
+    :return: a ThreadingHTTPServer serving the services, not started yet
+    """
+    if not isinstance(services.repository, ThreadSafeRepository):
+        raise ValueError("The services must use a ThreadSafeRepository")
+    server = ThreadingHTTPServer((host, port), ServicesRequestHandler)
+    server.daemon_threads = True
+    server.services = services
+    server.verbose = verbose
+    # the version restarts at 0 with the process, so the ETags also name the process that made them
+    server.instance = uuid.uuid4().hex[:12]
+    return server
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Serve the students, disciplines and grades over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    arguments = parser.parse_args(arguments)
+    settings = read_settings()
+    repository = ThreadSafeRepository(initialize_repository(settings))
+    server = create_server(Services(repository, undo_log=undo_log_path(settings)), arguments.host, arguments.port,
+                           verbose=True)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        repository.flush()
+
+
+if __name__ == '__main__':
+    main()